@@ -0,0 +1,7 @@
+import { AmplifyApiRestResourceStackTemplate, AmplifyProjectInfo } from '@aws-amplify/cli-extensibility-helper';
+
+export function override(resources: AmplifyApiRestResourceStackTemplate, amplifyProjectInfo: AmplifyProjectInfo) {
+  // Compress responses at the gateway: the Lambda returns plain JSON (the app's
+  // CompressionMiddleware only runs under server.py). Matches COMPRESS_MIN_BYTES.
+  resources.restApi.minimumCompressionSize = 1024;
+}
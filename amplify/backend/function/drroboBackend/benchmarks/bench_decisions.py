@@ -0,0 +1,129 @@
+"""
+Throughput of HITL decision persistence with group commit.
+
+    python benchmarks/bench_decisions.py --decisions 20000 --clients 16 --batch 5
+
+`--clients` threads each record batches of `--batch` decisions, as concurrent
+/decisions requests would, until `--decisions` are accepted; then the log is
+flushed. Runs against the local append-only file (one fsync per group) and a
+DynamoDB stand-in that sleeps `--write-latency-ms` per BatchWriteItem call, and
+compares with writing each decision on its own (one fsync / one call each).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from api.healthscribe.decisions import DecisionLog, DynamoDecisionStore, FileDecisionLog
+
+
+class SlowDynamo:
+    """
+    batch_write_item that takes `latency` seconds and processes everything.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return {"UnprocessedItems": {}}
+
+
+def events(batch: int, client: int, n: int):
+    return [{"suggestion_id": f"s-{client}-{n}-{i}", "action": ("approve", "reject", "modify")[i % 3],
+             "content": "Amlodipine 5 mg PO once daily" if i % 3 == 2 else None} for i in range(batch)]
+
+
+def run_group_commit(store, decisions: int, clients: int, batch: int) -> dict:
+    """
+    decisions/s end to end (accepted and durable) and per-request submit latency.
+    """
+    log = DecisionLog(store)
+    per_client = max(1, decisions // (clients * batch))
+    latencies = []
+    lock = threading.Lock()
+
+    def client(c: int):
+        own = []
+        for n in range(per_client):
+            started = time.perf_counter()
+            log.record(f"consult-{c}", events(batch, c, n), patient_id="BENCH")
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    accepted = time.perf_counter() - started
+    assert log.flush(timeout=600)
+    seconds = time.perf_counter() - started
+    total = per_client * clients * batch
+    latencies.sort()
+    return {"decisions": total, "per_second": total / seconds, "accept_seconds": accepted,
+            "submit_p50_us": statistics.median(latencies) * 1e6,
+            "submit_p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6}
+
+
+def run_one_by_one(store, decisions: int) -> float:
+    """
+    decisions/s writing each decision as its own commit, synchronously.
+    """
+    log = DecisionLog(store)
+    started = time.perf_counter()
+    for n in range(decisions):
+        log.record("consult-0", events(1, 0, n))
+        log.flush(timeout=60)
+    return decisions / (time.perf_counter() - started)
+
+
+def show(label: str, report: dict, baseline: float):
+    print(f"{label:<28} {report['per_second']:>9,.0f} decisions/s (one at a time: {baseline:>7,.0f}/s), "
+          f"submit p50 {report['submit_p50_us']:.0f} us, p99 {report['submit_p99_us']:.0f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decisions", type=int, default=20_000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=5, help="decisions per request")
+    parser.add_argument("--write-latency-ms", type=float, default=10.0, help="simulated BatchWriteItem latency")
+    parser.add_argument("--baseline", type=int, default=500, help="decisions written one at a time for comparison")
+    args = parser.parse_args(argv)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "decisions.jsonl")
+        report["file"] = run_group_commit(FileDecisionLog(path), args.decisions, args.clients, args.batch)
+        report["file_one_by_one"] = run_one_by_one(FileDecisionLog(os.path.join(tmp, "single.jsonl")), args.baseline)
+        with open(path, "rb") as f:
+            assert sum(1 for _ in f) == report["file"]["decisions"]
+    show("file (fsync per group)", report["file"], report["file_one_by_one"])
+
+    dynamo = SlowDynamo(args.write_latency_ms / 1000)
+    report["dynamo"] = run_group_commit(DynamoDecisionStore("Decisions", dynamo), args.decisions,
+                                        args.clients, args.batch)
+    report["dynamo"]["write_calls"] = dynamo.calls
+    report["dynamo_one_by_one"] = run_one_by_one(DynamoDecisionStore("Decisions", SlowDynamo(dynamo.latency)),
+                                                 max(1, args.baseline // 10))
+    show(f"dynamo ({args.write_latency_ms:g} ms/call)", report["dynamo"], report["dynamo_one_by_one"])
+    return report
+
+
+if __name__ == "__main__":
+    main()
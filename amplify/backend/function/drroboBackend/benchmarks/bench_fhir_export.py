@@ -0,0 +1,138 @@
+"""
+FHIR $export throughput against a local SQLite analysis store.
+
+    python benchmarks/bench_fhir_export.py --resources 100000
+
+Seeds a throwaway store with synthetic consults (2 KB transcript, full SOAP note,
+two ICD-10 codes and two prescriptions each, so six resources per consult), then
+drains export_ndjson() as the streaming route would, and export_page() as the
+buffered Lambda handler does.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from api.healthscribe import fhir_export
+from api.healthscribe.analysis_store import AnalysisRecord, SQLiteAnalysisStore, new_analysis_id, summarize
+
+WORDS = ("patient reports headache dizziness since tuesday worse morning no fever denies chest pain "
+         "blood pressure elevated last visit taking medication regularly sleep poor appetite normal").split()
+
+
+def synthetic_record(rng: random.Random, patient_id: str, created_at: float) -> AnalysisRecord:
+    transcript = " ".join(rng.choice(WORDS) for _ in range(330))[:2048]
+    result = {
+        "diagnosis": {"primary": {"condition": "Essential hypertension", "rationale": "Repeated high readings",
+                                  "confidence": 0.82}},
+        "icd_codes": [{"code": "I10", "description": "Essential (primary) hypertension", "confidence": 0.8},
+                      {"code": "R51.9", "description": "Headache, unspecified", "confidence": 0.6}],
+        "treatment_plan": {"immediate": ["Amlodipine 5 mg PO once daily"],
+                           "ongoing": ["Paracetamol 500 mg PO every 6 hours as needed for headache"],
+                           "lifestyle": ["Reduce salt intake"]},
+    }
+    soap = {"summary": "Follow-up for raised blood pressure and headaches.",
+            "subjective": transcript[:600], "objective": "BP 152/94, HR 78, BMI 29.",
+            "assessment": "Stage 2 hypertension, tension-type headache.",
+            "plan": "Start amlodipine, review in 4 weeks with home BP diary."}
+    return AnalysisRecord(analysis_id=new_analysis_id(created_at), patient_id=patient_id, consult_id=None,
+                          created_at=created_at, mode="full", summary=summarize(result),
+                          payload={"transcript": transcript, "soapNote": soap, "result": result})
+
+
+def seed(store: SQLiteAnalysisStore, consults: int, patients: int):
+    rng = random.Random(44)
+    started = time.time() - consults
+    batch = []
+    for n in range(consults):
+        batch.append(synthetic_record(rng, f"P{n % patients:05d}", started + n))
+        if len(batch) == 500:
+            store.put_many(batch)
+            batch = []
+    if batch:
+        store.put_many(batch)
+
+
+async def stream_export():
+    """
+    (seconds, seconds to first chunk, bytes, resources) for one full streamed export.
+    """
+    started = time.perf_counter()
+    first_chunk = None
+    size = lines = 0
+    async for chunk in fhir_export.export_ndjson():
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+    return time.perf_counter() - started, first_chunk or 0.0, size, lines
+
+
+def paged_export():
+    """
+    (seconds, pages, resources) walking every buffered page via its cursor.
+    """
+    started = time.perf_counter()
+    pages = lines = 0
+    after = None
+    while True:
+        body, cursor = fhir_export.export_page(after=after)
+        pages += 1
+        lines += body.count(b"\n")
+        if cursor is None:
+            return time.perf_counter() - started, pages, lines
+        after = fhir_export.decode_cursor(cursor)
+
+
+def quiet():
+    # Keep the modules' progress and warning prints out of the report
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--resources", type=int, default=100_000, help="approximate resources to export")
+    parser.add_argument("--patients", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    per_consult = sum(1 for _ in fhir_export.consult_resources(
+        {"analysisId": "x", "patientId": "p", "createdAt": 0.0, **synthetic_record(random.Random(0), "p", 0.0).payload}))
+    consults = max(1, -(-args.resources // per_consult))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteAnalysisStore(os.path.join(tmp, "analyses.sqlite3"))
+        fhir_export.analysis_history.store = store
+        started = time.perf_counter()
+        seed(store, consults, args.patients)
+        print(f"Seeded {consults} consults ({per_consult} resources each) in {time.perf_counter() - started:.1f}s")
+
+        rss_before = rss_mb()
+        with quiet():
+            seconds, first_chunk, size, lines = asyncio.run(stream_export())
+        print(f"Streamed: {lines} resources, {size / 1e6:.1f} MB in {seconds:.2f}s "
+              f"({lines / seconds:,.0f} resources/s), first chunk {first_chunk * 1000:.0f} ms, "
+              f"peak RSS +{rss_mb() - rss_before:.0f} MB")
+
+        with quiet():
+            seconds, pages, paged_lines = paged_export()
+        print(f"Paged ({fhir_export.BUFFERED_EXPORT_MAX_CONSULTS} consults/page): {paged_lines} resources "
+              f"in {pages} pages, {seconds:.2f}s ({seconds / pages * 1000:.0f} ms/page)")
+        assert paged_lines == lines
+    return {"resources": lines, "bytes": size}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Per-invocation overhead of the Lambda handler for the health route and a typical analyze.
+
+    python benchmarks/bench_invocation_overhead.py --iterations 2000
+
+The service is stubbed (analyze returns a canned result at once), so what is
+timed is the adapter: API Gateway event -> response dict. "before" is Mangum
+over the app with the path logger as an @app.middleware("http") layer, as
+main.py had it; "after" is index.handler (pure ASGI logger, GET / answered
+straight from the event).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from fastapi import FastAPI, Request
+from mangum import Mangum
+
+import index
+import main as main_module
+from api.healthscribe.router import router, get_service
+
+RESULT = {"diagnosis": {"primary": {"condition": "Essential hypertension", "confidence": 0.82}},
+          "icd_codes": [{"code": "I10", "description": "Essential (primary) hypertension", "confidence": 0.8}],
+          "safety": {"red_flags": [], "contraindications_found": []},
+          "treatment_plan": {"immediate": ["Amlodipine 5 mg PO once daily"]}, "follow_ups": []}
+ANALYZE_BODY = json.dumps({"transcript": "Follow-up for raised blood pressure and headaches.",
+                           "patient": {"PatientID": "BENCH"}})
+
+
+class StubService:
+    async def call_bedrock_agent(self, **kwargs):
+        return RESULT
+
+
+def api_gateway_event(method: str, path: str, body=None) -> dict:
+    return {
+        "resource": path, "path": path, "httpMethod": method,
+        "headers": {"content-type": "application/json"}, "multiValueHeaders": {},
+        "queryStringParameters": None, "multiValueQueryStringParameters": None, "pathParameters": None,
+        "stageVariables": None, "body": body, "isBase64Encoded": False,
+        "requestContext": {"resourcePath": path, "httpMethod": method, "path": path, "stage": "bench",
+                           "identity": {"sourceIp": "127.0.0.1"}, "requestId": "bench"},
+    }
+
+
+class BenchContext:
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def before_handler():
+    """
+    Mangum over the app as it was: the path logger as a BaseHTTPMiddleware decorator.
+    """
+    app = FastAPI(title="Digital Doctor API")
+
+    @app.middleware("http")
+    async def debug_path(request: Request, call_next):
+        print(f"DEBUG: Request Path Received -> {request.url.path}")
+        return await call_next(request)
+
+    app.include_router(router)
+
+    @app.get("/")
+    async def root():
+        return main_module.HEALTH_RESPONSE
+
+    app.dependency_overrides[get_service] = StubService
+    return Mangum(app, lifespan="off")
+
+
+def time_handler(handler, event, iterations: int):
+    """
+    (mean us, p99 us) per invocation.
+    """
+    samples = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        handler(event, BenchContext())
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = handler(event, BenchContext())
+            samples.append((time.perf_counter() - started) * 1e6)
+            assert response["statusCode"] == 200, response
+    samples.sort()
+    return statistics.fmean(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    # Mangum drives the app on the thread's current loop; a caller's asyncio.run() may have cleared it
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    before = before_handler()
+    main_module.app.dependency_overrides[get_service] = StubService
+    report = {}
+    try:
+        print(f"{'':<14}{'before':>24}{'after':>24}")
+        for label, event in (("GET /", api_gateway_event("GET", "/")),
+                             ("POST analyze", api_gateway_event("POST", "/healthscribe/agent/analyze", ANALYZE_BODY))):
+            old = time_handler(before, event, args.iterations)
+            new = time_handler(index.handler, event, args.iterations)
+            print(f"{label:<14}{old[0]:>10.0f} us (p99 {old[1]:>5.0f}){new[0]:>10.0f} us (p99 {new[1]:>5.0f})")
+            report[label] = {"before_us": old[0], "after_us": new[0]}
+    finally:
+        main_module.app.dependency_overrides.pop(get_service, None)
+    return report
+
+
+if __name__ == "__main__":
+    main()
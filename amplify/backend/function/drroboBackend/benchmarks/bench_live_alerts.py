@@ -0,0 +1,96 @@
+"""
+Per-update CPU cost of live clinical alerts over a simulated consult.
+
+    python benchmarks/bench_live_alerts.py --utterances 720
+
+Each utterance arrives word by word as growing partials and ends with a final,
+as the streaming transcriber emits them; a few mention a red flag or a drug.
+Every update is fed to LiveAlertAnalyzer (incremental) and, as the baseline,
+the red-flag and medication matchers are rerun over the whole transcript so far.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from api.healthscribe.live_alerts import LiveAlertAnalyzer
+from api.healthscribe.live_transcription import TranscriptUpdate
+from api.healthscribe.medications import iter_medications
+from api.healthscribe.triage import iter_red_flags
+
+WORDS = ("so how have you been since the last visit the headaches are about the same sleep is poor "
+         "appetite normal taking everything as prescribed blood pressure readings at home were fine").split()
+MENTIONS = ("I had some chest pain last night", "I am taking metformin 500 mg twice daily",
+            "my speech was slurred for a few minutes", "we could start amlodipine 5 mg once daily",
+            "the warfarin dose was changed last week")
+
+
+def updates(utterances: int, rng: random.Random):
+    """
+    TranscriptUpdates for the consult: one partial per word, then the final.
+    """
+    clock = 0.0
+    for n in range(utterances):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 28))]
+        if rng.random() < 0.05:
+            words[len(words) // 2:len(words) // 2] = rng.choice(MENTIONS).split()
+        begin = clock
+        speaker = "CLINICIAN" if n % 2 else "PATIENT"
+        for count in range(1, len(words) + 1):
+            clock += 0.35
+            yield TranscriptUpdate(f"seg-{n}", speaker, begin, clock, " ".join(words[:count]),
+                                   is_partial=count < len(words))
+
+
+def full_rescan(finals, update) -> int:
+    text = " ".join(finals + [update.text])
+    return sum(1 for _ in iter_red_flags(text)) + sum(1 for _ in iter_medications(text))
+
+
+def summarize(label: str, samples):
+    ordered = sorted(samples)
+    third = samples[-len(samples) // 3:]
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:>12}: mean {statistics.fmean(samples):8.1f} us, p99 {p99:8.1f} us, "
+          f"last third mean {statistics.fmean(third):8.1f} us, total {sum(samples) / 1e6:.2f} s")
+    return {"mean_us": statistics.fmean(samples), "p99_us": p99, "last_third_mean_us": statistics.fmean(third)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=720, help="final segments in the consult (~5 s each)")
+    parser.add_argument("--skip-rescan", action="store_true", help="only time the incremental analyzer")
+    args = parser.parse_args(argv)
+
+    stream = list(updates(args.utterances, random.Random(35)))
+    print(f"{args.utterances} utterances, {len(stream)} updates")
+
+    analyzer = LiveAlertAnalyzer()
+    incremental, alerts = [], 0
+    for update in stream:
+        started = time.process_time_ns()
+        alerts += len(analyzer.feed(update))
+        incremental.append((time.process_time_ns() - started) / 1000)
+    report = {"updates": len(stream), "alerts": alerts, "incremental": summarize("incremental", incremental)}
+
+    if not args.skip_rescan:
+        finals, rescan = [], []
+        for update in stream:
+            started = time.process_time_ns()
+            full_rescan(finals, update)
+            rescan.append((time.process_time_ns() - started) / 1000)
+            if not update.is_partial:
+                finals.append(update.text)
+        report["rescan"] = summarize("full rescan", rescan)
+    print(f"{alerts} alerts fired")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Search index build and query benchmark over synthetic consults.
+
+    python benchmarks/bench_search_index.py --notes 100000 --patients 1000
+    python benchmarks/bench_search_index.py --notes 100000 --patients 1   # one huge partition
+
+Notes (~1.1 KB transcript plus SOAP sections) are generated on the fly per
+patient from a wide vocabulary, so the store itself costs no memory; about 1%
+mention amlodipine. Reports build rate, RSS, and query p50/p99 for a rare-term
+and a common-term query, against a naive regex scan of the same patient.
+"""
+import argparse
+import contextlib
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from api.healthscribe import search_index
+from api.healthscribe.search_index import SearchIndex, searchable_fields
+
+RARE_QUERY = "when did we last discuss amlodipine"
+COMMON_QUERY = "pain blood pressure sleep"
+COMMON_WORDS = "pain blood pressure sleep headache cough fever fatigue chest dizziness nausea appetite".split()
+
+
+def vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+class SyntheticStore:
+    """
+    Stands in for the analysis store: iter_records() generates each patient's
+    notes deterministically, oldest first.
+    """
+
+    def __init__(self, notes: int, patients: int, vocab_size: int):
+        self.per_patient = max(1, notes // patients)
+        self.patient_ids = [f"P{n:05d}" for n in range(patients)]
+        self.vocab = vocabulary(vocab_size, random.Random(43))
+
+    def _words(self, rng: random.Random, count: int) -> str:
+        # A third common clinical words, the rest from the long tail
+        return " ".join(rng.choice(COMMON_WORDS) if rng.random() < 0.33 else rng.choice(self.vocab)
+                        for _ in range(count))
+
+    def iter_records(self, patient_id: str, after=None):
+        rng = random.Random(patient_id)
+        for n in range(self.per_patient):
+            analysis_id = f"{1_700_000_000_000 + n:013d}-{patient_id}"
+            transcript = self._words(rng, 150)
+            if rng.random() < 0.01:
+                transcript += " we discussed amlodipine 5 mg daily"
+            soap = {"subjective": self._words(rng, 25), "assessment": self._words(rng, 15),
+                    "plan": self._words(rng, 15)}
+            if after is not None and analysis_id <= after:
+                continue
+            yield {
+                "analysisId": analysis_id, "patientId": patient_id, "consultId": None,
+                "createdAt": 1_700_000_000 + n, "transcript": transcript, "soapNote": soap, "result": {},
+            }
+
+
+class SyntheticHistory:
+    def __init__(self, store: SyntheticStore):
+        self.store = store
+        self.listeners = []
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return True
+
+
+def quiet():
+    # Keep the modules' progress and warning prints out of the report
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def time_queries(index: SearchIndex, patient_ids, query: str, rounds: int):
+    samples = []
+    with quiet():
+        for n in range(rounds):
+            started = time.perf_counter()
+            index.search(patient_ids[n % len(patient_ids)], query)
+            samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+
+def regex_scan(store: SyntheticStore, patient_id: str, query: str, records=None):
+    """
+    The baseline: case-insensitive regex over every field of the patient's notes,
+    finding every occurrence as highlighting would need.
+    """
+    pattern = re.compile("|".join(re.escape(t) for t in query.split()), re.IGNORECASE)
+    records = records if records is not None else list(store.iter_records(patient_id))
+    started = time.perf_counter()
+    hits = [r["analysisId"] for r in records
+            if sum(len(pattern.findall(t)) for t in searchable_fields(r).values())]
+    return (time.perf_counter() - started) * 1000, len(hits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--vocab", type=int, default=23_000, help="distinct long-tail words")
+    parser.add_argument("--queries", type=int, default=1000, help="queries per query type")
+    args = parser.parse_args(argv)
+
+    store = SyntheticStore(args.notes, args.patients, args.vocab)
+    index = SearchIndex(history=SyntheticHistory(store), max_partitions=args.patients)
+    notes = store.per_patient * len(store.patient_ids)
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    with quiet():
+        for patient_id in store.patient_ids:
+            index.search(patient_id, "warmup")
+    build = time.perf_counter() - started
+    postings = sum(len(p) if not isinstance(p, int) else 1
+                   for partition in index._partitions.values() for p in partition.postings.values())
+    print(f"Built {notes} notes / {len(store.patient_ids)} partitions in {build:.1f}s "
+          f"({notes / build:,.0f} notes/s), {postings:,} postings, RSS +{rss_mb() - rss_before:.0f} MB")
+
+    # Time the queries, not the periodic catch-up with other processes' writes
+    search_index.SEARCH_REFRESH_SECONDS = float("inf")
+    for label, query in (("rare", RARE_QUERY), ("common", COMMON_QUERY)):
+        p50, p99 = time_queries(index, store.patient_ids, query, args.queries)
+        print(f"{label:>6} query {query!r}: p50 {p50:.3f} ms, p99 {p99:.3f} ms over {args.queries} queries")
+
+    records = list(store.iter_records(store.patient_ids[0]))
+    scan_ms, hits = regex_scan(store, store.patient_ids[0], COMMON_QUERY, records)
+    print(f"Regex scan of one patient ({len(records)} notes) for {COMMON_QUERY!r}: {scan_ms:.1f} ms, {hits} hits")
+    return {"notes": notes, "postings": postings}
+
+
+if __name__ == "__main__":
+    main()
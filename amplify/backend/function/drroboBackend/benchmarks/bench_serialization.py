@@ -0,0 +1,102 @@
+"""
+Per-response serialization CPU for large analysis payloads.
+
+    python benchmarks/bench_serialization.py --kb 750 --iterations 200
+
+Builds an agent result plus SOAP note of about the requested size and renders it
+the way FastAPI's default path does (jsonable_encoder copy, then json.dumps via
+JSONResponse), and the way the router's FastJSONResponse does (one orjson pass,
+or compact stdlib json when orjson isn't installed). Reports CPU ms per response.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.healthscribe import responses
+from api.healthscribe.responses import FastJSONResponse
+
+WORDS = ("patient reports headache dizziness since tuesday worse morning no fever denies chest pain "
+         "blood pressure elevated last visit taking medication regularly sleep poor appetite normal").split()
+
+
+def synthetic_payload(kb: int, rng: random.Random) -> dict:
+    """
+    A status + analysis response whose transcript, SOAP sections and plan lines add up to ~`kb` KB.
+    """
+    def text(chars: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(chars // 6 + 1))[:chars]
+
+    budget = kb * 1024
+    lines = max(1, budget // 4 // 120)
+    return {
+        "status": "completed",
+        "jobName": "bench-job",
+        "clinicalNotes": {
+            "summary": text(400), "subjective": text(budget // 8), "objective": text(budget // 16),
+            "assessment": text(budget // 16), "plan": text(budget // 16), "fullTranscript": text(budget // 2),
+        },
+        "analysis": {
+            "diagnosis": {"primary": {"condition": "Essential hypertension", "confidence": 0.82, "rationale": text(300)},
+                          "differentials": [{"condition": text(30), "confidence": rng.random()} for _ in range(20)]},
+            "icd_codes": [{"code": f"R{n:02d}.9", "description": text(40), "confidence": rng.random()}
+                          for n in range(50)],
+            "safety": {"red_flags": [text(80) for _ in range(10)], "contraindications_found": [], "conflicts": []},
+            "treatment_plan": {"immediate": [text(120) for _ in range(lines // 2)],
+                               "ongoing": [text(120) for _ in range(lines // 2)]},
+            "follow_ups": [{"when": "4 weeks", "what": text(80)} for _ in range(10)],
+        },
+    }
+
+
+def cpu_ms_per_call(render, payload, iterations: int) -> float:
+    render(payload)
+    started = time.process_time()
+    for _ in range(iterations):
+        render(payload)
+    return (time.process_time() - started) * 1000 / iterations
+
+
+def default_path(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_path(payload) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kb", type=int, default=750, help="approximate payload size")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    payload = synthetic_payload(args.kb, random.Random(30))
+    size = len(fast_path(payload))
+    print(f"Payload: {size / 1024:.0f} KB, {args.iterations} iterations")
+
+    report = {"bytes": size, "default_ms": cpu_ms_per_call(default_path, payload, args.iterations)}
+    print(f"jsonable_encoder + json.dumps: {report['default_ms']:.2f} ms/response")
+    if responses.orjson is not None:
+        report["orjson_ms"] = cpu_ms_per_call(fast_path, payload, args.iterations)
+        print(f"FastJSONResponse (orjson):    {report['orjson_ms']:.2f} ms/response")
+
+    orjson, responses.orjson = responses.orjson, None
+    try:
+        report["stdlib_ms"] = cpu_ms_per_call(fast_path, payload, args.iterations)
+    finally:
+        responses.orjson = orjson
+    print(f"FastJSONResponse (stdlib):    {report['stdlib_ms']:.2f} ms/response")
+    return report
+
+
+if __name__ == "__main__":
+    main()
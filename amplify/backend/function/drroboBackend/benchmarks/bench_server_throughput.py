@@ -0,0 +1,178 @@
+"""
+Throughput of the container server against the Lambda path, on the same fake agent.
+
+    python benchmarks/bench_server_throughput.py --agent-delay 0.02 --requests 400 --workers 1 4
+
+The Bedrock agent is replaced by local_runtime's fake, which streams a canned
+completion with `--agent-delay` seconds between pieces. The Lambda path calls
+index.handler in-process with API Gateway events, one at a time as a container
+does. The server path starts `server.py` with each worker count and drives it
+over HTTP with `--concurrency` clients. Both report req/s and p50 for GET / and
+POST /healthscribe/agent/analyze.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+import httpx
+
+TRANSCRIPT = "Patient reports chest pain and shortness of breath since this morning. Takes lisinopril."
+ANALYZE_BODY = json.dumps({"transcript": TRANSCRIPT, "patient": {"PatientID": "BENCH"}})
+
+
+def api_gateway_event(method: str, path: str, body=None) -> dict:
+    return {
+        "resource": path, "path": path, "httpMethod": method,
+        "headers": {"content-type": "application/json"}, "multiValueHeaders": {},
+        "queryStringParameters": None, "multiValueQueryStringParameters": None, "pathParameters": None,
+        "stageVariables": None, "body": body, "isBase64Encoded": False,
+        "requestContext": {"resourcePath": path, "httpMethod": method, "path": path, "stage": "bench",
+                           "identity": {"sourceIp": "127.0.0.1"}, "requestId": "bench"},
+    }
+
+
+class BenchContext:
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+def rate(latencies, seconds: float) -> dict:
+    return {"rps": len(latencies) / seconds, "p50_ms": statistics.median(latencies) * 1000}
+
+
+def lambda_path(requests: int) -> dict:
+    """
+    Sequential index.handler calls: a Lambda container serves one event at a time.
+    """
+    import index
+    import local_runtime
+    local_runtime._fake_agent_boot()
+    # Mangum drives the app on the thread's current loop, which asyncio.run() above cleared
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    report = {}
+    for label, event in (("health", api_gateway_event("GET", "/")),
+                         ("analyze", api_gateway_event("POST", "/healthscribe/agent/analyze", ANALYZE_BODY))):
+        latencies = []
+        with quiet():
+            index.handler(event, BenchContext())
+            started = time.perf_counter()
+            for _ in range(requests):
+                sent = time.perf_counter()
+                response = index.handler(event, BenchContext())
+                latencies.append(time.perf_counter() - sent)
+                assert response["statusCode"] == 200, response
+        report[label] = rate(latencies, time.perf_counter() - started)
+    return report
+
+
+def quiet():
+    # Keep the per-request path logging out of the report
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, env: dict) -> subprocess.Popen:
+    # As local_runtime.py does: the app directory after site-packages, fake agent booted before serving
+    boot = (f"import sys; sys.path.remove(''); sys.path.append({SRC!r}); "
+            "import local_runtime, server; local_runtime._fake_agent_boot(); server.main()")
+    env = dict(env, SERVER_HOST="127.0.0.1", SERVER_PORT=str(port), SERVER_WORKERS=str(workers))
+    return subprocess.Popen([sys.executable, "-c", boot], cwd=SRC, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not come up")
+
+
+async def drive(client: httpx.AsyncClient, send, requests: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            sent = time.perf_counter()
+            response = await send(client)
+            latencies.append(time.perf_counter() - sent)
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return rate(latencies, time.perf_counter() - started)
+
+
+async def server_path(workers: int, requests: int, concurrency: int, env: dict) -> dict:
+    port = free_port()
+    process = start_server(workers, port, env)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_ready(client, process)
+            headers = {"content-type": "application/json"}
+            return {
+                "health": await drive(client, lambda c: c.get("/"), requests, concurrency),
+                "analyze": await drive(client, lambda c: c.post("/healthscribe/agent/analyze", content=ANALYZE_BODY,
+                                                                headers=headers), requests, concurrency),
+            }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def show(label: str, report: dict):
+    print(f"{label:<22} GET / {report['health']['rps']:7.0f} req/s (p50 {report['health']['p50_ms']:5.1f} ms)   "
+          f"analyze {report['analyze']['rps']:6.0f} req/s (p50 {report['analyze']['p50_ms']:5.1f} ms)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agent-delay", type=float, default=0.02, help="seconds between fake agent pieces")
+    parser.add_argument("--agent-pieces", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=400, help="requests per route and configuration")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients against the server")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4], help="server worker counts to try")
+    args = parser.parse_args(argv)
+
+    # Read by local_runtime._fake_agent_boot, here and in the server's workers
+    os.environ.update(LOCAL_RUNTIME_FAKE_AGENT_DELAY=str(args.agent_delay),
+                      LOCAL_RUNTIME_FAKE_AGENT_PIECES=str(args.agent_pieces))
+    env = dict(os.environ, SERVER_COMPRESSION="0")
+
+    report = {}
+    for workers in args.workers:
+        report[f"server_{workers}"] = asyncio.run(server_path(workers, args.requests, args.concurrency, env))
+        show(f"server, {workers} worker(s)", report[f"server_{workers}"])
+    report["lambda"] = lambda_path(args.requests)
+    show("Lambda (sequential)", report["lambda"])
+    return report
+
+
+if __name__ == "__main__":
+    main()
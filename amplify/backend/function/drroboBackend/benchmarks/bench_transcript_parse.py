@@ -0,0 +1,106 @@
+"""
+Peak memory and time to load HealthScribe transcript.json into the segment store.
+
+    python benchmarks/bench_transcript_parse.py --sizes 1 10 50
+
+Writes a synthetic transcript.json of each size (in MB) to a temp file, then builds
+a SegmentStore from it twice: json.load + from_healthscribe (the old path) and
+from_healthscribe_stream reading the file in chunks as it reads the S3 body.
+Peak is the tracemalloc high-water mark during the build.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.append(SRC)
+
+from api.healthscribe.transcript_segments import SegmentStore
+
+WORDS = ("patient reports headache dizziness since tuesday worse morning no fever denies chest pain "
+         "blood pressure elevated last visit taking medication regularly sleep poor appetite normal").split()
+ROLES = ("CLINICIAN", "PATIENT")
+
+
+def write_transcript(path: str, mb: float, rng: random.Random) -> int:
+    """
+    Stream a transcript.json of about `mb` MB to `path`: segments of 8-30 words, each
+    followed in TranscriptItems by one item per word. Returns the segment count.
+    """
+    target = int(mb * 1024 * 1024)
+    clock = 0.0
+    segments, items = [], []
+    size = 0
+    while size < target:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 30))]
+        begin = clock
+        for word in words:
+            items.append(json.dumps({"Type": "PRONUNCIATION", "Content": word, "Confidence": round(rng.random(), 4),
+                                     "BeginAudioTime": round(clock, 3), "EndAudioTime": round(clock + 0.3, 3)}))
+            clock += 0.35
+        segments.append(json.dumps({"SegmentId": f"seg-{len(segments)}", "Content": " ".join(words),
+                                    "BeginAudioTime": round(begin, 3), "EndAudioTime": round(clock, 3),
+                                    "ParticipantDetails": {"ParticipantRole": ROLES[len(segments) % 2]}}))
+        size += len(segments[-1]) + sum(len(item) + 1 for item in items[-len(words):]) + 1
+    with open(path, "w") as f:
+        f.write('{"Conversation": {"ConversationId": "bench", "JobName": "bench", "TranscriptSegments": [')
+        f.write(",".join(segments))
+        f.write('], "TranscriptItems": [')
+        f.write(",".join(items))
+        f.write("]}}")
+    return len(segments)
+
+
+def measure(build):
+    """
+    (seconds, peak MB, store) for one build.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = build()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return seconds, peak, store
+
+
+def load_whole(path: str) -> SegmentStore:
+    with open(path, "rb") as f:
+        return SegmentStore.from_healthscribe(json.load(f))
+
+
+def load_streaming(path: str) -> SegmentStore:
+    with open(path, "rb") as f:
+        return SegmentStore.from_healthscribe_stream(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="transcript.json sizes in MB")
+    args = parser.parse_args(argv)
+
+    rows = []
+    print(f"{'size':>8}  {'segments':>8}  {'json.load':>20}  {'streaming':>20}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mb in args.sizes:
+            path = os.path.join(tmp, "transcript.json")
+            segments = write_transcript(path, mb, random.Random(33))
+            whole_s, whole_mb, whole = measure(lambda: load_whole(path))
+            stream_s, stream_mb, streamed = measure(lambda: load_streaming(path))
+            assert streamed.transcript_text() == whole.transcript_text()
+            size = os.path.getsize(path) / 1e6
+            print(f"{size:>5.1f} MB  {segments:>8}  {whole_s:>6.2f}s / {whole_mb:>6.1f} MB  "
+                  f"{stream_s:>6.2f}s / {stream_mb:>6.1f} MB")
+            rows.append({"mb": size, "segments": segments, "json_load_peak_mb": whole_mb,
+                         "streaming_peak_mb": stream_mb})
+    return {"rows": rows}
+
+
+if __name__ == "__main__":
+    main()
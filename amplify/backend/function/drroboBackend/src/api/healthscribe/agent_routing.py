@@ -0,0 +1,258 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, List
+
+import boto3
+
+from . import metrics
+from .cache import LRUTTLCache, MISSING
+from .sessions import SESSION_TTL_SECONDS
+
+# Hedged agent invocation across a second region or alias. When the preferred
+# target hasn't streamed its first chunk within its own p95 first-chunk time, the
+# same request goes to the other target; whichever streams first is used and the
+# other stream is closed. Off unless AGENT_HEDGING=1 and a secondary is configured.
+
+AGENT_HEDGING = os.getenv("AGENT_HEDGING", "0") == "1"
+# Secondary target; each part defaults to the primary's (e.g. only a second alias in the same region)
+SECONDARY_REGION = os.getenv("VITE_BEDROCK_SECONDARY_REGION")
+SECONDARY_AGENT_ID = os.getenv("VITE_BEDROCK_SECONDARY_AGENT_ID")
+SECONDARY_ALIAS_ID = os.getenv("VITE_BEDROCK_SECONDARY_AGENT_ALIAS_ID")
+
+# Hedge delay until a target has AGENT_ROUTING_MIN_SAMPLES first-chunk samples, then its p95 (clamped)
+HEDGE_DEFAULT_MS = float(os.getenv("AGENT_HEDGE_DELAY_MS", "3000"))
+HEDGE_MIN_MS = float(os.getenv("AGENT_HEDGE_MIN_MS", "500"))
+HEDGE_MAX_MS = float(os.getenv("AGENT_HEDGE_MAX_MS", "15000"))
+ROUTING_MIN_SAMPLES = int(os.getenv("AGENT_ROUTING_MIN_SAMPLES", "20"))
+# A target whose invocation failed is tried last for this long
+ERROR_COOLDOWN_SECONDS = float(os.getenv("AGENT_ROUTING_ERROR_COOLDOWN_SECONDS", "60"))
+
+
+@dataclass
+class AgentTarget:
+    """
+    One agent alias in one region. `client` is created on first use unless given.
+    """
+    region: str
+    agent_id: str
+    alias_id: str
+    client: Any = None
+    config: Any = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.region}/{self.alias_id}"
+
+    def get_client(self):
+        if self.client is None:
+            self.client = boto3.client("bedrock-agent-runtime", region_name=self.region, config=self.config)
+        return self.client
+
+
+def secondary_target(primary_region: str, primary_agent_id: str, primary_alias_id: str,
+                     config=None) -> Optional[AgentTarget]:
+    if not (SECONDARY_REGION or SECONDARY_AGENT_ID or SECONDARY_ALIAS_ID):
+        return None
+    target = AgentTarget(
+        region=SECONDARY_REGION or primary_region,
+        agent_id=SECONDARY_AGENT_ID or primary_agent_id,
+        alias_id=SECONDARY_ALIAS_ID or primary_alias_id,
+        config=config,
+    )
+    if (target.region, target.agent_id, target.alias_id) == (primary_region, primary_agent_id, primary_alias_id):
+        return None
+    return target
+
+
+class _Race:
+    """
+    The attempts of one hedged call. The first to stream (or to finish without
+    streaming) wins; `events` wakes the caller on every first chunk or finish.
+    """
+
+    def __init__(self):
+        self.events: "queue.Queue[_Attempt]" = queue.Queue()
+        self.winner: Optional["_Attempt"] = None
+        self._lock = threading.Lock()
+
+    def claim(self, attempt: "_Attempt") -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+        if self.winner is not attempt:
+            attempt.cancelled.set()
+            return False
+        self.events.put(attempt)
+        return True
+
+
+class _Attempt:
+    """
+    One invocation of one target. Only the attempt that wins its race forwards
+    chunks; the other closes its stream as soon as it notices it lost.
+    """
+
+    def __init__(self, target: AgentTarget, params: Dict[str, Any], on_chunk: Optional[Callable[[str], None]],
+                 race: _Race, dims: Dict[str, str], on_error: Callable[[AgentTarget], None]):
+        self.target = target
+        self.params = dict(params, agentId=target.agent_id, agentAliasId=target.alias_id)
+        self.on_chunk = on_chunk
+        self.race = race
+        self.dims = dims
+        self.on_error = on_error
+        self.completion = ""
+        self.error: Optional[BaseException] = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def start(self) -> "_Attempt":
+        threading.Thread(target=self.run, name=f"agent-{self.target.name}", daemon=True).start()
+        return self
+
+    def run(self):
+        started = time.perf_counter()
+        stream = None
+        try:
+            response = self.target.get_client().invoke_agent(**self.params)
+            stream = response.get("completion", [])
+            parts = []
+            for event in stream:
+                if "chunk" not in event:
+                    continue
+                text = event["chunk"]["bytes"].decode("utf-8")
+                if not parts:
+                    # Recorded for the loser too, so the slower target's latency is still tracked
+                    metrics.record("agent.first_chunk_ms", (time.perf_counter() - started) * 1000, **self.dims)
+                    if not self.race.claim(self):
+                        return
+                if self.cancelled.is_set():
+                    return
+                parts.append(text)
+                if self.on_chunk is not None:
+                    self.on_chunk(text)
+            if not parts and not self.race.claim(self):
+                return
+            self.completion = "".join(parts)
+        except Exception as e:
+            self.error = e
+            self.on_error(self.target)
+        finally:
+            if self.cancelled.is_set() and stream is not None and hasattr(stream, "close"):
+                # Drops the HTTP connection, so the losing target stops generating
+                stream.close()
+            self.done.set()
+            self.race.events.put(self)
+
+
+class AgentRouter:
+    """
+    Chooses which agent target serves an invocation and hedges to the other one.
+    Per-target first-chunk latency (from metrics) orders the targets, and the
+    preferred target's p95 sets the hedge delay. A session stays on the target it
+    was started on, since Bedrock agent sessions don't span regions or aliases.
+    """
+
+    def __init__(self, secondary: Optional[AgentTarget] = None, hedging: bool = AGENT_HEDGING):
+        self.secondary = secondary
+        self.hedging = hedging and secondary is not None
+        self._failed_at: Dict[str, float] = {}
+        self._sessions = LRUTTLCache(max_size=2000, ttl_seconds=SESSION_TTL_SECONDS)
+        self._lock = threading.Lock()
+
+    def _failed(self, target: AgentTarget):
+        with self._lock:
+            self._failed_at[target.name] = time.monotonic()
+
+    def _healthy(self, target: AgentTarget) -> bool:
+        failed_at = self._failed_at.get(target.name)
+        return failed_at is None or time.monotonic() - failed_at > ERROR_COOLDOWN_SECONDS
+
+    def _samples(self, target: AgentTarget) -> int:
+        return metrics.count("agent.first_chunk_ms", target=target.name)
+
+    def targets(self, primary: AgentTarget) -> List[AgentTarget]:
+        """
+        Targets in preference order: healthy before recently failed, then lower
+        median first-chunk time once both have enough samples, else configuration order.
+        """
+        targets = [primary, self.secondary]
+        # Latency only decides once every target has enough samples to compare
+        ranked = all(self._samples(t) >= ROUTING_MIN_SAMPLES for t in targets)
+
+        def key(item):
+            index, target = item
+            median = metrics.percentile("agent.first_chunk_ms", 50, target=target.name) if ranked else 0.0
+            return (not self._healthy(target), median, index)
+
+        return [target for _, target in sorted(enumerate(targets), key=key)]
+
+    def hedge_delay_ms(self, target: AgentTarget) -> float:
+        if self._samples(target) < ROUTING_MIN_SAMPLES:
+            return HEDGE_DEFAULT_MS
+        p95 = metrics.percentile("agent.first_chunk_ms", 95, target=target.name)
+        return min(HEDGE_MAX_MS, max(HEDGE_MIN_MS, p95))
+
+    def invoke(self, primary: AgentTarget, params: Dict[str, Any],
+               on_chunk: Optional[Callable[[str], None]] = None, hedge: bool = True) -> str:
+        """
+        Run one agent invocation and return its completion text. A session that
+        already ran stays on its target. Otherwise `hedge=True` (new full analyses)
+        goes to the preferred target, hedged when AGENT_HEDGING is on, and
+        `hedge=False` (speculative runs, a delta whose session we don't know) to the primary.
+        """
+        if self.secondary is None:
+            return self._single(primary, params, on_chunk, {})
+
+        session_id = params["sessionId"]
+        pinned = self._sessions.get(session_id)
+        if pinned is not MISSING:
+            target = self.secondary if pinned == self.secondary.name else primary
+            completion = self._single(target, params, on_chunk, {"target": target.name})
+        elif hedge and self.hedging:
+            completion, target = self._hedged(self.targets(primary), params, on_chunk)
+        else:
+            target = self.targets(primary)[0] if hedge else primary
+            completion = self._single(target, params, on_chunk, {"target": target.name})
+        self._sessions.put(session_id, target.name)
+        return completion
+
+    def _single(self, target: AgentTarget, params, on_chunk, dims) -> str:
+        attempt = _Attempt(target, params, on_chunk, _Race(), dims, self._failed)
+        attempt.run()
+        if attempt.error is not None:
+            raise attempt.error
+        return attempt.completion
+
+    def _hedged(self, targets: List[AgentTarget], params, on_chunk):
+        race = _Race()
+        launch = lambda target: _Attempt(target, params, on_chunk, race, {"target": target.name}, self._failed).start()
+        attempts = [launch(targets[0])]
+        try:
+            try:
+                reported = race.events.get(timeout=self.hedge_delay_ms(targets[0]) / 1000)
+            except queue.Empty:
+                reported = None
+            if reported is None or reported.error is not None:
+                # Slow past its p95, or already failed: race the other target
+                attempts.append(launch(targets[1]))
+                metrics.record("agent.hedged", 1, reason="failed" if reported else "slow")
+
+            while True:
+                winner = race.winner
+                if winner is not None:
+                    winner.done.wait()
+                    if winner.error is not None:
+                        raise winner.error
+                    if len(attempts) > 1:
+                        metrics.record("agent.hedge_won", 1, target=winner.target.name)
+                    return winner.completion, winner.target
+                if all(a.done.is_set() for a in attempts):
+                    raise attempts[0].error
+                race.events.get()
+        finally:
+            for attempt in attempts:
+                if race.winner is not attempt:
+                    attempt.cancelled.set()
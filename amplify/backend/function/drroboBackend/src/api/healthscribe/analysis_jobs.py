@@ -0,0 +1,623 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+import boto3
+from botocore.exceptions import ClientError
+
+from . import metrics
+from .responses import dumps
+from .triage import triage_priority, BULK
+
+# Prod: SQS queue + DynamoDB job table. Without them, a SQLite file serves as both
+# (queue and job store) and an in-process worker drains it.
+ANALYSIS_QUEUE_URL = os.getenv("VITE_ANALYSIS_QUEUE_URL")
+ANALYSIS_JOBS_TABLE = os.getenv("VITE_ANALYSIS_JOBS_TABLE")
+ANALYSIS_QUEUE_DB = os.getenv("ANALYSIS_QUEUE_DB") or os.path.join(tempfile.gettempdir(), "drrobo_analysis_jobs.sqlite3")
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+
+# A received job is hidden from other workers this long; running jobs keep extending it
+VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("ANALYSIS_VISIBILITY_TIMEOUT_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = 5
+WORKER_CONCURRENCY = int(os.getenv("ANALYSIS_WORKER_CONCURRENCY", "4"))
+JOB_TTL_SECONDS = int(os.getenv("ANALYSIS_JOB_TTL_SECONDS", str(24 * 3600)))
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+SQLITE_IN_CHUNK = 500
+BATCH_GET_LIMIT = 100  # DynamoDB BatchGetItem maximum keys per request
+BATCH_WRITE_SIZE = 25  # DynamoDB BatchWriteItem maximum
+SQS_BATCH_SIZE = 10  # SendMessageBatch maximum entries
+BATCH_MAX_ROUNDS = 5
+
+
+class JobExists(Exception):
+    """
+    A job with this ID was already created (callers that pick their own IDs use it to dedupe).
+    """
+
+
+@dataclass
+class QueueMessage:
+    job_id: str
+    receipt: str
+    receive_count: int
+    message_id: Optional[str] = None
+
+
+# ---------- local: SQLite queue + job store ----------
+
+class SQLiteJobQueue:
+    """
+    Queue and job store in one SQLite file. A received message becomes invisible
+    until `visible_at`; if the worker dies it reappears, as with SQS.
+    """
+
+    def __init__(self, path: str = ANALYSIS_QUEUE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so a server that preloads the app and then forks
+        # workers gives each worker its own connection
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, status TEXT, request TEXT, result TEXT, error TEXT,
+                attempts INTEGER DEFAULT 0, created_at REAL, updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS queue (
+                message_id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT,
+                visible_at REAL, receive_count INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS queue_visible ON queue (visible_at);
+        """)
+        return db
+
+    # job store
+
+    def create(self, job_id: str, request: Dict[str, Any], status: str = "queued"):
+        self.create_many([(job_id, request)], status)
+
+    def create_many(self, jobs: List[Tuple[str, Dict[str, Any]]], status: str = "queued"):
+        """
+        All or nothing: one transaction, JobExists if any ID is taken.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO jobs (job_id, status, request, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, status, json.dumps(request), now, now) for job_id, request in jobs],
+                )
+                self._db.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                self._db.execute("ROLLBACK")
+                raise JobExists(str(e))
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT job_id, status, request, result, error, attempts, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row[0], "status": row[1], "request": json.loads(row[2]),
+            "result": json.loads(row[3]) if row[3] else None, "error": row[4],
+            "attempts": row[5], "createdAt": row[6], "updatedAt": row[7],
+        }
+
+    def get_many(self, job_ids: List[str], with_result: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Several jobs by ID, without their requests; `with_result=False` also skips results.
+        """
+        jobs = {}
+        result_column = "result" if with_result else "NULL"
+        for start in range(0, len(job_ids), SQLITE_IN_CHUNK):
+            chunk = job_ids[start:start + SQLITE_IN_CHUNK]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT job_id, status, {result_column}, error, attempts, created_at, updated_at FROM jobs "
+                    f"WHERE job_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+            for row in rows:
+                jobs[row[0]] = {
+                    "jobId": row[0], "status": row[1], "result": json.loads(row[2]) if row[2] else None,
+                    "error": row[3], "attempts": row[4], "createdAt": row[5], "updatedAt": row[6],
+                }
+        return jobs
+
+    def update(self, job_id: str, status: str, attempts: int, result: Any = None, error: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, attempts, dumps(result).decode() if result is not None else None, error, time.time(), job_id),
+            )
+
+    def start(self, job_id: str, attempts: int) -> bool:
+        """
+        Mark the job running unless it was cancelled or finished meanwhile. A job
+        already "running" is one whose worker died, redelivered: it may start again.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = ?, updated_at = ? "
+                "WHERE job_id = ? AND status IN ('queued', 'running')",
+                (attempts, time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job nobody has started yet. False if it is already running or done.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    # queue
+
+    def send(self, job_id: str):
+        self.send_many([job_id])
+
+    def send_many(self, job_ids: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT INTO queue (job_id, visible_at) VALUES (?, ?)",
+                                 [(job_id, now) for job_id in job_ids])
+
+    def receive(self, visibility_timeout: int = VISIBILITY_TIMEOUT_SECONDS) -> Optional[QueueMessage]:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two worker processes can't claim the same row
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT message_id, job_id, receive_count FROM queue WHERE visible_at <= ? ORDER BY visible_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE queue SET visible_at = ?, receive_count = receive_count + 1 WHERE message_id = ?",
+                        (now + visibility_timeout, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return QueueMessage(job_id=row[1], receipt=str(row[0]), receive_count=row[2] + 1)
+
+    def delete(self, message: QueueMessage):
+        with self._lock:
+            self._db.execute("DELETE FROM queue WHERE message_id = ?", (int(message.receipt),))
+
+    def change_visibility(self, message: QueueMessage, seconds: float):
+        with self._lock:
+            self._db.execute("UPDATE queue SET visible_at = ? WHERE message_id = ?",
+                             (time.time() + seconds, int(message.receipt)))
+
+
+# ---------- prod: SQS queue + DynamoDB job store ----------
+
+class SQSQueue:
+    def __init__(self, queue_url: str = ANALYSIS_QUEUE_URL, client=None):
+        self.queue_url = queue_url
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client("sqs", region_name=os.environ.get("VITE_AWS_REGION", "us-east-1"))
+        return self._client
+
+    def send(self, job_id: str):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=job_id)
+
+    def send_many(self, job_ids: Iterable[str]):
+        job_ids = list(job_ids)
+        for start in range(0, len(job_ids), SQS_BATCH_SIZE):
+            entries = [{"Id": str(n), "MessageBody": job_id}
+                       for n, job_id in enumerate(job_ids[start:start + SQS_BATCH_SIZE])]
+            for attempt in range(BATCH_MAX_ROUNDS):
+                failed = {f["Id"] for f in self.client.send_message_batch(
+                    QueueUrl=self.queue_url, Entries=entries).get("Failed", [])}
+                entries = [e for e in entries if e["Id"] in failed]
+                if not entries:
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+            if entries:
+                raise RuntimeError(f"SQS refused {len(entries)} analysis job messages")
+
+    def receive(self, visibility_timeout: int = VISIBILITY_TIMEOUT_SECONDS) -> Optional[QueueMessage]:
+        # Long poll: an idle worker makes one request per 20s instead of spinning
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=20,
+            VisibilityTimeout=visibility_timeout, AttributeNames=["ApproximateReceiveCount"],
+        )
+        for message in response.get("Messages", []):
+            return QueueMessage(
+                job_id=message["Body"], receipt=message["ReceiptHandle"],
+                receive_count=int(message["Attributes"]["ApproximateReceiveCount"]),
+                message_id=message["MessageId"],
+            )
+        return None
+
+    def delete(self, message: QueueMessage):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message.receipt)
+
+    def change_visibility(self, message: QueueMessage, seconds: float):
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=message.receipt, VisibilityTimeout=int(seconds)
+        )
+
+
+class DynamoJobStore:
+    """
+    Job records keyed by JobID. Request/result are stored as JSON strings
+    (agent output has floats, which DynamoDB only accepts as Decimal); expires_at is the TTL attribute.
+    """
+
+    def __init__(self, table_name: str = ANALYSIS_JOBS_TABLE, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "dynamodb",
+                region_name=os.environ.get("VITE_AWS_REGION", "us-east-1"),
+                endpoint_url=DYNAMODB_ENDPOINT_URL
+            )
+        return self._client
+
+    def _new_item(self, job_id: str, request: Dict[str, Any], status: str, now: float) -> Dict[str, Any]:
+        return {
+            "JobID": {"S": job_id},
+            "status": {"S": status},
+            "request": {"S": json.dumps(request)},
+            "attempts": {"N": "0"},
+            "created_at": {"N": str(now)},
+            "updated_at": {"N": str(now)},
+            "expires_at": {"N": str(int(now + JOB_TTL_SECONDS))},
+        }
+
+    def create(self, job_id: str, request: Dict[str, Any], status: str = "queued"):
+        try:
+            self.client.put_item(TableName=self.table_name, ConditionExpression="attribute_not_exists(JobID)",
+                                 Item=self._new_item(job_id, request, status, time.time()))
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise JobExists(job_id)
+            raise
+
+    def create_many(self, jobs: List[Tuple[str, Dict[str, Any]]], status: str = "queued"):
+        """
+        BatchWriteItem can't be conditional, so callers use fresh IDs (batch items do).
+        """
+        now = time.time()
+        puts = [{"PutRequest": {"Item": self._new_item(job_id, request, status, now)}} for job_id, request in jobs]
+        for start in range(0, len(puts), BATCH_WRITE_SIZE):
+            request = {self.table_name: puts[start:start + BATCH_WRITE_SIZE]}
+            for attempt in range(BATCH_MAX_ROUNDS):
+                request = self.client.batch_write_item(RequestItems=request).get("UnprocessedItems") or {}
+                if not request:
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+            if request:
+                raise RuntimeError(f"DynamoDB left {len(request[self.table_name])} analysis jobs unwritten")
+
+    def _job(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        job = {
+            "jobId": item["JobID"]["S"],
+            "status": item["status"]["S"],
+            "result": json.loads(item["result"]["S"]) if "result" in item else None,
+            "error": item["error"]["S"] if "error" in item else None,
+            "attempts": int(item["attempts"]["N"]),
+            "createdAt": float(item["created_at"]["N"]),
+            "updatedAt": float(item["updated_at"]["N"]),
+        }
+        if "request" in item:
+            job["request"] = json.loads(item["request"]["S"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        item = self.client.get_item(
+            TableName=self.table_name, Key={"JobID": {"S": job_id}}, ConsistentRead=True
+        ).get("Item")
+        return self._job(item) if item is not None else None
+
+    def get_many(self, job_ids: List[str], with_result: bool = True) -> Dict[str, Dict[str, Any]]:
+        jobs = {}
+        names = {"#s": "status", "#e": "error"}
+        projection = "JobID, #s, #e, attempts, created_at, updated_at"
+        if with_result:
+            names["#r"] = "result"
+            projection += ", #r"
+        for start in range(0, len(job_ids), BATCH_GET_LIMIT):
+            keys = [{"JobID": {"S": job_id}} for job_id in job_ids[start:start + BATCH_GET_LIMIT]]
+            request = {self.table_name: {"Keys": keys, "ConsistentRead": True,
+                                         "ProjectionExpression": projection, "ExpressionAttributeNames": names}}
+            for attempt in range(BATCH_MAX_ROUNDS):
+                response = self.client.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self.table_name, []):
+                    job = self._job(item)
+                    jobs[job["jobId"]] = job
+                request = response.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                time.sleep(0.05 * (2 ** attempt))
+        return jobs
+
+    def update(self, job_id: str, status: str, attempts: int, result: Any = None, error: Optional[str] = None):
+        names = {"#s": "status"}
+        values = {":s": {"S": status}, ":a": {"N": str(attempts)}, ":u": {"N": str(time.time())}}
+        sets = ["#s = :s", "attempts = :a", "updated_at = :u"]
+        removes = []
+        # "error" and "result" are DynamoDB reserved words, so always go through #names
+        for field_name, value in (("result", dumps(result).decode() if result is not None else None), ("error", error)):
+            names[f"#{field_name}"] = field_name
+            if value is None:
+                removes.append(f"#{field_name}")
+            else:
+                sets.append(f"#{field_name} = :{field_name}")
+                values[f":{field_name}"] = {"S": value}
+        expression = "SET " + ", ".join(sets) + (" REMOVE " + ", ".join(removes) if removes else "")
+        self.client.update_item(
+            TableName=self.table_name, Key={"JobID": {"S": job_id}}, UpdateExpression=expression,
+            ExpressionAttributeNames=names, ExpressionAttributeValues=values,
+        )
+
+    def start(self, job_id: str, attempts: int) -> bool:
+        try:
+            self.client.update_item(
+                TableName=self.table_name, Key={"JobID": {"S": job_id}},
+                UpdateExpression="SET #s = :running, attempts = :a, updated_at = :u",
+                ConditionExpression="#s IN (:queued, :running)",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":running": {"S": "running"}, ":queued": {"S": "queued"},
+                                           ":a": {"N": str(attempts)}, ":u": {"N": str(time.time())}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        try:
+            self.client.update_item(
+                TableName=self.table_name, Key={"JobID": {"S": job_id}},
+                UpdateExpression="SET #s = :cancelled, updated_at = :u",
+                ConditionExpression="#s = :queued",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":cancelled": {"S": "cancelled"}, ":queued": {"S": "queued"},
+                                           ":u": {"N": str(time.time())}},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+
+# ---------- submission + workers ----------
+
+class AnalysisJobs:
+    """
+    Agent analysis as queued jobs: the HTTP request only records the job and
+    enqueues its ID (202), a worker runs call_bedrock_agent, and the client polls
+    the job record. Failed runs are retried with backoff up to MAX_ATTEMPTS by
+    letting the message become visible again.
+    """
+
+    def __init__(self, store=None, queue=None):
+        if store is None or queue is None:
+            if ANALYSIS_QUEUE_URL and ANALYSIS_JOBS_TABLE:
+                store, queue = DynamoJobStore(), SQSQueue()
+            else:
+                local = SQLiteJobQueue()
+                store, queue = local, local
+        self.store = store
+        self.queue = queue
+        # SQS jobs are run by the worker Lambda; local jobs by a task in this process
+        self.in_process = isinstance(queue, SQLiteJobQueue)
+        self._worker_task: Optional[asyncio.Task] = None
+
+    async def submit(self, request: Dict[str, Any], service_factory=None, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Record and enqueue a job. A caller-chosen `job_id` that already exists raises JobExists.
+        """
+        job_id = job_id or str(uuid.uuid4())
+        await asyncio.to_thread(self.store.create, job_id, request)
+        await asyncio.to_thread(self.queue.send, job_id)
+        metrics.record("analysis_jobs.submitted", 1)
+        if self.in_process and service_factory is not None:
+            self.ensure_local_worker(service_factory)
+        return {"jobId": job_id, "status": "queued"}
+
+    async def submit_many(self, jobs: List[Tuple[str, Dict[str, Any]]], service_factory=None):
+        """
+        Record and enqueue several (job_id, request) pairs with batched writes.
+        """
+        await asyncio.to_thread(self.store.create_many, jobs)
+        await asyncio.to_thread(self.queue.send_many, [job_id for job_id, _ in jobs])
+        metrics.record("analysis_jobs.submitted", len(jobs))
+        if self.in_process and service_factory is not None:
+            self.ensure_local_worker(service_factory)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None:
+            job.pop("request", None)
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued job; the worker drops its message when it is received.
+        """
+        cancelled = await asyncio.to_thread(self.store.cancel, job_id)
+        if cancelled:
+            metrics.record("analysis_jobs.cancelled", 1)
+        return cancelled
+
+    async def wait(self, job_id: str, timeout: float, interval: float = 0.5) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: return as soon as the job is terminal, or its current state after `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(interval)
+
+    def ensure_local_worker(self, service_factory):
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self.run_worker(service_factory(), poll_interval=0.2))
+
+    async def process(self, message: QueueMessage, service) -> bool:
+        """
+        Run one received job. True when the message is finished with (done, failed
+        for good, or unknown job); False when it should be retried.
+        """
+        job = await asyncio.to_thread(self.store.get, message.job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            # Duplicate delivery of a finished job (SQS is at-least-once), or a cancelled one
+            await asyncio.to_thread(self.queue.delete, message)
+            return True
+
+        if not await asyncio.to_thread(self.store.start, message.job_id, message.receive_count):
+            # Cancelled between the read above and now
+            await asyncio.to_thread(self.queue.delete, message)
+            return True
+        heartbeat = asyncio.create_task(self._keep_invisible(message))
+        request = job["request"]
+        # Batch items queue behind interactive work unless triage finds a red flag
+        priority = (triage_priority(request["transcript"], urgent=request.get("urgent", False), default=BULK)
+                    if request.get("bulk") else None)
+        try:
+            with metrics.timer("analysis_jobs.run_ms"):
+                result = await service.call_bedrock_agent(
+                    transcript=request["transcript"],
+                    patient=request.get("patient"),
+                    consult_id=request.get("consult_id"),
+                    urgent=request.get("urgent", False),
+                    priority=priority,
+                    raise_errors=True,
+                    soap_note=request.get("soap_note"),
+                    speculative=request.get("speculative", False),
+                )
+        except Exception as e:
+            print(f"Analysis job {message.job_id} attempt {message.receive_count} failed: {str(e)}")
+            if message.receive_count >= MAX_ATTEMPTS:
+                await asyncio.to_thread(self.store.update, message.job_id, "failed", message.receive_count, error=str(e))
+                await asyncio.to_thread(self.queue.delete, message)
+                metrics.record("analysis_jobs.failed", 1)
+                return True
+            await asyncio.to_thread(self.store.update, message.job_id, "queued", message.receive_count, error=str(e))
+            # Becomes visible again after an exponential backoff instead of the full visibility timeout
+            await asyncio.to_thread(self.queue.change_visibility, message,
+                                    RETRY_BASE_SECONDS * 2 ** (message.receive_count - 1))
+            metrics.record("analysis_jobs.retried", 1)
+            return False
+        finally:
+            heartbeat.cancel()
+
+        await asyncio.to_thread(self.store.update, message.job_id, "completed", message.receive_count, result=result)
+        await asyncio.to_thread(self.queue.delete, message)
+        metrics.record("analysis_jobs.queue_to_done_ms", (time.time() - job["createdAt"]) * 1000)
+        return True
+
+    async def _keep_invisible(self, message: QueueMessage):
+        # Agent runs can outlast the visibility timeout; keep pushing it out while we work
+        while True:
+            await asyncio.sleep(VISIBILITY_TIMEOUT_SECONDS / 2)
+            try:
+                await asyncio.to_thread(self.queue.change_visibility, message, VISIBILITY_TIMEOUT_SECONDS)
+            except Exception as e:
+                print(f"Visibility heartbeat failed for job {message.job_id}: {str(e)}")
+
+    async def run_worker(self, service, poll_interval: float = 0.0, stop: Optional[asyncio.Event] = None):
+        """
+        Long-running poller (local in-process worker, container, or `python worker.py`),
+        running up to WORKER_CONCURRENCY jobs at once.
+        """
+        slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+        running = set()
+        while stop is None or not stop.is_set():
+            await slots.acquire()
+            try:
+                message = await asyncio.to_thread(self.queue.receive)
+            except Exception as e:
+                slots.release()
+                print(f"Analysis queue receive failed: {str(e)}")
+                await asyncio.sleep(max(poll_interval, 1.0))
+                continue
+            if message is None:
+                slots.release()
+                if poll_interval:
+                    await asyncio.sleep(poll_interval)
+                continue
+
+            async def run(message=message):
+                try:
+                    await self.process(message, service)
+                except Exception as e:
+                    print(f"Analysis worker error on job {message.job_id}: {str(e)}")
+                finally:
+                    slots.release()
+
+            task = asyncio.create_task(run())
+            running.add(task)
+            task.add_done_callback(running.discard)
+        await asyncio.gather(*running)
+
+    async def handle_sqs_event(self, event: Dict[str, Any], service) -> Dict[str, Any]:
+        """
+        SQS-triggered worker Lambda. Returns partial batch failures so only the failed
+        messages are redelivered (needs ReportBatchItemFailures on the event source mapping).
+        """
+        messages = [
+            QueueMessage(
+                job_id=record["body"], receipt=record["receiptHandle"],
+                receive_count=int(record["attributes"]["ApproximateReceiveCount"]),
+                message_id=record["messageId"],
+            )
+            for record in event.get("Records", [])
+        ]
+        outcomes = await asyncio.gather(*(self.process(m, service) for m in messages), return_exceptions=True)
+        failures: List[Dict[str, str]] = [
+            {"itemIdentifier": m.message_id} for m, ok in zip(messages, outcomes) if ok is not True
+        ]
+        return {"batchItemFailures": failures}
+
+
+analysis_jobs = AnalysisJobs()
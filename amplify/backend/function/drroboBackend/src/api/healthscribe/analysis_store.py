@@ -0,0 +1,437 @@
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Callable
+
+import boto3
+
+from . import metrics
+from .responses import dumps
+
+# Append-only history of agent analyses, per patient and newest first.
+# Prod: DynamoDB table (PatientID hash key, AnalysisID range key). Locally: a SQLite file.
+ANALYSIS_TABLE = os.getenv("VITE_ANALYSIS_TABLE")
+ANALYSIS_STORE_DB = os.getenv("ANALYSIS_STORE_DB") or os.path.join(tempfile.gettempdir(), "drrobo_analyses.sqlite3")
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+
+# The writer thread commits whatever has queued up, up to this many records at a time
+WRITE_BATCH_SIZE = 25  # DynamoDB BatchWriteItem maximum
+WRITE_QUEUE_MAX = int(os.getenv("ANALYSIS_WRITE_QUEUE_MAX", "10000"))
+BATCH_WRITE_MAX_ROUNDS = 5
+MAX_PAGE_SIZE = 100
+
+
+_id_lock = threading.Lock()
+_last_id_ms = 0
+
+
+def new_analysis_id(now: Optional[float] = None) -> str:
+    """
+    Millisecond timestamp + random suffix: unique, and sorts by creation time,
+    so it doubles as the range key and the pagination cursor. Within a process
+    the timestamp is bumped to stay strictly increasing, so analyses recorded in
+    the same millisecond still list in the order they were made.
+    """
+    global _last_id_ms
+    ms = int((now if now is not None else time.time()) * 1000)
+    with _id_lock:
+        ms = _last_id_ms = max(ms, _last_id_ms + 1)
+    return f"{ms:013d}-{uuid.uuid4().hex[:12]}"
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The few fields a history list shows, so listing never needs the full payload.
+    """
+    diagnosis = result.get("diagnosis") or {}
+    primary = diagnosis.get("primary") if isinstance(diagnosis, dict) else None
+    safety = result.get("safety") or {}
+    return {
+        "primaryCondition": primary.get("condition") if isinstance(primary, dict) else None,
+        "icdCodes": [c.get("code") for c in result.get("icd_codes") or [] if isinstance(c, dict) and c.get("code")],
+        "redFlags": len(safety.get("red_flags") or []),
+        "contraindications": len(safety.get("contraindications_found") or []),
+    }
+
+
+@dataclass
+class AnalysisRecord:
+    analysis_id: str
+    patient_id: str
+    consult_id: Optional[str]
+    created_at: float
+    mode: str
+    summary: Dict[str, Any]
+    payload: Dict[str, Any]  # transcript, soapNote, result
+
+
+# ---------- local: SQLite ----------
+
+class SQLiteAnalysisStore:
+    """
+    Summaries and payloads live in separate tables: listing a patient's history
+    is a range scan over the (patient_id, analysis_id) primary key that never
+    touches the large payload rows.
+    """
+
+    def __init__(self, path: str = ANALYSIS_STORE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so forked server workers each get their own connection
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                patient_id TEXT, analysis_id TEXT, consult_id TEXT, created_at REAL, mode TEXT, summary TEXT,
+                PRIMARY KEY (patient_id, analysis_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS analysis_payloads (
+                patient_id TEXT, analysis_id TEXT, payload TEXT,
+                PRIMARY KEY (patient_id, analysis_id)
+            ) WITHOUT ROWID;
+        """)
+        return db
+
+    def put_many(self, records: List[AnalysisRecord]):
+        with self._lock:
+            # One transaction per batch: a single WAL sync however many records queued up
+            self._db.execute("BEGIN")
+            try:
+                # Append-only: a record retried after a partial failure is ignored, not overwritten
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                    [(r.patient_id, r.analysis_id, r.consult_id, r.created_at, r.mode, json.dumps(r.summary))
+                     for r in records],
+                )
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO analysis_payloads VALUES (?, ?, ?)",
+                    [(r.patient_id, r.analysis_id, dumps(r.payload).decode()) for r in records],
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def list(self, patient_id: str, limit: int, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        (summaries newest first, whether there are more).
+        """
+        query = "SELECT analysis_id, consult_id, created_at, mode, summary FROM analyses WHERE patient_id = ?"
+        params: list = [patient_id]
+        if before:
+            query += " AND analysis_id < ?"
+            params.append(before)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY analysis_id DESC LIMIT ?", (*params, limit + 1)).fetchall()
+        summaries = [
+            {"analysisId": row[0], "patientId": patient_id, "consultId": row[1], "createdAt": row[2],
+             "mode": row[3], **json.loads(row[4])}
+            for row in rows[:limit]
+        ]
+        return summaries, len(rows) > limit
+
+    def iter_records(self, patient_id: str, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Full records oldest first, optionally only those with an ID after `after`.
+        """
+        query = ("SELECT a.analysis_id, a.consult_id, a.created_at, p.payload FROM analyses a "
+                 "JOIN analysis_payloads p USING (patient_id, analysis_id) WHERE a.patient_id = ?")
+        params: list = [patient_id]
+        if after:
+            query += " AND a.analysis_id > ?"
+            params.append(after)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY a.analysis_id", params).fetchall()
+        for row in rows:
+            yield {"analysisId": row[0], "patientId": patient_id, "consultId": row[1], "createdAt": row[2],
+                   **json.loads(row[3])}
+
+    def iter_pages(self, since: Optional[float] = None, page_size: int = 500,
+                   after: Optional[Tuple[str, str]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Every stored record (created at or after `since`, keyed after `after`), a
+        page at a time in key order. Keyset pagination: each page is one short query,
+        so memory stays at one page and writers aren't blocked for the whole export.
+        """
+        last = tuple(after) if after else ("", "")
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT a.patient_id, a.analysis_id, a.consult_id, a.created_at, p.payload FROM analyses a "
+                    "JOIN analysis_payloads p USING (patient_id, analysis_id) "
+                    "WHERE (a.patient_id, a.analysis_id) > (?, ?) AND a.created_at >= ? "
+                    "ORDER BY a.patient_id, a.analysis_id LIMIT ?",
+                    (*last, since or 0.0, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield [{"analysisId": row[1], "patientId": row[0], "consultId": row[2], "createdAt": row[3],
+                    **json.loads(row[4])} for row in rows]
+            last = (rows[-1][0], rows[-1][1])
+
+    def get(self, patient_id: str, analysis_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT a.consult_id, a.created_at, a.mode, a.summary, p.payload FROM analyses a "
+                "JOIN analysis_payloads p USING (patient_id, analysis_id) "
+                "WHERE a.patient_id = ? AND a.analysis_id = ?",
+                (patient_id, analysis_id),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"analysisId": analysis_id, "patientId": patient_id, "consultId": row[0], "createdAt": row[1],
+                "mode": row[2], **json.loads(row[3]), **json.loads(row[4])}
+
+
+# ---------- prod: DynamoDB ----------
+
+class DynamoAnalysisStore:
+    """
+    One item per analysis. summary and payload are JSON strings (floats would
+    otherwise need Decimal); list() projects only the summary attributes, so
+    pages stay small however large the stored payloads are.
+    """
+
+    def __init__(self, table_name: str = ANALYSIS_TABLE, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "dynamodb",
+                region_name=os.environ.get("VITE_AWS_REGION", "us-east-1"),
+                endpoint_url=DYNAMODB_ENDPOINT_URL
+            )
+        return self._client
+
+    def _item(self, record: AnalysisRecord) -> Dict[str, Any]:
+        item = {
+            "PatientID": {"S": record.patient_id},
+            "AnalysisID": {"S": record.analysis_id},
+            "created_at": {"N": str(record.created_at)},
+            "mode": {"S": record.mode},
+            "summary": {"S": json.dumps(record.summary)},
+            "payload": {"S": dumps(record.payload).decode()},
+        }
+        if record.consult_id:
+            item["consult_id"] = {"S": record.consult_id}
+        return item
+
+    def put_many(self, records: List[AnalysisRecord]):
+        request = {self.table_name: [{"PutRequest": {"Item": self._item(r)}} for r in records]}
+        for attempt in range(BATCH_WRITE_MAX_ROUNDS):
+            response = self.client.batch_write_item(RequestItems=request)
+            request = response.get("UnprocessedItems") or {}
+            if not request:
+                return
+            # Throttled writes: back off before retrying just those
+            time.sleep(0.05 * (2 ** attempt))
+        raise RuntimeError(f"{len(request.get(self.table_name, []))} analysis records still unprocessed")
+
+    def list(self, patient_id: str, limit: int, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        params = dict(
+            TableName=self.table_name,
+            KeyConditionExpression="PatientID = :p",
+            ExpressionAttributeValues={":p": {"S": patient_id}},
+            # "mode" is a DynamoDB reserved word
+            ProjectionExpression="AnalysisID, consult_id, created_at, #mode, summary",
+            ExpressionAttributeNames={"#mode": "mode"},
+            ScanIndexForward=False,
+            Limit=limit + 1,
+        )
+        if before:
+            params["ExclusiveStartKey"] = {"PatientID": {"S": patient_id}, "AnalysisID": {"S": before}}
+        items = self.client.query(**params).get("Items", [])
+        summaries = [
+            {"analysisId": item["AnalysisID"]["S"], "patientId": patient_id,
+             "consultId": item["consult_id"]["S"] if "consult_id" in item else None,
+             "createdAt": float(item["created_at"]["N"]), "mode": item["mode"]["S"],
+             **json.loads(item["summary"]["S"])}
+            for item in items[:limit]
+        ]
+        return summaries, len(items) > limit
+
+    def iter_records(self, patient_id: str, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        condition = "PatientID = :p"
+        values = {":p": {"S": patient_id}}
+        if after:
+            condition += " AND AnalysisID > :after"
+            values[":after"] = {"S": after}
+        params = dict(TableName=self.table_name, KeyConditionExpression=condition,
+                      ExpressionAttributeValues=values, ScanIndexForward=True)
+        while True:
+            response = self.client.query(**params)
+            for item in response.get("Items", []):
+                yield self._record(item)
+            if "LastEvaluatedKey" not in response:
+                return
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def iter_pages(self, since: Optional[float] = None, page_size: int = 500,
+                   after: Optional[Tuple[str, str]] = None) -> Iterator[List[Dict[str, Any]]]:
+        params = dict(TableName=self.table_name, Limit=page_size)
+        if after:
+            # Scans resume from any key, whether or not that item still exists
+            params["ExclusiveStartKey"] = {"PatientID": {"S": after[0]}, "AnalysisID": {"S": after[1]}}
+        if since:
+            params.update(FilterExpression="created_at >= :since",
+                          ExpressionAttributeValues={":since": {"N": str(since)}})
+        while True:
+            response = self.client.scan(**params)
+            page = [self._record(item) for item in response.get("Items", [])]
+            if page:
+                yield page
+            if "LastEvaluatedKey" not in response:
+                return
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _record(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {"analysisId": item["AnalysisID"]["S"], "patientId": item["PatientID"]["S"],
+                "consultId": item["consult_id"]["S"] if "consult_id" in item else None,
+                "createdAt": float(item["created_at"]["N"]), **json.loads(item["payload"]["S"])}
+
+    def get(self, patient_id: str, analysis_id: str) -> Optional[Dict[str, Any]]:
+        item = self.client.get_item(
+            TableName=self.table_name,
+            Key={"PatientID": {"S": patient_id}, "AnalysisID": {"S": analysis_id}},
+        ).get("Item")
+        if item is None:
+            return None
+        return {"analysisId": analysis_id, "patientId": patient_id,
+                "consultId": item["consult_id"]["S"] if "consult_id" in item else None,
+                "createdAt": float(item["created_at"]["N"]), "mode": item["mode"]["S"],
+                **json.loads(item["summary"]["S"]), **json.loads(item["payload"]["S"])}
+
+
+# ---------- async writer ----------
+
+class AnalysisHistory:
+    """
+    record() only enqueues; a background thread writes batches to the store, so
+    the analysis response never waits on DynamoDB/SQLite. Failed batches are
+    retried once per record and then dropped with a log line (history is a
+    convenience copy; the clinician already has the result).
+    """
+
+    def __init__(self, store=None):
+        if store is None:
+            store = DynamoAnalysisStore() if ANALYSIS_TABLE else SQLiteAnalysisStore()
+        self.store = store
+        self._queue: "queue.Queue[AnalysisRecord]" = queue.Queue(maxsize=WRITE_QUEUE_MAX)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        # Called from the writer thread with each batch once it is stored (e.g. the search index)
+        self.listeners: List[Callable[[List[AnalysisRecord]], None]] = []
+
+    def record(self, patient_id: str, consult_id: Optional[str], mode: str, transcript: str,
+               result: Dict[str, Any], soap_note: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        now = time.time()
+        record = AnalysisRecord(
+            analysis_id=new_analysis_id(now), patient_id=patient_id, consult_id=consult_id,
+            created_at=now, mode=mode, summary=summarize(result),
+            payload={"transcript": transcript, "soapNote": soap_note, "result": result},
+        )
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.record("analysis_store.dropped", 1)
+            print(f"⚠️ Analysis history queue full, dropping record for patient {patient_id}")
+            return None
+        return record.analysis_id
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until everything queued so far is written. Used before reads (so a
+        client sees its own analyses) and by the worker Lambda before it returns.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def list(self, patient_id: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with metrics.timer("analysis_store.list_ms"):
+            summaries, more = self.store.list(patient_id, limit, before=cursor)
+        return {
+            "patientId": patient_id,
+            "analyses": summaries,
+            "nextCursor": summaries[-1]["analysisId"] if more and summaries else None,
+        }
+
+    def get(self, patient_id: str, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(patient_id, analysis_id)
+
+    def _ensure_writer(self):
+        # Threads don't survive fork: a preforked server worker starts its own
+        if self._writer is not None and self._writer_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer = threading.Thread(target=self._write_loop, name="analysis-history-writer", daemon=True)
+                self._writer_pid = os.getpid()
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[AnalysisRecord]):
+        started = time.perf_counter()
+        try:
+            self.store.put_many(batch)
+        except Exception as e:
+            print(f"⚠️ Analysis history batch write failed ({len(batch)} records), retrying singly: {str(e)}")
+            for record in batch:
+                try:
+                    self.store.put_many([record])
+                except Exception as e:
+                    metrics.record("analysis_store.dropped", 1)
+                    print(f"⚠️ Dropping analysis {record.analysis_id} for patient {record.patient_id}: {str(e)}")
+                else:
+                    self._notify([record])
+            return
+        metrics.record("analysis_store.batch_write_ms", (time.perf_counter() - started) * 1000)
+        metrics.record("analysis_store.batch_size", len(batch))
+        self._notify(batch)
+
+    def _notify(self, records: List[AnalysisRecord]):
+        for listener in self.listeners:
+            try:
+                listener(records)
+            except Exception as e:
+                print(f"⚠️ Analysis history listener failed: {str(e)}")
+
+
+analysis_history = AnalysisHistory()
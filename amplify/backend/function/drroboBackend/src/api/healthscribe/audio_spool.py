@@ -0,0 +1,171 @@
+import io
+import mmap
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from . import metrics
+
+# Recordings up to this size stay in memory; larger ones spill to a temp file
+AUDIO_SPOOL_MEMORY_BYTES = int(os.getenv("AUDIO_SPOOL_MEMORY_BYTES", str(8 * 1024 * 1024)))
+# Hard cap on a single recording (Lambda /tmp is 512 MB by default)
+AUDIO_SPOOL_MAX_BYTES = int(os.getenv("AUDIO_SPOOL_MAX_BYTES", str(400 * 1024 * 1024)))
+AUDIO_SPOOL_DIR = os.getenv("AUDIO_SPOOL_DIR") or None  # None -> tempfile default (/tmp on Lambda)
+# S3 multipart part size (S3 minimum is 5 MiB for every part but the last)
+S3_PART_BYTES = int(os.getenv("S3_PART_BYTES", str(8 * 1024 * 1024)))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class AudioTooLarge(ValueError):
+    pass
+
+
+class _ViewReader(io.RawIOBase):
+    """
+    Seekable file-like over a memoryview, so botocore can stream (and re-read on retry)
+    an S3 part straight out of the spool without copying it into a bytes object.
+    """
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), len(self._view) - self._pos)
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, min(len(self._view), base + offset))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+
+class AudioSpool:
+    """
+    Append-only audio buffer. Small recordings live in a bytearray; once a recording
+    passes `memory_bytes` it moves to an anonymous temp file (already unlinked, so the
+    OS reclaims it even if the process dies) and is read back through mmap.
+    Use as a context manager, or call close(), to release the buffer/file.
+    """
+
+    def __init__(self, memory_bytes: int = AUDIO_SPOOL_MEMORY_BYTES, max_bytes: int = AUDIO_SPOOL_MAX_BYTES):
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._buffer: Optional[bytearray] = bytearray()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes):
+        if self._map is not None:
+            raise ValueError("Spool is read-only once parts have been taken")
+        if self.size + len(data) > self.max_bytes:
+            raise AudioTooLarge(f"Recording exceeds the {self.max_bytes} byte limit")
+        if self._file is None and self.size + len(data) > self.memory_bytes:
+            self._file = tempfile.TemporaryFile(dir=AUDIO_SPOOL_DIR)
+            self._file.write(self._buffer)
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._buffer += data
+        self.size += len(data)
+
+    async def write_upload(self, upload, chunk_size: int = READ_CHUNK_BYTES):
+        """
+        Copy a FastAPI UploadFile in chunks instead of one read() of the whole file.
+        """
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                return
+            self.write(chunk)
+
+    def view(self) -> memoryview:
+        """
+        Zero-copy view over everything written so far.
+        """
+        if self._file is None:
+            return memoryview(self._buffer)
+        if self._map is None:
+            if not self.size:
+                return memoryview(b"")
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def parts(self, part_bytes: int = S3_PART_BYTES) -> Iterator[memoryview]:
+        view = self.view()
+        for offset in range(0, self.size, part_bytes):
+            yield view[offset:offset + part_bytes]
+
+    def upload_to_s3(self, s3, bucket: str, key: str, content_type: str, part_bytes: int = S3_PART_BYTES):
+        """
+        One put_object for small recordings, otherwise a multipart upload with parts
+        read straight from the spool (aborted if any part fails).
+        """
+        metrics.record("audio.spool_bytes", self.size, storage="disk" if self.on_disk else "memory")
+        start = time.perf_counter()
+        if self.size <= part_bytes:
+            s3.put_object(Bucket=bucket, Key=key, Body=_ViewReader(self.view()), ContentType=content_type)
+        else:
+            self._multipart_upload(s3, bucket, key, content_type, part_bytes)
+        metrics.record("audio.upload_ms", (time.perf_counter() - start) * 1000)
+
+    def _multipart_upload(self, s3, bucket: str, key: str, content_type: str, part_bytes: int):
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+
+        def upload_part(numbered):
+            number, part = numbered
+            response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                      PartNumber=number, Body=_ViewReader(part))
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        try:
+            with ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY) as pool:
+                completed = list(pool.map(upload_part, enumerate(self.parts(part_bytes), start=1)))
+            s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={"Parts": completed})
+        except Exception:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A part view is still referenced somewhere; the file close below still frees the disk
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = None
+
+    def __enter__(self) -> "AudioSpool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
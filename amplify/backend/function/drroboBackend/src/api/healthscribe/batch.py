@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import os
+import re
+import uuid
+from typing import Optional, Dict, Any, List, Set
+
+from .analysis_jobs import analysis_jobs, TERMINAL_STATUSES
+
+MAX_BATCH_ITEMS = int(os.getenv("AGENT_BATCH_MAX_ITEMS", "200"))
+
+# A batch is a manifest record plus one analysis job per item, all in the job
+# store (DynamoDB in prod, SQLite locally). Items run on the analysis workers
+# (the SQS worker Lambda in prod), so a batch keeps going after the 202 and its
+# progress can be read from any container.
+
+BATCH_STATUS = "batch"
+_CURSOR_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def item_job_id(batch_id: str, index: int) -> str:
+    return f"{batch_id}:{index:04d}"
+
+
+def encode_cursor(seen: Set[int], size: int) -> str:
+    """
+    Cursor = bitmap of the item indexes already returned (25 bytes for 200 items).
+    """
+    bits = bytearray((size + 7) // 8)
+    for index in seen:
+        bits[index // 8] |= 1 << (index % 8)
+    return base64.urlsafe_b64encode(bytes(bits)).decode("ascii").rstrip("=")
+
+
+def parse_cursor(cursor: Optional[str], size: int) -> Set[int]:
+    """
+    Item indexes the client already has; none for a missing or unreadable cursor.
+    """
+    if not cursor or not _CURSOR_PATTERN.fullmatch(cursor):
+        return set()
+    try:
+        bits = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    except ValueError:
+        return set()
+    if len(bits) != (size + 7) // 8:
+        return set()
+    return {i for i in range(size) if bits[i // 8] >> (i % 8) & 1}
+
+
+class AnalysisBatches:
+    """
+    Batch submission and progress on top of the analysis job queue. Failed items
+    are retried by the workers (raise_errors=True) and end up "failed" with the
+    error instead of a placeholder plan.
+    """
+
+    def __init__(self, jobs=analysis_jobs):
+        self.jobs = jobs
+
+    async def submit(self, items: List[Dict[str, Any]], service_factory=None) -> Dict[str, Any]:
+        batch_id = str(uuid.uuid4())
+        manifest = {"size": len(items), "consultIds": [item.get("consult_id") for item in items]}
+        await asyncio.to_thread(self.jobs.store.create, batch_id, manifest, BATCH_STATUS)
+        await self.jobs.submit_many(
+            [(item_job_id(batch_id, n), {**item, "bulk": True, "batch_id": batch_id})
+             for n, item in enumerate(items)],
+            service_factory,
+        )
+        return {"batchId": batch_id, "status": "queued", "total": len(items), "completed": 0, "failed": 0}
+
+    async def get(self, batch_id: str, cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Progress plus the finished items not yet returned for `cursor` and the
+        cursor to send next time, so the client only downloads each result once.
+        The cursor records which items were returned rather than a time, since
+        items finish on different workers whose commits and clocks don't line up.
+        """
+        manifest = await asyncio.to_thread(self.jobs.store.get, batch_id)
+        if manifest is None or manifest["status"] != BATCH_STATUS:
+            return None
+        consult_ids = manifest["request"]["consultIds"]
+        job_ids = [item_job_id(batch_id, n) for n in range(manifest["request"]["size"])]
+        # Statuses first; results only for the items the client hasn't seen
+        states = await asyncio.to_thread(self.jobs.store.get_many, job_ids, False)
+        seen = parse_cursor(cursor, len(job_ids))
+        done = sorted((job["updatedAt"], n) for n, job in ((n, states.get(job_id)) for n, job_id in enumerate(job_ids))
+                      if n not in seen and job is not None and job["status"] in TERMINAL_STATUSES)
+        results = await asyncio.to_thread(self.jobs.store.get_many, [job_ids[n] for _, n in done]) if done else {}
+
+        statuses = [states[job_id]["status"] if job_id in states else "queued" for job_id in job_ids]
+        completed = statuses.count("completed")
+        failed = sum(1 for s in statuses if s in TERMINAL_STATUSES and s != "completed")
+        if completed + failed == len(job_ids):
+            status = "completed"
+        else:
+            status = "running" if any(s != "queued" for s in statuses) else "queued"
+        items = []
+        for _, n in done:
+            job = results.get(job_ids[n]) or states[job_ids[n]]
+            items.append({"index": n, "consult_id": consult_ids[n], "status": job["status"],
+                          "result": job["result"], "error": job["error"]})
+        return {
+            "batchId": batch_id,
+            "status": status,
+            "total": len(job_ids),
+            "completed": completed,
+            "failed": failed,
+            "items": items,
+            "cursor": encode_cursor(seen | {n for _, n in done}, len(job_ids)),
+        }
+
+
+batches = AnalysisBatches()
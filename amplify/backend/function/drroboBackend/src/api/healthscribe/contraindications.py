@@ -0,0 +1,449 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from . import metrics
+from .cache import LRUTTLCache, MISSING
+from .formulary import FORMULARY
+from .medications import compile_word_trie, iter_trie_matches, iter_mentions, parse_treatment_plan
+
+# Deterministic safety check of the agent's proposed medications against the
+# patient's Digital Twin (allergies, medications that failed or weren't tolerated,
+# current medications). Everything is looked up in tables compiled at import, so a
+# check is a handful of dict/set lookups and never waits on the agent remembering
+# to consult the history.
+
+PROFILE_CACHE_SIZE = int(os.getenv("SAFETY_PROFILE_CACHE_SIZE", "1000"))
+
+SEVERITY_RANK = {"high": 3, "moderate": 2, "low": 1}
+
+# Broader classes a class belongs to (allergy to "beta-lactam" covers all of them)
+CLASS_PARENTS = {
+    "penicillin": "beta-lactam", "cephalosporin": "beta-lactam", "carbapenem": "beta-lactam",
+    "cox-2 inhibitor": "nsaid",
+    "vitamin k antagonist": "anticoagulant", "doac": "anticoagulant", "low molecular weight heparin": "anticoagulant",
+    "ssri": "antidepressant", "snri": "antidepressant", "tricyclic antidepressant": "antidepressant",
+    "loop diuretic": "diuretic", "thiazide diuretic": "diuretic", "potassium-sparing diuretic": "diuretic",
+    "inhaled corticosteroid": "corticosteroid",
+}
+
+# How allergies and histories name classes -> class
+CLASS_ALIASES = {
+    "penicillins": "penicillin", "penicillin": "penicillin", "beta lactam": "beta-lactam",
+    "beta lactams": "beta-lactam", "cephalosporins": "cephalosporin", "carbapenems": "carbapenem",
+    "sulfa": "sulfonamide", "sulpha": "sulfonamide", "sulfa drugs": "sulfonamide", "sulphonamide": "sulfonamide",
+    "sulfonamides": "sulfonamide", "sulphonamides": "sulfonamide",
+    "macrolides": "macrolide", "quinolones": "fluoroquinolone", "fluoroquinolones": "fluoroquinolone",
+    "tetracyclines": "tetracycline", "aminoglycosides": "aminoglycoside",
+    "nsaids": "nsaid", "nsaid": "nsaid", "anti inflammatories": "nsaid", "anti inflammatory": "nsaid",
+    "opioids": "opioid", "opiates": "opioid", "opiate": "opioid",
+    "ace inhibitors": "ace inhibitor", "ace i": "ace inhibitor", "acei": "ace inhibitor", "acei s": "ace inhibitor",
+    "arbs": "angiotensin receptor blocker", "arb": "angiotensin receptor blocker",
+    "angiotensin receptor blockers": "angiotensin receptor blocker",
+    "beta blockers": "beta blocker", "calcium channel blockers": "calcium channel blocker",
+    "statins": "statin", "ssris": "ssri", "benzodiazepines": "benzodiazepine",
+    "anticoagulants": "anticoagulant", "blood thinners": "anticoagulant", "doacs": "doac",
+    "salicylates": "salicylate", "gabapentinoids": "gabapentinoid",
+    "proton pump inhibitors": "proton pump inhibitor", "ppis": "proton pump inhibitor", "ppi": "proton pump inhibitor",
+}
+
+# Classes where an allergy to one member is an allergy to the class
+ALLERGY_CLASSES = frozenset([
+    "penicillin", "cephalosporin", "carbapenem", "beta-lactam", "sulfonamide", "macrolide", "fluoroquinolone",
+    "tetracycline", "nsaid", "salicylate", "opioid", "ace inhibitor",
+])
+
+# Allergy to the first class -> caution with the second
+CROSS_REACTIVITY = [
+    ("penicillin", "cephalosporin", "moderate", "cross-reactivity with penicillin allergy (1-2%); check the reaction type"),
+    ("penicillin", "carbapenem", "low", "cross-reactivity with penicillin allergy (<1%)"),
+    ("cephalosporin", "penicillin", "moderate", "cross-reactivity with cephalosporin allergy"),
+    ("ace inhibitor", "angiotensin receptor blocker", "moderate", "angioedema can recur on an ARB after ACE inhibitor angioedema"),
+    ("nsaid", "salicylate", "high", "NSAID hypersensitivity usually includes aspirin"),
+]
+
+# (drug or class, drug or class, severity, reason); symmetric
+INTERACTIONS = [
+    ("anticoagulant", "nsaid", "high", "bleeding risk"),
+    ("anticoagulant", "antiplatelet", "high", "bleeding risk"),
+    ("anticoagulant", "anticoagulant", "high", "duplicate anticoagulation"),
+    ("warfarin", "macrolide", "high", "raised INR"),
+    ("warfarin", "fluoroquinolone", "moderate", "raised INR"),
+    ("warfarin", "azole antifungal", "high", "raised INR"),
+    ("warfarin", "metronidazole", "high", "raised INR"),
+    ("warfarin", "co-trimoxazole", "high", "raised INR"),
+    ("warfarin", "amiodarone", "high", "raised INR"),
+    ("ace inhibitor", "angiotensin receptor blocker", "moderate", "dual RAAS blockade: hyperkalaemia and renal impairment"),
+    ("ace inhibitor", "potassium-sparing diuretic", "moderate", "hyperkalaemia"),
+    ("angiotensin receptor blocker", "potassium-sparing diuretic", "moderate", "hyperkalaemia"),
+    ("potassium chloride", "potassium-sparing diuretic", "high", "hyperkalaemia"),
+    ("potassium chloride", "ace inhibitor", "moderate", "hyperkalaemia"),
+    ("potassium chloride", "angiotensin receptor blocker", "moderate", "hyperkalaemia"),
+    ("ace inhibitor", "nsaid", "moderate", "renal impairment and reduced antihypertensive effect"),
+    ("angiotensin receptor blocker", "nsaid", "moderate", "renal impairment and reduced antihypertensive effect"),
+    ("lithium", "ace inhibitor", "high", "lithium toxicity"),
+    ("lithium", "angiotensin receptor blocker", "high", "lithium toxicity"),
+    ("lithium", "thiazide diuretic", "high", "lithium toxicity"),
+    ("lithium", "nsaid", "high", "lithium toxicity"),
+    ("methotrexate", "antifolate antibiotic", "high", "bone marrow suppression"),
+    ("methotrexate", "nsaid", "moderate", "methotrexate toxicity"),
+    ("nitrate", "pde5 inhibitor", "high", "severe hypotension"),
+    ("simvastatin", "clarithromycin", "high", "myopathy / rhabdomyolysis"),
+    ("simvastatin", "erythromycin", "high", "myopathy / rhabdomyolysis"),
+    ("atorvastatin", "clarithromycin", "moderate", "myopathy"),
+    ("simvastatin", "amlodipine", "moderate", "myopathy: simvastatin max 20 mg with amlodipine"),
+    ("simvastatin", "diltiazem", "moderate", "myopathy"),
+    ("simvastatin", "verapamil", "moderate", "myopathy"),
+    ("ssri", "tramadol", "high", "serotonin syndrome and seizures"),
+    ("snri", "tramadol", "high", "serotonin syndrome and seizures"),
+    ("ssri", "triptan", "moderate", "serotonin syndrome"),
+    ("ssri", "nsaid", "moderate", "GI bleeding"),
+    ("ssri", "anticoagulant", "moderate", "bleeding risk"),
+    ("opioid", "benzodiazepine", "high", "respiratory depression"),
+    ("opioid", "gabapentinoid", "moderate", "respiratory depression"),
+    ("opioid", "hypnotic", "moderate", "respiratory depression"),
+    ("beta blocker", "verapamil", "high", "bradycardia and heart block"),
+    ("beta blocker", "diltiazem", "moderate", "bradycardia"),
+    ("digoxin", "amiodarone", "high", "digoxin toxicity"),
+    ("digoxin", "verapamil", "moderate", "digoxin toxicity"),
+    ("digoxin", "loop diuretic", "moderate", "hypokalaemia increases digoxin toxicity"),
+    ("clopidogrel", "omeprazole", "moderate", "reduced antiplatelet effect"),
+    ("clopidogrel", "esomeprazole", "moderate", "reduced antiplatelet effect"),
+    ("fluoroquinolone", "corticosteroid", "moderate", "tendon rupture"),
+    ("macrolide", "antipsychotic", "moderate", "QT prolongation"),
+    ("fluoroquinolone", "antipsychotic", "moderate", "QT prolongation"),
+    ("carbamazepine", "clarithromycin", "high", "carbamazepine toxicity"),
+    ("sulfonylurea", "fluconazole", "moderate", "hypoglycaemia"),
+]
+
+# Two different drugs from one of these classes is usually a prescribing slip
+DUPLICATE_CLASSES = frozenset([
+    "nsaid", "ace inhibitor", "angiotensin receptor blocker", "ssri", "statin", "proton pump inhibitor",
+    "beta blocker", "benzodiazepine", "opioid",
+])
+
+CLASS_TRIE = compile_word_trie(CLASS_ALIASES.items())
+
+
+def _ancestors(drug_class: str) -> List[str]:
+    chain = []
+    while drug_class in CLASS_PARENTS:
+        drug_class = CLASS_PARENTS[drug_class]
+        chain.append(drug_class)
+    return chain
+
+
+# ---------- compiled tables ----------
+
+# drug -> every concept it belongs to: itself, its classes and their parents
+CONCEPTS: Dict[str, FrozenSet[str]] = {
+    drug: frozenset([drug, *classes, *(a for c in classes for a in _ancestors(c))])
+    for drug, (classes, _) in FORMULARY.items()
+}
+# concept -> drugs in it
+MEMBERS: Dict[str, Set[str]] = defaultdict(set)
+for _drug, _concepts in CONCEPTS.items():
+    for _concept in _concepts:
+        MEMBERS[_concept].add(_drug)
+
+
+def _stronger(existing, candidate) -> bool:
+    return existing is None or SEVERITY_RANK[candidate[0]] > SEVERITY_RANK[existing[0]]
+
+
+def _compile_interactions() -> Dict[str, Dict[str, Tuple[str, str]]]:
+    """
+    Sparse drug x drug matrix: row per drug, holding only the drugs it
+    interacts with -> (severity, reason). Class rules are expanded to every
+    member pair here, once, so a check is one lookup per pair of drugs.
+    """
+    matrix: Dict[str, Dict[str, Tuple[str, str]]] = defaultdict(dict)
+    for a, b, severity, reason in INTERACTIONS:
+        for drug_a in MEMBERS.get(a, ()):
+            for drug_b in MEMBERS.get(b, ()):
+                if drug_a == drug_b:
+                    continue
+                for x, y in ((drug_a, drug_b), (drug_b, drug_a)):
+                    if _stronger(matrix[x].get(y), (severity, reason)):
+                        matrix[x][y] = (severity, reason)
+    return dict(matrix)
+
+
+def _compile_allergy_rows() -> Dict[str, Dict[str, Tuple[str, str, str]]]:
+    """
+    drug -> {allergen concept: (kind, severity, reason)}: every allergy that
+    rules the drug out, directly or through its class, or calls for caution
+    through cross-reactivity.
+    """
+    rows: Dict[str, Dict[str, Tuple[str, str, str]]] = {}
+    for drug, concepts in CONCEPTS.items():
+        row = {concept: ("allergy", "high", f"{concept} allergy") for concept in concepts
+               if concept == drug or concept in ALLERGY_CLASSES}
+        for allergen, drug_class, severity, reason in CROSS_REACTIVITY:
+            if drug_class in concepts and allergen not in row:
+                row[allergen] = ("cross_reactivity", severity, reason)
+        rows[drug] = row
+    return rows
+
+
+INTERACTION_MATRIX = _compile_interactions()
+ALLERGY_ROWS = _compile_allergy_rows()
+# drug -> its own classes (no parents): "same class" for intolerances and duplicates
+DIRECT_CLASSES = {drug: frozenset(classes) for drug, (classes, _) in FORMULARY.items()}
+
+
+# ---------- patient profile ----------
+
+ALLERGY_KEYS = ("allerg",)
+INTOLERANCE_KEYS = ("fail", "intoleran", "adverse", "reaction", "side_effect", "sideeffect", "contraindicat")
+NOT_CURRENT_KEYS = ("past", "previous", "prior", "history", "stopped")
+CURRENT_MEDICATION_KEYS = ("current_med", "currentmed", "active_med", "activemed", "medications", "meds")
+NAME_FIELDS = ("name", "drug", "medication", "substance", "allergen", "agent")
+DETAIL_FIELDS = ("reaction", "reason", "effect", "outcome", "severity", "notes")
+
+
+def _kind(key: str) -> Optional[str]:
+    key = key.lower().replace(" ", "_")
+    if any(k in key for k in ALLERGY_KEYS):
+        return "allergy"
+    if any(k in key for k in INTOLERANCE_KEYS):
+        return "intolerance"
+    if any(k in key for k in CURRENT_MEDICATION_KEYS) and not any(k in key for k in NOT_CURRENT_KEYS):
+        return "current"
+    return None
+
+
+def _entries(value: Any) -> Iterable[Tuple[str, str]]:
+    """
+    (text naming the drug, detail) for each entry of a history field: a
+    string, a list of strings, or dicts like {"name": ..., "reaction": ...}.
+    """
+    if isinstance(value, str):
+        for part in value.split(";") if ";" in value else [value]:
+            if part.strip():
+                yield part.strip(), ""
+    elif isinstance(value, list):
+        for item in value:
+            yield from _entries(item)
+    elif isinstance(value, dict):
+        fields = {str(k).lower(): v for k, v in value.items()}
+        name = next((fields[f] for f in NAME_FIELDS if isinstance(fields.get(f), str)), None)
+        detail = ", ".join(str(fields[f]) for f in DETAIL_FIELDS if isinstance(fields.get(f), (str, int, float)))
+        if name:
+            yield name, detail
+        else:
+            for v in value.values():
+                yield from _entries(v)
+
+
+class PatientProfile:
+    """
+    The parts of a history the checker needs, resolved to formulary concepts.
+    """
+
+    def __init__(self):
+        # concept -> (what the history said, detail)
+        self.allergies: Dict[str, Tuple[str, str]] = {}
+        # drug -> (what the history said, detail)
+        self.intolerances: Dict[str, Tuple[str, str]] = {}
+        self.intolerant_classes: Dict[str, Tuple[str, str, str]] = {}  # class -> (drug, said, detail)
+        self.current: Dict[str, str] = {}  # drug -> what the history said
+
+    def add(self, kind: str, text: str, detail: str):
+        drugs = [mention.name for mention in iter_mentions(text)]
+        if kind == "allergy":
+            for drug in drugs:
+                self.allergies.setdefault(drug, (text, detail))
+                for drug_class in DIRECT_CLASSES[drug] & ALLERGY_CLASSES:
+                    self.allergies.setdefault(drug_class, (text, detail))
+            for drug_class, _, _ in iter_trie_matches(CLASS_TRIE, text):
+                self.allergies.setdefault(drug_class, (text, detail))
+        elif kind == "intolerance":
+            for drug in drugs:
+                self.intolerances.setdefault(drug, (text, detail))
+                for drug_class in DIRECT_CLASSES[drug]:
+                    self.intolerant_classes.setdefault(drug_class, (drug, text, detail))
+        elif kind == "current":
+            for drug in drugs:
+                self.current.setdefault(drug, text)
+
+    def __bool__(self):
+        return bool(self.allergies or self.intolerances or self.current)
+
+
+def build_profile(*sources: Optional[Dict[str, Any]]) -> PatientProfile:
+    """
+    Profile from the Digital Twin record and/or the request's patient dict,
+    whatever their exact field names ("Allergies", "allergies", "FailedMedications",
+    "adverse_reactions", "CurrentMedications", nested dicts, ...).
+    """
+    profile = PatientProfile()
+
+    def walk(value: Any, kind: Optional[str]):
+        if isinstance(value, dict):
+            if kind is not None and any(str(k).lower() in NAME_FIELDS for k in value):
+                for text, detail in _entries(value):
+                    profile.add(kind, text, detail)
+                return
+            for key, child in value.items():
+                walk(child, _kind(str(key)) or kind)
+        elif kind is not None:
+            for text, detail in _entries(value):
+                profile.add(kind, text, detail)
+
+    for source in sources:
+        if isinstance(source, dict):
+            walk(source, None)
+    return profile
+
+
+_profiles = LRUTTLCache(PROFILE_CACHE_SIZE, 300)
+
+
+def cached_profile(patient_id: str, history: Optional[Dict[str, Any]], patient: Optional[Dict[str, Any]] = None) -> PatientProfile:
+    # patient_histories hands back the same dict while it is cached, so identity means unchanged
+    entry = _profiles.get(patient_id)
+    if entry is not MISSING and entry[0] is history and entry[1] == patient:
+        return entry[2]
+    profile = build_profile(history, patient)
+    _profiles.put(patient_id, (history, patient, profile))
+    return profile
+
+
+# ---------- check ----------
+
+def _title(drug: str) -> str:
+    return drug[:1].upper() + drug[1:]
+
+
+def check(medications: List[Dict[str, Any]], profile: PatientProfile) -> List[Dict[str, Any]]:
+    """
+    Conflicts for the proposed medications (parsed plan entries), most severe
+    first: allergies and cross-reactivity, drugs (or classes) the patient
+    didn't tolerate, interactions with current medications and within the
+    plan, and duplicate therapy.
+    """
+    proposed = list(dict.fromkeys(m["name"] for m in medications if m["action"] != "stop"))
+    stopped = {m["name"] for m in medications if m["action"] == "stop"}
+    current = [d for d in profile.current if d not in stopped and d not in proposed]
+    conflicts = []
+
+    for drug in proposed:
+        row = ALLERGY_ROWS[drug]
+        hits = row.keys() & profile.allergies.keys()
+        if hits:
+            # One finding per drug: the drug itself, else the strongest class match
+            concept = drug if drug in hits else max(hits, key=lambda c: (row[c][0] == "allergy", SEVERITY_RANK[row[c][1]], c))
+            kind, severity, reason = row[concept]
+            said, detail = profile.allergies[concept]
+            conflicts.append({"medication": drug, "conflictWith": said, "kind": kind, "severity": severity,
+                              "reason": reason, "detail": detail})
+
+        if drug in profile.intolerances:
+            said, detail = profile.intolerances[drug]
+            conflicts.append({"medication": drug, "conflictWith": said, "kind": "intolerance", "severity": "high",
+                              "reason": "previously failed or not tolerated", "detail": detail})
+        else:
+            for drug_class in DIRECT_CLASSES[drug] & profile.intolerant_classes.keys():
+                other, said, detail = profile.intolerant_classes[drug_class]
+                conflicts.append({"medication": drug, "conflictWith": said, "kind": "intolerance",
+                                  "severity": "moderate", "reason": f"same class ({drug_class}) as {other}, which was not tolerated",
+                                  "detail": detail})
+                break
+
+        row = INTERACTION_MATRIX.get(drug, {})
+        for other in current:
+            if other in row:
+                severity, reason = row[other]
+                conflicts.append({"medication": drug, "conflictWith": other, "kind": "interaction",
+                                  "severity": severity, "reason": reason, "detail": "current medication"})
+
+    for i, drug in enumerate(proposed):
+        row = INTERACTION_MATRIX.get(drug, {})
+        for other in proposed[i + 1:]:
+            if other in row:
+                severity, reason = row[other]
+                conflicts.append({"medication": drug, "conflictWith": other, "kind": "interaction",
+                                  "severity": severity, "reason": reason, "detail": "both in this plan"})
+            else:
+                shared = DIRECT_CLASSES[drug] & DIRECT_CLASSES[other] & DUPLICATE_CLASSES
+                if shared:
+                    conflicts.append({"medication": drug, "conflictWith": other, "kind": "duplicate",
+                                      "severity": "moderate", "reason": f"duplicate {min(shared)} therapy", "detail": "both in this plan"})
+
+    conflicts.sort(key=lambda c: -SEVERITY_RANK[c["severity"]])
+    return conflicts
+
+
+def describe(conflict: Dict[str, Any]) -> str:
+    """
+    One line in the style of the agent's contraindications_found entries.
+    """
+    if conflict["kind"] in ("interaction", "duplicate"):
+        text = f"{_title(conflict['medication'])} + {conflict['conflictWith']}: {conflict['reason']}"
+    else:
+        text = f"{_title(conflict['medication'])}: {conflict['reason']} ({conflict['conflictWith']}"
+        text += f" - {conflict['detail']})" if conflict["detail"] else ")"
+    return f"{text} [{conflict['severity']}]"
+
+
+# Words that show an agent line is about a finding of this kind
+KIND_WORDS = {
+    "allergy": ("allerg", "anaphyla", "hypersensitiv"),
+    "cross_reactivity": ("cross-reac", "cross reac", "allerg"),
+    "intolerance": ("intoleran", "not tolerated", "tolerate", "failed", "adverse", "side effect"),
+}
+
+
+def _concepts(text: str) -> Set[str]:
+    """
+    Formulary drugs and drug classes named in `text`.
+    """
+    return {m.name for m in iter_mentions(text)} | {c for c, _, _ in iter_trie_matches(CLASS_TRIE, text)}
+
+
+def _covered(conflict: Dict[str, Any], line: str, line_concepts: Set[str]) -> bool:
+    """
+    Whether one of the agent's contraindication lines already reports this
+    finding: it names the drug(s) and, for an allergy or intolerance, also the
+    allergen/history entry or the kind of finding. A line that only names the
+    drug for another reason ("Ibuprofen + warfarin: bleeding risk") doesn't
+    cover an NSAID allergy.
+    """
+    if conflict["medication"] not in line_concepts:
+        return False
+    if conflict["kind"] in ("interaction", "duplicate"):
+        return conflict["conflictWith"] in line_concepts
+    if (_concepts(conflict["conflictWith"]) - {conflict["medication"]}) & line_concepts:
+        return True
+    text = line.lower()
+    return any(word in text for word in KIND_WORDS[conflict["kind"]])
+
+
+def apply_safety_checks(result: Dict[str, Any], profile: PatientProfile) -> List[Dict[str, Any]]:
+    """
+    Check the result's medications against the profile and merge what is found
+    into result["safety"]: the full findings under "conflicts", and a line each in
+    "contraindications_found" unless one of the agent's lines there already
+    reports the same finding (see _covered).
+    """
+    started = time.perf_counter()
+    medications = result.get("medications")
+    if medications is None:
+        medications = result["medications"] = parse_treatment_plan(result.get("treatment_plan"))
+    conflicts = check(medications, profile) if profile and medications else []
+
+    safety = result.get("safety")
+    if not isinstance(safety, dict):
+        safety = result["safety"] = {}
+    safety["conflicts"] = conflicts
+    found = safety.get("contraindications_found")
+    found = list(found) if isinstance(found, list) else []
+    agent_lines = [(line, _concepts(line)) for line in found if isinstance(line, str)]
+    for conflict in conflicts:
+        if not any(_covered(conflict, line, concepts) for line, concepts in agent_lines):
+            found.append(describe(conflict))
+    safety["contraindications_found"] = found
+    metrics.record("safety.check_us", (time.perf_counter() - started) * 1e6)
+    return conflicts
@@ -0,0 +1,320 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, List, Iterator
+
+import boto3
+
+from . import metrics
+from .responses import dumps
+
+# Audit trail of clinician decisions on agent suggestions (approve / reject / modify).
+# Prod: DynamoDB table (ConsultID hash key, DecisionID range key). Locally: an
+# append-only JSON Lines file.
+DECISIONS_TABLE = os.getenv("VITE_DECISIONS_TABLE")
+DECISION_LOG_PATH = os.getenv("DECISION_LOG_PATH") or os.path.join(tempfile.gettempdir(), "drrobo_decisions.jsonl")
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+
+ACTIONS = ("approve", "reject", "modify")
+MAX_DECISIONS_PER_REQUEST = 1000
+# Decisions accepted but not yet committed; beyond this new batches are refused
+DECISION_QUEUE_MAX = int(os.getenv("DECISION_QUEUE_MAX", "50000"))
+# Most decisions one commit takes off the queue (one fsync / a run of BatchWriteItem calls)
+GROUP_COMMIT_MAX = 2000
+BATCH_WRITE_SIZE = 25  # DynamoDB BatchWriteItem maximum
+BATCH_WRITE_MAX_ROUNDS = 5
+# BatchWriteItem calls in flight per commit (botocore pools 10 connections by default)
+DECISION_WRITE_CONCURRENCY = int(os.getenv("DECISION_WRITE_CONCURRENCY", "8"))
+RETRY_MAX_SECONDS = 5.0
+
+
+class DecisionQueueFull(Exception):
+    pass
+
+
+_id_counter = count(1)
+
+
+def new_decision_ids(n: int, now: float) -> List[str]:
+    """
+    Millisecond timestamp + per-process counter + random suffix: sorts by
+    recording time, and the decisions of one batch keep their order. (Unlike
+    analysis IDs the timestamp is never bumped, so a burst of thousands of
+    decisions doesn't push IDs ahead of the clock.)
+    """
+    ms = int(now * 1000)
+    suffix = uuid.uuid4().hex[:6]
+    return [f"{ms:013d}-{next(_id_counter):010d}{suffix}" for _ in range(n)]
+
+
+@dataclass
+class Decision:
+    decision_id: str
+    consult_id: str
+    suggestion_id: str
+    action: str
+    recorded_at: float
+    decided_at: Optional[float] = None  # client clock, when the clinician clicked
+    patient_id: Optional[str] = None
+    clinician_id: Optional[str] = None
+    content: Optional[str] = None  # the edited text, for "modify"
+    suggestion_version: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "decisionId": self.decision_id, "consultId": self.consult_id, "suggestionId": self.suggestion_id,
+            "action": self.action, "recordedAt": self.recorded_at, "decidedAt": self.decided_at,
+            "patientId": self.patient_id, "clinicianId": self.clinician_id, "content": self.content,
+            "suggestionVersion": self.suggestion_version,
+        }
+
+
+# ---------- local: append-only file ----------
+
+class FileDecisionLog:
+    """
+    One JSON line per decision. A commit is a single O_APPEND write of the
+    whole group followed by one fsync, so the disk sync is paid once per group
+    rather than once per decision, and concurrent processes never interleave lines.
+    """
+
+    def __init__(self, path: str = DECISION_LOG_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._fd_pid: Optional[int] = None
+
+    def _file(self) -> int:
+        # Opened per process: a forked server worker gets its own descriptor
+        if self._fd is None or self._fd_pid != os.getpid():
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def put_many(self, decisions: List[Decision]):
+        data = b"".join(dumps(asdict(d)) + b"\n" for d in decisions)
+        fd = self._file()
+        written = 0
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        os.fsync(fd)
+
+    def list(self, consult_id: str) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        needle = b'"consult_id":' + dumps(consult_id)
+        with open(self.path, "rb") as f:
+            for line in f:
+                # Cheap byte check before parsing: most lines belong to other consults
+                if needle not in line or not line.endswith(b"\n"):
+                    continue
+                decision = json.loads(line)
+                if decision["consult_id"] == consult_id:
+                    yield Decision(**decision).to_dict()
+
+
+# ---------- prod: DynamoDB ----------
+
+class DynamoDecisionStore:
+    def __init__(self, table_name: str = DECISIONS_TABLE, client=None):
+        self.table_name = table_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "dynamodb",
+                region_name=os.environ.get("VITE_AWS_REGION", "us-east-1"),
+                endpoint_url=DYNAMODB_ENDPOINT_URL
+            )
+        return self._client
+
+    def _item(self, decision: Decision) -> Dict[str, Any]:
+        item = {
+            "ConsultID": {"S": decision.consult_id},
+            "DecisionID": {"S": decision.decision_id},
+            "suggestion_id": {"S": decision.suggestion_id},
+            "action": {"S": decision.action},
+            "recorded_at": {"N": str(decision.recorded_at)},
+        }
+        for name in ("patient_id", "clinician_id", "content"):
+            if getattr(decision, name) is not None:
+                item[name] = {"S": getattr(decision, name)}
+        if decision.decided_at is not None:
+            item["decided_at"] = {"N": str(decision.decided_at)}
+        if decision.suggestion_version is not None:
+            item["suggestion_version"] = {"S": decision.suggestion_version}
+        return item
+
+    def put_many(self, decisions: List[Decision]):
+        chunks = [decisions[i:i + BATCH_WRITE_SIZE] for i in range(0, len(decisions), BATCH_WRITE_SIZE)]
+        if len(chunks) == 1:
+            return self._put_chunk(chunks[0])
+        # A large group is written as parallel BatchWriteItem calls: the commit takes
+        # about one round trip rather than one per 25 decisions
+        with ThreadPoolExecutor(max_workers=min(DECISION_WRITE_CONCURRENCY, len(chunks))) as pool:
+            list(pool.map(self._put_chunk, chunks))
+
+    def _put_chunk(self, chunk: List[Decision]):
+        request = {self.table_name: [{"PutRequest": {"Item": self._item(d)}} for d in chunk]}
+        for attempt in range(BATCH_WRITE_MAX_ROUNDS):
+            request = self.client.batch_write_item(RequestItems=request).get("UnprocessedItems") or {}
+            if not request:
+                return
+            # Throttled writes: back off before retrying just those
+            time.sleep(0.05 * (2 ** attempt))
+        raise RuntimeError(f"{len(request.get(self.table_name, []))} decisions still unprocessed")
+
+    def list(self, consult_id: str) -> Iterator[Dict[str, Any]]:
+        params = dict(TableName=self.table_name, KeyConditionExpression="ConsultID = :c",
+                      ExpressionAttributeValues={":c": {"S": consult_id}})
+        while True:
+            response = self.client.query(**params)
+            for item in response.get("Items", []):
+                yield self._decision(item).to_dict()
+            if "LastEvaluatedKey" not in response:
+                return
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _decision(self, item: Dict[str, Any]) -> Decision:
+        def value(name, kind="S"):
+            if name not in item:
+                return None
+            return float(item[name]["N"]) if kind == "N" else item[name]["S"]
+
+        # Versions were numbers before they became content hashes
+        version = item.get("suggestion_version", {})
+        version = version.get("S") or version.get("N")
+        return Decision(
+            decision_id=item["DecisionID"]["S"], consult_id=item["ConsultID"]["S"],
+            suggestion_id=item["suggestion_id"]["S"], action=item["action"]["S"],
+            recorded_at=value("recorded_at", "N"), decided_at=value("decided_at", "N"),
+            patient_id=value("patient_id"), clinician_id=value("clinician_id"), content=value("content"),
+            suggestion_version=version,
+        )
+
+
+# ---------- group commit ----------
+
+class DecisionLog:
+    """
+    submit() appends to an in-memory queue and returns at once. A single
+    committer thread takes everything queued (up to GROUP_COMMIT_MAX) and
+    writes it as one commit; whatever arrives during that commit goes in the
+    next one, so under load the groups grow and the per-decision cost falls.
+
+    Every submitted decision gets a sequence number; wait(seq) blocks until
+    the commit containing it is durable. A failed commit is retried with
+    backoff rather than dropped (this is an audit trail); while it is stuck
+    the queue fills and submit() raises DecisionQueueFull.
+    """
+
+    def __init__(self, store=None):
+        if store is None:
+            store = DynamoDecisionStore() if DECISIONS_TABLE else FileDecisionLog()
+        self.store = store
+        self._pending: List[Decision] = []
+        self._submitted = 0  # sequence number of the last decision queued
+        self._committed = 0  # ... and of the last one durably written
+        self._cond = threading.Condition()
+        self._committer: Optional[threading.Thread] = None
+        self._committer_pid: Optional[int] = None
+
+    def submit(self, decisions: List[Decision]) -> int:
+        with self._cond:
+            self._ensure_committer()
+            if len(self._pending) + len(decisions) > DECISION_QUEUE_MAX:
+                metrics.record("decisions.rejected", len(decisions))
+                raise DecisionQueueFull(f"{len(self._pending)} decisions are waiting to be written")
+            self._pending.extend(decisions)
+            self._submitted += len(decisions)
+            self._cond.notify_all()
+            return self._submitted
+
+    def record(self, consult_id: str, events: List[Dict[str, Any]], patient_id: Optional[str] = None,
+               clinician_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue one batch of decision events for a consult. Returns the new
+        decision IDs and the sequence number to wait() on for durability.
+        """
+        now = time.time()
+        ids = new_decision_ids(len(events), now)
+        decisions = [
+            Decision(
+                decision_id=decision_id, consult_id=consult_id, suggestion_id=event["suggestion_id"],
+                action=event["action"], recorded_at=now, decided_at=event.get("decided_at"),
+                patient_id=patient_id, clinician_id=clinician_id, content=event.get("content"),
+                suggestion_version=event.get("suggestion_version"),
+            )
+            for decision_id, event in zip(ids, events)
+        ]
+        seq = self.submit(decisions)
+        return {"consultId": consult_id, "accepted": len(decisions),
+                "decisionIds": [d.decision_id for d in decisions], "sequence": seq}
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._committed >= seq, timeout)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        with self._cond:
+            seq = self._submitted
+        return self.wait(seq, timeout)
+
+    def list(self, consult_id: str) -> Dict[str, Any]:
+        """
+        The consult's decisions in the order they were recorded, plus the
+        latest one per suggestion (the card's current state).
+        """
+        self.flush(1.0)
+        decisions = sorted(self.store.list(consult_id), key=lambda d: d["decisionId"])
+        latest = {d["suggestionId"]: d for d in decisions}
+        return {"consultId": consult_id, "decisions": decisions, "latest": latest}
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return self._submitted - self._committed
+
+    def _ensure_committer(self):
+        # Caller holds self._cond. Threads don't survive fork: each worker starts its own
+        if self._committer is None or self._committer_pid != os.getpid():
+            self._committer = threading.Thread(target=self._commit_loop, name="decision-committer", daemon=True)
+            self._committer_pid = os.getpid()
+            self._committer.start()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                group = self._pending[:GROUP_COMMIT_MAX]
+                del self._pending[:GROUP_COMMIT_MAX]
+            self._commit(group)
+            with self._cond:
+                self._committed += len(group)
+                self._cond.notify_all()
+
+    def _commit(self, group: List[Decision]):
+        delay = 0.05
+        while True:
+            started = time.perf_counter()
+            try:
+                self.store.put_many(group)
+            except Exception as e:
+                metrics.record("decisions.commit_failed", len(group))
+                print(f"⚠️ Decision commit failed ({len(group)} decisions), retrying in {delay:.2f}s: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+                continue
+            metrics.record("decisions.commit_ms", (time.perf_counter() - started) * 1000)
+            metrics.record("decisions.group_size", len(group))
+            return
+
+
+decision_log = DecisionLog()
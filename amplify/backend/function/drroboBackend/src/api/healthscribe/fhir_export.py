@@ -0,0 +1,303 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Iterable, Iterator, AsyncIterator, Tuple
+
+from . import metrics
+from .analysis_store import analysis_history
+from .medications import parse_treatment_plan
+from .responses import dumps
+
+# FHIR R4 bulk export of stored consults, as NDJSON generated page by page from the
+# analysis store. Memory is one store page, whatever the size of the export.
+
+RESOURCE_TYPES = ("Encounter", "Condition", "DocumentReference", "MedicationRequest")
+EXPORT_PAGE_SIZE = 500
+# Mangum (index.py) holds the whole body in memory and API Gateway caps it at 10 MB / 29 s,
+# so there an export is split into pages of this many consults linked by a cursor.
+# streaming.py and server.py send the whole export as one stream.
+BUFFERED_EXPORT_MAX_CONSULTS = int(os.getenv("FHIR_BUFFERED_EXPORT_MAX_CONSULTS", "250"))
+
+ICD10_SYSTEM = "http://hl7.org/fhir/sid/icd-10"
+LOINC_SYSTEM = "http://loinc.org"
+ACT_CODE_SYSTEM = "http://terminology.hl7.org/CodeSystem/v3-ActCode"
+CONDITION_CLINICAL_SYSTEM = "http://terminology.hl7.org/CodeSystem/condition-clinical"
+CONDITION_VERIFICATION_SYSTEM = "http://terminology.hl7.org/CodeSystem/condition-ver-status"
+CONSULT_ID_SYSTEM = "urn:drrobo:consult-id"
+UCUM_SYSTEM = "http://unitsofmeasure.org"
+EVENT_TIMING = {"HS": "HS", "AM": "MORN"}
+UCUM_CODES = {"mg": "mg", "mcg": "ug", "g": "g", "mL": "mL", "units": "[iU]", "mmol": "mmol", "%": "%"}
+
+SOAP_SECTIONS = (("summary", "Summary"), ("subjective", "Subjective"), ("objective", "Objective"),
+                 ("assessment", "Assessment"), ("plan", "Plan"))
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    """
+    FHIR `_since` instant (e.g. 2024-05-01T00:00:00Z) -> epoch seconds.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _instant(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _soap_text(soap_note: Dict[str, Any]) -> str:
+    soap = {str(k).lower(): v for k, v in soap_note.items()}
+    return "\n\n".join(f"{title}:\n{soap[key]}" for key, title in SOAP_SECTIONS
+                       if isinstance(soap.get(key), str) and soap[key].strip())
+
+
+def _plan_line(treatment_plan: Dict[str, Any], source: Dict[str, Any]) -> str:
+    lines = treatment_plan.get(source["section"])
+    return lines if isinstance(lines, str) else [l for l in lines if isinstance(l, str)][source["line"]]
+
+
+def _dosage(medication: Dict[str, Any], text: str) -> Dict[str, Any]:
+    dosage: Dict[str, Any] = {"text": text}
+    frequency = medication["frequency"]
+    if frequency and frequency["per_day"]:
+        code = frequency["code"]
+        if code.startswith("Q") and code.endswith("H"):
+            repeat = {"frequency": 1, "period": int(code[1:-1]), "periodUnit": "h"}
+        elif code == "WK":
+            repeat = {"frequency": 1, "period": 1, "periodUnit": "wk"}
+        else:
+            repeat = {"frequency": frequency["per_day"], "period": 1, "periodUnit": "d"}
+        if code in EVENT_TIMING:
+            repeat["when"] = [EVENT_TIMING[code]]
+        dosage["timing"] = {"repeat": repeat, "code": {"text": frequency["text"]}}
+    if medication["prn"]:
+        dosage["asNeededBoolean"] = True
+    if medication["route"]:
+        dosage["route"] = {"text": medication["route"]}
+    dose = medication["dose"]
+    if dose and not dose.get("per") and dose["value_max"] is None:
+        dosage["doseAndRate"] = [{"doseQuantity": {"value": dose["value"], "unit": dose["unit"],
+                                                   "system": UCUM_SYSTEM, "code": UCUM_CODES[dose["unit"]]}}]
+    return dosage
+
+
+def resource_key(record: Dict[str, Any]) -> str:
+    """
+    Base of a stored analysis's resource IDs. Keyed on the consult when there is
+    one, so its re-analyses (delta, speculative) export under the same IDs in
+    every export; a valid FHIR id whatever the consult ID looks like.
+    """
+    if not record.get("consultId"):
+        return record["analysisId"]
+    key = f"{record['patientId']}\x1f{record['consultId']}".encode("utf-8")
+    return "consult-" + hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+def latest_per_consult(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Drops all but the latest analysis of each consult. Both stores iterate a
+    patient's records together and in analysis ID (creation) order, so one
+    patient's records are held at a time.
+    """
+    group: List[Dict[str, Any]] = []
+    for record in records:
+        if group and record["patientId"] != group[0]["patientId"]:
+            yield from _latest(group)
+            group = []
+        group.append(record)
+    yield from _latest(group)
+
+
+def _latest(group: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    latest = {r["consultId"]: r["analysisId"] for r in group if r.get("consultId")}
+    for record in group:
+        if not record.get("consultId") or latest[record["consultId"]] == record["analysisId"]:
+            yield record
+
+
+def consult_resources(record: Dict[str, Any], types: Iterable[str] = RESOURCE_TYPES) -> Iterator[Dict[str, Any]]:
+    """
+    FHIR resources for one stored analysis (the latest of its consult, see
+    latest_per_consult). Everything the agent produced is
+    marked as unconfirmed (provisional conditions, draft/proposal medication
+    requests) until a clinician has reviewed it.
+    """
+    types = set(types)
+    analysis_id = resource_key(record)
+    patient = {"reference": f"Patient/{record['patientId']}"}
+    encounter = {"reference": f"Encounter/{analysis_id}"}
+    recorded = _instant(record["createdAt"])
+    result = record.get("result") or {}
+
+    if "Encounter" in types:
+        resource = {
+            "resourceType": "Encounter",
+            "id": analysis_id,
+            "status": "finished",
+            "class": {"system": ACT_CODE_SYSTEM, "code": "AMB", "display": "ambulatory"},
+            "subject": patient,
+            "period": {"start": recorded},
+        }
+        if record.get("consultId"):
+            resource["identifier"] = [{"system": CONSULT_ID_SYSTEM, "value": record["consultId"]}]
+        yield resource
+
+    if "Condition" in types:
+        for i, code in enumerate(result.get("icd_codes") or []):
+            if not isinstance(code, dict) or not code.get("code"):
+                continue
+            # FHIR JSON has no nulls: leave display out rather than send it empty
+            coding = {"system": ICD10_SYSTEM, "code": code["code"]}
+            if code.get("description"):
+                coding["display"] = code["description"]
+            yield {
+                "resourceType": "Condition",
+                "id": f"{analysis_id}-c{i}",
+                "clinicalStatus": {"coding": [{"system": CONDITION_CLINICAL_SYSTEM, "code": "active"}]},
+                "verificationStatus": {"coding": [{"system": CONDITION_VERIFICATION_SYSTEM, "code": "provisional"}]},
+                "code": {"coding": [coding], "text": code.get("description") or code["code"]},
+                "subject": patient,
+                "encounter": encounter,
+                "recordedDate": recorded,
+            }
+
+    if "DocumentReference" in types and record.get("soapNote"):
+        text = _soap_text(record["soapNote"])
+        if text:
+            yield {
+                "resourceType": "DocumentReference",
+                "id": f"{analysis_id}-soap",
+                "status": "current",
+                "docStatus": "preliminary",
+                "type": {"coding": [{"system": LOINC_SYSTEM, "code": "11506-3", "display": "Progress note"}]},
+                "subject": patient,
+                "date": recorded,
+                "content": [{"attachment": {
+                    "contentType": "text/plain; charset=utf-8",
+                    "data": base64.b64encode(text.encode("utf-8")).decode("ascii"),
+                    "title": "SOAP note",
+                }}],
+                "context": {"encounter": [encounter]},
+            }
+
+    if "MedicationRequest" in types:
+        plan = result.get("treatment_plan")
+        # Parsed from the stored plan text, so records from before "medications" existed export the same way
+        seen = set()
+        for medication in parse_treatment_plan(plan):
+            key = (medication["name"], medication["source"]["section"], medication["source"]["line"])
+            # "Stop ibuprofen" is not a request for ibuprofen
+            if medication["action"] == "stop" or key in seen:
+                continue
+            seen.add(key)
+            yield {
+                "resourceType": "MedicationRequest",
+                "id": f"{analysis_id}-m{len(seen) - 1}",
+                "status": "draft",
+                "intent": "proposal",
+                "medicationCodeableConcept": {"text": medication["name"]},
+                "subject": patient,
+                "encounter": encounter,
+                "authoredOn": recorded,
+                "dosageInstruction": [_dosage(medication, _plan_line(plan, medication["source"]))],
+            }
+
+
+def ndjson_lines(records: Iterable[Dict[str, Any]], types: Iterable[str] = RESOURCE_TYPES) -> bytes:
+    """
+    One NDJSON chunk for a page of records.
+    """
+    return b"".join(dumps(resource) + b"\n" for record in records for resource in consult_resources(record, types))
+
+
+def encode_cursor(record: Dict[str, Any]) -> str:
+    key = json.dumps([record["patientId"], record["analysisId"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(key).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Inverse of encode_cursor; ValueError for anything it didn't produce.
+    """
+    try:
+        patient_id, analysis_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return str(patient_id), str(analysis_id)
+
+
+def _pages(since: Optional[float], patient_id: Optional[str], after: Optional[Tuple[str, str]],
+           page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    store = analysis_history.store
+    if patient_id is None:
+        records = itertools.chain.from_iterable(store.iter_pages(since=since, page_size=page_size, after=after))
+    else:
+        records = (r for r in store.iter_records(patient_id, after=after[1] if after else None)
+                   if since is None or r["createdAt"] >= since)
+    return _chunked(latest_per_consult(records), page_size)
+
+
+async def export_ndjson(since: Optional[float] = None, types: Iterable[str] = RESOURCE_TYPES,
+                        patient_id: Optional[str] = None,
+                        after: Optional[Tuple[str, str]] = None) -> AsyncIterator[bytes]:
+    """
+    Async byte stream for a StreamingResponse: each store page is read and
+    converted in a worker thread and sent before the next page is read, so the
+    first resources go out straight away and the event loop never does the conversion.
+    """
+    types = tuple(types)
+    pages = _pages(since, patient_id, after)
+    consults = 0
+
+    def next_chunk() -> Optional[bytes]:
+        nonlocal consults
+        page = next(pages, None)
+        if page is None:
+            return None
+        consults += len(page)
+        return ndjson_lines(page, types)
+
+    with metrics.timer("fhir.export_ms"):
+        while True:
+            chunk = await asyncio.to_thread(next_chunk)
+            if chunk is None:
+                break
+            if chunk:
+                yield chunk
+    metrics.record("fhir.export_consults", consults)
+
+
+def export_page(since: Optional[float] = None, types: Iterable[str] = RESOURCE_TYPES,
+                patient_id: Optional[str] = None, after: Optional[Tuple[str, str]] = None,
+                limit: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+    """
+    At most `limit` (default BUFFERED_EXPORT_MAX_CONSULTS) consults as one NDJSON body,
+    and the cursor to pass for the next page (None on the last one). For handlers
+    that buffer the response.
+    """
+    limit = limit or BUFFERED_EXPORT_MAX_CONSULTS
+    records = itertools.chain.from_iterable(_pages(since, patient_id, after, min(limit, EXPORT_PAGE_SIZE)))
+    with metrics.timer("fhir.export_ms", buffered="true"):
+        page = list(itertools.islice(records, limit))
+        more = next(records, None) is not None
+        body = ndjson_lines(page, tuple(types))
+    metrics.record("fhir.export_consults", len(page), buffered="true")
+    return body, encode_cursor(page[-1]) if more else None
+
+
+def _chunked(items: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,181 @@
+# Bundled formulary: generic name -> (drug classes, other names it is written as:
+# brands, US/UK spellings, common abbreviations). Names are lowercase; a name
+# may be several words ("insulin glargine"). Classes are what allergy and
+# interaction checks match on, so list every class a prescriber would reason by.
+
+FORMULARY = {
+    # Antibiotics
+    "amoxicillin": (("penicillin",), ["amoxycillin", "amoxil"]),
+    "co-amoxiclav": (("penicillin",), ["amoxicillin-clavulanate", "amoxicillin clavulanate", "augmentin"]),
+    "flucloxacillin": (("penicillin",), ["floxapen"]),
+    "phenoxymethylpenicillin": (("penicillin",), ["penicillin v", "pen v"]),
+    "benzylpenicillin": (("penicillin",), ["penicillin g", "pen g"]),
+    "piperacillin-tazobactam": (("penicillin",), ["pip-tazo", "tazocin", "zosyn"]),
+    "cefalexin": (("cephalosporin",), ["cephalexin", "keflex"]),
+    "cefuroxime": (("cephalosporin",), ["zinnat"]),
+    "ceftriaxone": (("cephalosporin",), ["rocephin"]),
+    "meropenem": (("carbapenem",), ["meronem"]),
+    "clarithromycin": (("macrolide",), ["klaricid", "biaxin"]),
+    "erythromycin": (("macrolide",), []),
+    "azithromycin": (("macrolide",), ["zithromax"]),
+    "doxycycline": (("tetracycline",), ["vibramycin"]),
+    "ciprofloxacin": (("fluoroquinolone",), ["cipro", "ciproxin"]),
+    "levofloxacin": (("fluoroquinolone",), ["levaquin"]),
+    "trimethoprim": (("antifolate antibiotic",), []),
+    "co-trimoxazole": (("sulfonamide", "antifolate antibiotic"), ["trimethoprim-sulfamethoxazole", "septrin", "bactrim"]),
+    "nitrofurantoin": (("nitrofuran",), ["macrobid", "macrodantin"]),
+    "metronidazole": (("nitroimidazole",), ["flagyl"]),
+    "clindamycin": (("lincosamide",), ["dalacin"]),
+    "vancomycin": (("glycopeptide",), []),
+    "gentamicin": (("aminoglycoside",), []),
+    # Antivirals / antifungals
+    "aciclovir": (("antiviral",), ["acyclovir", "zovirax"]),
+    "oseltamivir": (("antiviral",), ["tamiflu"]),
+    "fluconazole": (("azole antifungal",), ["diflucan"]),
+    # Analgesics
+    "paracetamol": (("analgesic",), ["acetaminophen", "tylenol", "panadol", "calpol"]),
+    "ibuprofen": (("nsaid",), ["brufen", "nurofen", "advil", "motrin"]),
+    "naproxen": (("nsaid",), ["naprosyn", "aleve"]),
+    "diclofenac": (("nsaid",), ["voltarol", "voltaren"]),
+    "celecoxib": (("nsaid", "cox-2 inhibitor"), ["celebrex"]),
+    "aspirin": (("nsaid", "antiplatelet", "salicylate"), ["acetylsalicylic acid", "asa"]),
+    "codeine": (("opioid",), ["codeine phosphate"]),
+    "co-codamol": (("opioid", "analgesic"), ["paracetamol/codeine"]),
+    "tramadol": (("opioid",), ["zydol", "ultram"]),
+    "morphine": (("opioid",), ["oramorph", "zomorph", "mst"]),
+    "oxycodone": (("opioid",), ["oxycontin", "oxynorm"]),
+    "fentanyl": (("opioid",), ["durogesic"]),
+    "buprenorphine": (("opioid",), ["butrans"]),
+    "gabapentin": (("gabapentinoid",), ["neurontin"]),
+    "pregabalin": (("gabapentinoid",), ["lyrica"]),
+    "amitriptyline": (("tricyclic antidepressant",), []),
+    # Cardiovascular
+    "lisinopril": (("ace inhibitor",), ["zestril"]),
+    "ramipril": (("ace inhibitor",), ["tritace"]),
+    "enalapril": (("ace inhibitor",), []),
+    "perindopril": (("ace inhibitor",), ["coversyl"]),
+    "losartan": (("angiotensin receptor blocker",), ["cozaar"]),
+    "candesartan": (("angiotensin receptor blocker",), ["amias"]),
+    "valsartan": (("angiotensin receptor blocker",), ["diovan"]),
+    "irbesartan": (("angiotensin receptor blocker",), ["aprovel"]),
+    "amlodipine": (("calcium channel blocker",), ["norvasc", "istin"]),
+    "nifedipine": (("calcium channel blocker",), ["adalat"]),
+    "diltiazem": (("calcium channel blocker",), ["tildiem"]),
+    "verapamil": (("calcium channel blocker",), []),
+    "bisoprolol": (("beta blocker",), ["cardicor"]),
+    "metoprolol": (("beta blocker",), ["lopressor"]),
+    "atenolol": (("beta blocker",), ["tenormin"]),
+    "propranolol": (("beta blocker",), ["inderal"]),
+    "carvedilol": (("beta blocker",), []),
+    "bendroflumethiazide": (("thiazide diuretic",), ["bendrofluazide"]),
+    "indapamide": (("thiazide diuretic",), []),
+    "hydrochlorothiazide": (("thiazide diuretic",), ["hctz"]),
+    "furosemide": (("loop diuretic",), ["frusemide", "lasix"]),
+    "bumetanide": (("loop diuretic",), []),
+    "spironolactone": (("potassium-sparing diuretic",), ["aldactone"]),
+    "eplerenone": (("potassium-sparing diuretic",), []),
+    "doxazosin": (("alpha blocker",), ["cardura"]),
+    "atorvastatin": (("statin",), ["lipitor"]),
+    "simvastatin": (("statin",), ["zocor"]),
+    "rosuvastatin": (("statin",), ["crestor"]),
+    "pravastatin": (("statin",), []),
+    "ezetimibe": (("lipid-lowering",), ["ezetrol"]),
+    "clopidogrel": (("antiplatelet",), ["plavix"]),
+    "ticagrelor": (("antiplatelet",), ["brilique", "brilinta"]),
+    "warfarin": (("anticoagulant", "vitamin k antagonist"), ["coumadin"]),
+    "apixaban": (("anticoagulant", "doac"), ["eliquis"]),
+    "rivaroxaban": (("anticoagulant", "doac"), ["xarelto"]),
+    "edoxaban": (("anticoagulant", "doac"), ["lixiana"]),
+    "dabigatran": (("anticoagulant", "doac"), ["pradaxa"]),
+    "heparin": (("anticoagulant",), []),
+    "enoxaparin": (("anticoagulant", "low molecular weight heparin"), ["clexane", "lovenox"]),
+    "digoxin": (("cardiac glycoside",), ["lanoxin"]),
+    "amiodarone": (("antiarrhythmic",), []),
+    "glyceryl trinitrate": (("nitrate",), ["gtn", "nitroglycerin"]),
+    "isosorbide mononitrate": (("nitrate",), ["ismn"]),
+    "sildenafil": (("pde5 inhibitor",), ["viagra"]),
+    # Endocrine
+    "metformin": (("biguanide",), ["glucophage"]),
+    "gliclazide": (("sulfonylurea",), []),
+    "glimepiride": (("sulfonylurea",), []),
+    "sitagliptin": (("dpp-4 inhibitor",), ["januvia"]),
+    "empagliflozin": (("sglt2 inhibitor",), ["jardiance"]),
+    "dapagliflozin": (("sglt2 inhibitor",), ["forxiga", "farxiga"]),
+    "semaglutide": (("glp-1 agonist",), ["ozempic", "wegovy", "rybelsus"]),
+    "insulin": (("insulin",), []),
+    "insulin glargine": (("insulin",), ["lantus", "toujeo", "abasaglar"]),
+    "insulin aspart": (("insulin",), ["novorapid", "fiasp"]),
+    "levothyroxine": (("thyroid hormone",), ["thyroxine", "synthroid"]),
+    "carbimazole": (("antithyroid",), []),
+    "prednisolone": (("corticosteroid",), []),
+    "prednisone": (("corticosteroid",), []),
+    "dexamethasone": (("corticosteroid",), []),
+    "hydrocortisone": (("corticosteroid",), []),
+    # Respiratory
+    "salbutamol": (("beta2 agonist",), ["albuterol", "ventolin"]),
+    "salmeterol": (("beta2 agonist",), ["serevent"]),
+    "formoterol": (("beta2 agonist",), []),
+    "tiotropium": (("antimuscarinic",), ["spiriva"]),
+    "ipratropium": (("antimuscarinic",), ["atrovent"]),
+    "beclometasone": (("inhaled corticosteroid",), ["beclomethasone", "clenil", "qvar"]),
+    "budesonide": (("inhaled corticosteroid",), ["pulmicort"]),
+    "fluticasone": (("inhaled corticosteroid",), ["flixotide"]),
+    "montelukast": (("leukotriene antagonist",), ["singulair"]),
+    # GI
+    "omeprazole": (("proton pump inhibitor",), ["losec", "prilosec"]),
+    "lansoprazole": (("proton pump inhibitor",), ["zoton"]),
+    "pantoprazole": (("proton pump inhibitor",), []),
+    "esomeprazole": (("proton pump inhibitor",), ["nexium"]),
+    "ranitidine": (("h2 antagonist",), []),
+    "famotidine": (("h2 antagonist",), []),
+    "metoclopramide": (("antiemetic",), ["maxolon", "reglan"]),
+    "ondansetron": (("antiemetic",), ["zofran"]),
+    "cyclizine": (("antiemetic", "antihistamine"), []),
+    "lactulose": (("laxative",), []),
+    "senna": (("laxative",), ["senokot"]),
+    "loperamide": (("antidiarrhoeal",), ["imodium"]),
+    # CNS
+    "sertraline": (("ssri",), ["lustral", "zoloft"]),
+    "fluoxetine": (("ssri",), ["prozac"]),
+    "citalopram": (("ssri",), ["cipramil"]),
+    "escitalopram": (("ssri",), ["cipralex", "lexapro"]),
+    "mirtazapine": (("antidepressant",), ["zispin"]),
+    "venlafaxine": (("snri",), ["efexor", "effexor"]),
+    "lithium": (("mood stabiliser",), ["priadel", "camcolit"]),
+    "sodium valproate": (("antiepileptic",), ["valproate", "epilim", "depakote"]),
+    "lamotrigine": (("antiepileptic",), ["lamictal"]),
+    "levetiracetam": (("antiepileptic",), ["keppra"]),
+    "carbamazepine": (("antiepileptic",), ["tegretol"]),
+    "phenytoin": (("antiepileptic",), ["epanutin", "dilantin"]),
+    "diazepam": (("benzodiazepine",), ["valium"]),
+    "lorazepam": (("benzodiazepine",), ["ativan"]),
+    "zopiclone": (("hypnotic",), []),
+    "quetiapine": (("antipsychotic",), ["seroquel"]),
+    "olanzapine": (("antipsychotic",), ["zyprexa"]),
+    "haloperidol": (("antipsychotic",), ["haldol"]),
+    "sumatriptan": (("triptan",), ["imigran", "imitrex"]),
+    # Other
+    "allopurinol": (("xanthine oxidase inhibitor",), ["zyloric"]),
+    "colchicine": (("antigout",), []),
+    "methotrexate": (("antimetabolite", "dmard"), []),
+    "hydroxychloroquine": (("dmard",), ["plaquenil"]),
+    "alendronic acid": (("bisphosphonate",), ["alendronate", "fosamax"]),
+    "tamsulosin": (("alpha blocker",), ["flomax"]),
+    "finasteride": (("5-alpha reductase inhibitor",), ["proscar"]),
+    "cetirizine": (("antihistamine",), ["zirtek", "zyrtec"]),
+    "loratadine": (("antihistamine",), ["clarityn", "claritin"]),
+    "chlorphenamine": (("antihistamine",), ["chlorpheniramine", "piriton"]),
+    "folic acid": (("vitamin",), []),
+    "ferrous sulfate": (("iron supplement",), ["ferrous sulphate"]),
+    "colecalciferol": (("vitamin",), ["cholecalciferol", "vitamin d3", "vitamin d"]),
+    "adrenaline": (("sympathomimetic",), ["epinephrine", "epipen"]),
+    "naloxone": (("opioid antagonist",), ["narcan"]),
+    "potassium chloride": (("electrolyte",), ["sando-k"]),
+}
+
+# Narrow therapeutic index / high harm if wrong: raised as warnings, not info
+HIGH_ALERT_MEDICATIONS = frozenset([
+    "warfarin", "apixaban", "rivaroxaban", "edoxaban", "dabigatran", "heparin", "enoxaparin",
+    "insulin", "insulin glargine", "insulin aspart", "methotrexate", "lithium", "digoxin", "amiodarone",
+    "morphine", "oxycodone", "fentanyl", "tramadol", "codeine", "buprenorphine", "potassium chloride",
+])
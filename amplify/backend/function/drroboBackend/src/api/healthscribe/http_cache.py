@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import os
+import re
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+from . import metrics
+from .responses import dumps
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# CompressionMiddleware is installed by server.py only (SERVER_COMPRESSION). Behind the
+# Lambda REST API, set the API's minimumCompressionSize instead: without binaryMediaTypes,
+# API Gateway would send an app-compressed body as base64 text labelled gzip.
+# Responses smaller than this aren't worth the CPU to compress
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4  # fast settings; SOAP/transcript JSON still shrinks ~5-8x
+
+_COMPRESSIBLE_TYPES = ("application/json", "application/fhir+json", "text/")
+
+
+_ENCODING_SUFFIX = re.compile(r'-(?:br|gzip)"$')
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison per RFC 9110: ignore W/ and the content-coding suffix
+    # CompressionMiddleware adds to the tag of compressed representations
+    candidates = [_ENCODING_SUFFIX.sub('"', tag.strip().removeprefix("W/")) for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def conditional_json_response(request: Request, payload: Any, cache_control: str = "no-cache") -> Response:
+    """
+    JSON response with a strong ETag over the serialized body. A client that sends
+    a matching If-None-Match gets an empty 304 instead of the full payload again.
+    `no-cache` still lets browsers store it, but makes them revalidate every poll.
+    """
+    body = dumps(payload)
+    etag = strong_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        metrics.record("http.not_modified_bytes_saved", len(body))
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick br (if brotli is installed) or gzip from an Accept-Encoding header, honouring q=0.
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware: negotiated br/gzip for buffered responses above
+    COMPRESS_MIN_BYTES. Streaming responses (more_body=True) pass through untouched
+    so their chunks still reach the client as soon as they are produced.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        encoding = _choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._should_compress(start_message, body):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            metrics.record("http.compression_bytes_saved", len(body) - len(compressed), encoding=encoding)
+            response_headers = []
+            for k, v in start_message["headers"]:
+                if k.lower() == b"content-length":
+                    continue
+                if k.lower() == b"etag" and v.endswith(b'"'):
+                    # A compressed body is a different representation, so it gets its own strong tag
+                    v = v[:-1] + b"-" + encoding.encode() + b'"'
+                response_headers.append((k, v))
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, start_message, body: bytes) -> bool:
+        if len(body) < self.minimum_size or start_message["status"] < 200 or start_message["status"] in (204, 304):
+            return False
+        response_headers = {k.lower(): v for k, v in start_message["headers"]}
+        if b"content-encoding" in response_headers:
+            return False
+        content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
@@ -0,0 +1,206 @@
+import codecs
+import json
+import re
+from typing import Any, Iterator, Tuple
+
+# Bytes pulled from the underlying stream per read; also the bound on buffered text
+CHUNK_SIZE = 64 * 1024
+# Largest single captured value (e.g. one transcript segment) we are willing to buffer
+MAX_VALUE_CHARS = 16 * 1024 * 1024
+
+_DECODER = json.JSONDecoder()
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"', re.DOTALL)
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS = re.compile(r"[0-9.eE+\-]*")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+class _Lexer:
+    """
+    Incremental JSON tokenizer over a binary stream with .read(size).
+    Only the unconsumed tail of the current chunk is held in memory, plus the
+    token being read (a single very long string is the only thing that can grow it).
+    """
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.token_start = 0
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.stream.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.decoder.decode(b"", final=True)
+        else:
+            self.buf = self.buf[self.pos:] + self.decoder.decode(data)
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return
+
+    def decode_value(self, start: int) -> Any:
+        """
+        Decode one complete JSON value beginning at buffer offset `start` with the
+        C decoder, pulling more chunks until the value is complete.
+        """
+        self.pos = start
+        while True:
+            try:
+                value, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if len(self.buf) - self.pos > MAX_VALUE_CHARS or not self._fill():
+                    raise JSONStreamError(f"Invalid or oversized value at offset {self.pos}")
+
+    def next_token(self) -> Tuple[str, Any]:
+        self._skip_whitespace()
+        if self.pos >= len(self.buf):
+            return ("eof", None)
+        self.token_start = self.pos
+
+        char = self.buf[self.pos]
+        if char in "{}[]:,":
+            self.pos += 1
+            return (char, None)
+
+        if char == '"':
+            while True:
+                match = _STRING.match(self.buf, self.pos)
+                if match:
+                    self.pos = match.end()
+                    raw = match.group(1)
+                    return ("string", json.loads(f'"{raw}"') if "\\" in raw else raw)
+                if not self._fill():
+                    raise JSONStreamError("Unterminated string")
+
+        if char == "-" or char.isdigit():
+            # A number touching the end of the buffer may continue in the next chunk
+            while _NUMBER_CHARS.match(self.buf, self.pos).end() == len(self.buf) and self._fill():
+                pass
+            match = _NUMBER.match(self.buf, self.pos)
+            if not match:
+                raise JSONStreamError(f"Invalid number at offset {self.pos}")
+            self.pos = match.end()
+            text = match.group(0)
+            return ("number", float(text) if any(c in text for c in ".eE") else int(text))
+
+        for literal, value in _LITERALS.items():
+            while len(self.buf) - self.pos < len(literal) and self._fill():
+                pass
+            if self.buf.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return ("literal", value)
+        raise JSONStreamError(f"Unexpected character {char!r}")
+
+
+def _join(prefix: str, name: str) -> str:
+    return f"{prefix}.{name}" if prefix else name
+
+
+def _parse_python(stream, chunk_size: int = CHUNK_SIZE, capture=frozenset()) -> Iterator[Tuple[str, str, Any]]:
+    """
+    Event parser. Values whose prefix is in `capture` are not broken into events:
+    they are decoded whole by the C json decoder and yielded as (prefix, "value", obj),
+    which keeps per-token Python work to the document skeleton.
+    """
+    lexer = _Lexer(stream, chunk_size)
+    # Open containers: [kind, prefix, current key, expecting a key]
+    stack = []
+
+    while True:
+        token, value = lexer.next_token()
+        if token == "eof":
+            if stack:
+                raise JSONStreamError("Unexpected end of document")
+            return
+        if token == ":":
+            continue
+        if token == ",":
+            if stack and stack[-1][0] == "map":
+                stack[-1][3] = True
+            continue
+
+        top = stack[-1] if stack else None
+        if top is not None and top[0] == "map" and top[3] and token != "}":
+            if token != "string":
+                raise JSONStreamError("Expected object key")
+            top[2] = value
+            top[3] = False
+            yield (top[1], "map_key", value)
+            continue
+
+        if token == "}":
+            if top is None or top[0] != "map":
+                raise JSONStreamError("Unbalanced }")
+            stack.pop()
+            yield (top[1], "end_map", None)
+            continue
+        if token == "]":
+            if top is None or top[0] != "array":
+                raise JSONStreamError("Unbalanced ]")
+            stack.pop()
+            yield (top[1], "end_array", None)
+            continue
+
+        if top is None:
+            prefix = ""
+        elif top[0] == "array":
+            prefix = _join(top[1], "item")
+        else:
+            prefix = _join(top[1], top[2])
+
+        if prefix in capture:
+            if token in ("{", "["):
+                value = lexer.decode_value(lexer.token_start)
+            yield (prefix, "value", value)
+            continue
+
+        if token == "{":
+            yield (prefix, "start_map", None)
+            stack.append(["map", prefix, None, True])
+        elif token == "[":
+            yield (prefix, "start_array", None)
+            stack.append(["array", prefix, None, False])
+        elif token == "string":
+            yield (prefix, "string", value)
+        elif token == "number":
+            yield (prefix, "number", value)
+        else:
+            yield (prefix, "null" if value is None else "boolean", value)
+
+
+def parse(stream, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, str, Any]]:
+    """
+    ijson-style (prefix, event, value) events from a binary stream with .read(size),
+    e.g. a botocore StreamingBody. The document is never materialized.
+    """
+    return _parse_python(stream, chunk_size)
+
+
+def iter_prefixed_items(stream, prefixes, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Single pass over the document yielding (prefix, value) for every value found
+    at any of `prefixes`, so several arrays can be consumed without re-reading the stream.
+    Only one captured value is materialized at a time.
+    """
+    prefixes = frozenset(prefixes)
+    for event_prefix, event, value in _parse_python(stream, chunk_size, capture=prefixes):
+        if event == "value":
+            yield event_prefix, value
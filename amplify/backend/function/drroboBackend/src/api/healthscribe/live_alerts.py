@@ -0,0 +1,104 @@
+import os
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+from .triage import iter_red_flags
+from .formulary import HIGH_ALERT_MEDICATIONS
+from .medications import iter_medications
+
+# Utterances (final segments) kept in the sliding window
+LIVE_ALERT_WINDOW = int(os.getenv("LIVE_ALERT_WINDOW", "12"))
+# A growing partial is rescanned from this many characters before its old end,
+# so a phrase split across two partials ("chest" | "chest pain") is still caught
+RESCAN_OVERLAP_CHARS = 64
+
+@dataclass
+class _Utterance:
+    segment_id: str
+    labels: Set[Tuple[str, str]] = field(default_factory=set)
+    text: str = ""
+    scanned: int = 0
+
+
+class LiveAlertAnalyzer:
+    """
+    Incremental red-flag / medication alerts over a live transcript.
+
+    Each update only scans the new tail of its own segment. Labels found in the
+    last LIVE_ALERT_WINDOW utterances (plus segments still in progress) are counted,
+    so a condition that is already being discussed doesn't re-alert, while one
+    mentioned again after it has left the window does. Cost per update is independent of consult length.
+    """
+
+    def __init__(self, window_size: int = LIVE_ALERT_WINDOW):
+        self.window: deque = deque()
+        self.window_size = window_size
+        self.active: Counter = Counter()
+        self.fired: List[Dict[str, Any]] = []
+        self._open: Dict[str, _Utterance] = {}
+
+    def feed(self, update) -> List[Dict[str, Any]]:
+        """
+        Process one TranscriptUpdate; returns alerts that fired on it.
+        """
+        utterance = self._open.get(update.segment_id)
+        if utterance is None:
+            utterance = self._open[update.segment_id] = _Utterance(update.segment_id)
+
+        text = update.text
+        if text.startswith(utterance.text):
+            start = max(0, utterance.scanned - RESCAN_OVERLAP_CHARS)
+        else:
+            # The transcriber revised earlier words; rescan just this segment
+            start = 0
+        utterance.text = text
+        utterance.scanned = len(text)
+
+        alerts = []
+        for kind, label, matched in self._matches(text, start):
+            key = (kind, label)
+            if key in utterance.labels:
+                continue
+            utterance.labels.add(key)
+            # Open utterances count towards the window too, so concurrent segments don't repeat an alert
+            self.active[key] += 1
+            if self.active[key] > 1:
+                continue
+            alert = {
+                "type": "alert",
+                "kind": kind,
+                "label": label,
+                "severity": self._severity(kind, label),
+                "match": matched,
+                "segmentId": update.segment_id,
+                "speaker": update.speaker,
+                "utterance": text,
+                "at": round(update.end, 3),
+            }
+            self.fired.append(alert)
+            alerts.append(alert)
+
+        if not update.is_partial:
+            self._close(utterance)
+        return alerts
+
+    def _matches(self, text: str, start: int):
+        for label, match in iter_red_flags(text, start):
+            yield "red_flag", label, match.group(0)
+        # Any formulary drug; high-alert ones (narrow therapeutic index / high harm if wrong) as warnings
+        for name, mention in iter_medications(text, start):
+            yield "medication", name, text[mention.start:mention.end]
+
+    @staticmethod
+    def _severity(kind: str, label: str) -> str:
+        if kind == "red_flag":
+            return "critical"
+        return "warning" if label in HIGH_ALERT_MEDICATIONS else "info"
+
+    def _close(self, utterance: _Utterance):
+        del self._open[utterance.segment_id]
+        self.window.append(utterance)
+        if len(self.window) > self.window_size:
+            for key in self.window.popleft().labels:
+                self.active[key] -= 1
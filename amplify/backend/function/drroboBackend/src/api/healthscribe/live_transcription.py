@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from . import metrics
+from .live_alerts import LiveAlertAnalyzer
+from .transcript_segments import SegmentStore
+
+try:
+    from amazon_transcribe.client import TranscribeStreamingClient
+except ImportError:  # optional: only the local replay transcriber is available
+    TranscribeStreamingClient = None
+
+# "aws" streams to Amazon Transcribe; "replay" plays back canned partials (local dev / tests)
+LIVE_TRANSCRIBE_MODE = os.getenv("LIVE_TRANSCRIBE_MODE", "aws")
+LIVE_REPLAY_FILE = os.getenv("LIVE_TRANSCRIBE_REPLAY_FILE")
+# Audio covered by one MediaRecorder chunk in replay mode (matches a 250 ms timeslice)
+LIVE_REPLAY_CHUNK_SECONDS = float(os.getenv("LIVE_TRANSCRIBE_REPLAY_CHUNK_SECONDS", "0.25"))
+# Refuse single frames larger than this; MediaRecorder chunks are a few KB
+LIVE_MAX_CHUNK_BYTES = int(os.getenv("LIVE_TRANSCRIBE_MAX_CHUNK_BYTES", str(256 * 1024)))
+
+# Encodings accepted by Transcribe streaming; browsers must record ogg/opus or send PCM
+MEDIA_ENCODINGS = ("ogg-opus", "pcm", "flac")
+
+# Canned consult used by the replay transcriber when no replay file is configured
+DEFAULT_REPLAY_SCRIPT = [
+    ("CLINICIAN", "Good morning, what brings you in today?"),
+    ("PATIENT", "I've had a cough and a mild fever for about four days."),
+    ("CLINICIAN", "Any shortness of breath or chest pain?"),
+    ("PATIENT", "A little short of breath when I climb stairs, no chest pain."),
+    ("CLINICIAN", "Are you taking any medications at the moment?"),
+    ("PATIENT", "Just lisinopril 10 mg once a day for my blood pressure."),
+]
+
+
+@dataclass
+class TranscriptUpdate:
+    """
+    One partial or final result for a transcript segment. Partials for the same
+    segment_id replace each other; the final one is stable.
+    """
+    segment_id: str
+    speaker: str
+    begin: float
+    end: float
+    text: str
+    is_partial: bool
+
+    def to_message(self) -> Dict[str, Any]:
+        return {
+            "type": "partial" if self.is_partial else "final",
+            "segmentId": self.segment_id,
+            "speaker": self.speaker,
+            "begin": round(self.begin, 3),
+            "end": round(self.end, 3),
+            "text": self.text,
+        }
+
+
+class ReplayTranscriber:
+    """
+    Local stand-in for the streaming client: every audio chunk received advances a
+    canned script by one word, emitting a partial per word and a final per utterance.
+    Output is deterministic, so tests can assert on exact messages.
+    """
+
+    def __init__(self, script: Optional[List[Tuple[str, str]]] = None, chunk_seconds: float = LIVE_REPLAY_CHUNK_SECONDS):
+        self.script = script if script is not None else load_replay_script()
+        self.chunk_seconds = chunk_seconds
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._line = 0
+        self._word = 0
+        self._chunks = 0
+        self._segment_begin = 0.0
+
+    async def start(self):
+        pass
+
+    async def send_audio(self, chunk: bytes):
+        self._chunks += 1
+        if self._line >= len(self.script):
+            return
+        speaker, text = self.script[self._line]
+        words = text.split()
+        self._word += 1
+        now = self._chunks * self.chunk_seconds
+        done = self._word >= len(words)
+        await self._queue.put(TranscriptUpdate(
+            f"replay-{self._line}", speaker, self._segment_begin, now,
+            text if done else " ".join(words[:self._word]), is_partial=not done,
+        ))
+        if done:
+            self._line += 1
+            self._word = 0
+            self._segment_begin = now
+
+    async def end(self):
+        await self._queue.put(None)
+
+    async def updates(self) -> AsyncIterator[TranscriptUpdate]:
+        while True:
+            update = await self._queue.get()
+            if update is None:
+                return
+            yield update
+
+
+class AWSStreamingTranscriber:
+    """
+    Amazon Transcribe streaming over HTTP/2 via the amazon-transcribe SDK, with
+    speaker labels and partial-result stabilization so partials don't flicker.
+    The Python SDK only exposes StartStreamTranscription (not the Medical variant);
+    a medical custom vocabulary can be attached with VITE_TRANSCRIBE_VOCABULARY.
+    """
+
+    def __init__(self, media_encoding: str = "ogg-opus", sample_rate: int = 48000):
+        self.region = os.environ.get("VITE_AWS_REGION", "us-east-1")
+        self.media_encoding = media_encoding
+        self.sample_rate = sample_rate
+        self._stream = None
+
+    async def start(self):
+        client = TranscribeStreamingClient(region=self.region)
+        self._stream = await client.start_stream_transcription(
+            language_code="en-US",
+            media_sample_rate_hz=self.sample_rate,
+            media_encoding=self.media_encoding,
+            vocabulary_name=os.getenv("VITE_TRANSCRIBE_VOCABULARY") or None,
+            show_speaker_label=True,
+            enable_partial_results_stabilization=True,
+            partial_results_stability="high",
+        )
+
+    async def send_audio(self, chunk: bytes):
+        await self._stream.input_stream.send_audio_event(audio_chunk=chunk)
+
+    async def end(self):
+        await self._stream.input_stream.end_stream()
+
+    async def updates(self) -> AsyncIterator[TranscriptUpdate]:
+        async for event in self._stream.output_stream:
+            for result in getattr(event.transcript, "results", None) or []:
+                if not result.alternatives:
+                    continue
+                alternative = result.alternatives[0]
+                speaker = next((item.speaker for item in alternative.items or [] if item.speaker), None)
+                yield TranscriptUpdate(
+                    result.result_id,
+                    f"spk_{speaker}" if speaker is not None else "SPEAKER",
+                    result.start_time or 0.0,
+                    result.end_time or 0.0,
+                    alternative.transcript,
+                    result.is_partial,
+                )
+
+
+def load_replay_script() -> List[Tuple[str, str]]:
+    """
+    Replay script from LIVE_TRANSCRIBE_REPLAY_FILE: a JSON list of
+    {"speaker": ..., "text": ...}. Falls back to the built-in consult.
+    """
+    if not LIVE_REPLAY_FILE:
+        return list(DEFAULT_REPLAY_SCRIPT)
+    with open(LIVE_REPLAY_FILE) as f:
+        return [(line.get("speaker", "SPEAKER"), line["text"]) for line in json.load(f)]
+
+
+def create_transcriber(media_encoding: str = "ogg-opus", sample_rate: int = 48000):
+    if LIVE_TRANSCRIBE_MODE == "replay":
+        return ReplayTranscriber()
+    if TranscribeStreamingClient is None:
+        print("⚠️ amazon-transcribe not installed; live transcription falls back to replay mode")
+        return ReplayTranscriber()
+    return AWSStreamingTranscriber(media_encoding, sample_rate)
+
+
+class LiveTranscriptionSession:
+    """
+    One consult's live stream: audio chunks in, transcript updates and alerts out.
+    Final segments accumulate in a SegmentStore so the full transcript is ready
+    for /agent/analyze the moment the clinician stops recording.
+    """
+
+    def __init__(self, transcriber, consult_id: Optional[str] = None):
+        self.transcriber = transcriber
+        self.consult_id = consult_id
+        self.session_id = str(uuid.uuid4())
+        self.segments = SegmentStore()
+        self.alerts = LiveAlertAnalyzer()
+        self.chunks_received = 0
+        self.bytes_received = 0
+        self._last_chunk_at: Optional[float] = None
+
+    async def send_audio(self, chunk: bytes):
+        if len(chunk) > LIVE_MAX_CHUNK_BYTES:
+            raise ValueError(f"Audio chunk of {len(chunk)} bytes exceeds {LIVE_MAX_CHUNK_BYTES}")
+        self.chunks_received += 1
+        self.bytes_received += len(chunk)
+        self._last_chunk_at = time.perf_counter()
+        await self.transcriber.send_audio(chunk)
+
+    async def updates(self) -> AsyncIterator[TranscriptUpdate]:
+        async for update in self.transcriber.updates():
+            if self._last_chunk_at is not None:
+                # Time from the most recent audio arriving to the result going back out
+                metrics.record("live.result_latency_ms", (time.perf_counter() - self._last_chunk_at) * 1000,
+                               kind="partial" if update.is_partial else "final")
+            if not update.is_partial:
+                self.segments.add_segment(update.begin, update.end, update.speaker, update.text)
+            yield update
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "type": "done",
+            "sessionId": self.session_id,
+            "consultId": self.consult_id,
+            "segmentCount": len(self.segments),
+            "transcript": self.segments.transcript_text(),
+            "talkTime": self.segments.talk_time_by_speaker(),
+            "alerts": self.alerts.fired,
+        }
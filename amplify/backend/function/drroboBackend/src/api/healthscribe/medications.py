@@ -0,0 +1,297 @@
+import re
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .formulary import FORMULARY, HIGH_ALERT_MEDICATIONS
+
+# Medication extraction from free text (treatment plans, transcripts): drug names
+# are found with a word-level trie compiled from the bundled formulary, then dose,
+# route, frequency and duration are read from the words around each name.
+
+WORD = re.compile(r"[A-Za-z0-9]+")
+
+_END = ""  # trie key marking "a name ends here" (never a word)
+
+
+def compile_word_trie(entries: Iterable[Tuple[str, Any]]) -> Dict[str, Any]:
+    """
+    Word-level trie over (name, value) pairs. Names are split into words the
+    same way text is, so "co-amoxiclav", "co amoxiclav" and "Co-Amoxiclav"
+    all walk the same path.
+    """
+    trie: Dict[str, Any] = {}
+    for name, value in entries:
+        node = trie
+        for word in WORD.findall(name.lower()):
+            node = node.setdefault(word, {})
+        node[_END] = value
+    return trie
+
+
+def iter_trie_matches(trie: Dict[str, Any], text: str, pos: int = 0) -> Iterator[Tuple[Any, int, int]]:
+    """
+    (value, start, end) for each trie name in `text` from offset `pos` on,
+    longest name first where names overlap ("insulin glargine" over "insulin").
+    """
+    # Never start mid-word: "...nasal" scanned from "sal" must not find anything
+    while 0 < pos < len(text) and text[pos - 1].isalnum():
+        pos -= 1
+    words = [(m.start(), m.end(), m.group().lower()) for m in WORD.finditer(text, pos)]
+    i, n = 0, len(words)
+    while i < n:
+        node = trie.get(words[i][2])
+        if node is None:
+            i += 1
+            continue
+        found, j = None, i
+        while node is not None:
+            if _END in node:
+                found = (node[_END], j)
+            j += 1
+            node = node.get(words[j][2]) if j < n else None
+        if found is None:
+            i += 1
+            continue
+        value, last = found
+        yield value, words[i][0], words[last][1]
+        i = last + 1
+
+
+MEDICATION_TRIE = compile_word_trie(
+    (name, generic) for generic, (_, aliases) in FORMULARY.items() for name in (generic, *aliases)
+)
+
+
+class Mention(NamedTuple):
+    name: str  # generic name
+    start: int
+    end: int
+
+
+def iter_mentions(text: str, pos: int = 0) -> Iterator[Mention]:
+    """
+    Every formulary drug named in `text` from offset `pos` on.
+    """
+    for name, start, end in iter_trie_matches(MEDICATION_TRIE, text, pos):
+        yield Mention(name, start, end)
+
+
+# ---------- dose / route / frequency ----------
+
+_NUMBER = r"\d+(?:\.\d+)?"
+_COUNT = r"\d+(?:\.\d+)?|one|two|three|four|half|a"
+_WORD_NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "half": 0.5, "a": 1}
+
+UNITS = {
+    "mg": "mg", "milligram": "mg", "milligrams": "mg",
+    "mcg": "mcg", "microgram": "mcg", "micrograms": "mcg", "µg": "mcg", "ug": "mcg",
+    "g": "g", "gram": "g", "grams": "g",
+    "ml": "mL", "millilitre": "mL", "millilitres": "mL", "milliliter": "mL", "milliliters": "mL",
+    "unit": "units", "units": "units", "iu": "units",
+    "mmol": "mmol", "%": "%",
+}
+FORMS = {
+    "tablet": "tablet", "tab": "tablet", "capsule": "capsule", "cap": "capsule", "puff": "puff",
+    "drop": "drop", "sachet": "sachet", "patch": "patch", "spray": "spray", "suppository": "suppository",
+    "ampoule": "ampoule", "vial": "vial", "pessary": "pessary",
+}
+ROUTES = [
+    ("oral", r"orally|oral|by mouth|p\.?o\.?"),
+    ("intravenous", r"intravenous(?:ly)?|i\.?v\.?"),
+    ("intramuscular", r"intramuscular(?:ly)?|i\.?m\.?"),
+    ("subcutaneous", r"subcutaneous(?:ly)?|subcut|s\.?c\.?|s/c"),
+    ("inhaled", r"inhaled|via (?:an )?inhaler|inhaler|nebuli[sz]ed|nebuli[sz]er|nebs?"),
+    ("sublingual", r"sublingual(?:ly)?|s\.?l\.?"),
+    ("rectal", r"rectal(?:ly)?|p\.?r\.?"),
+    ("transdermal", r"transdermal(?:ly)?"),
+    ("topical", r"topical(?:ly)?|cream|ointment|gel"),
+    ("nasal", r"intranasal(?:ly)?|nasal"),
+    ("ophthalmic", r"eye drops?|ophthalmic"),
+]
+# (code, doses per day or None, pattern); longest phrasings first
+FREQUENCIES = [
+    ("QID", 4, r"four times (?:a |per |each )?(?:day|daily)|q\.?d\.?s\.?|q\.?i\.?d\.?"),
+    ("TID", 3, r"three times (?:a |per |each )?(?:day|daily)|t\.?d\.?s\.?|t\.?i\.?d\.?"),
+    ("BID", 2, r"twice (?:a |per |each )?(?:day|daily)|two times (?:a |per )?day|b\.?d\.?|b\.?i\.?d\.?"),
+    ("HS", 1, r"at night|at bedtime|before bed|nocte|q\.?h\.?s\.?"),
+    ("AM", 1, r"in the morning|every morning|mane"),
+    ("WK", 1 / 7, r"once (?:a |per )?week|weekly|every week"),
+    ("QD", 1, r"once (?:a |per |each )?(?:day|daily)|every day|each day|daily|o\.?d\.?|q\.?d\.?"),
+    ("ONCE", None, r"stat|as a single dose|single dose|once only"),
+]
+ACTIONS = [
+    ("stop", r"stop(?:ping)?|discontinue|cease|withhold|hold|avoid|do not (?:give|take|use|start|prescribe)|don'?t (?:take|use)"),
+    ("continue", r"continue|carry on(?: with)?|remain on|stay on|keep taking"),
+    ("increase", r"increase|uptitrate|titrate up"),
+    ("reduce", r"reduce|decrease|wean|taper"),
+]
+
+_alternatives = [
+    rf"(?P<strength>(?P<value>{_NUMBER})(?:\s*(?:-|to)\s*(?P<value_max>{_NUMBER}))?\s*"
+    rf"(?P<unit>{'|'.join(sorted(map(re.escape, UNITS), key=len, reverse=True))})(?![a-z])"
+    rf"(?:\s*/\s*(?P<per_value>{_NUMBER})?\s*(?P<per_unit>ml|dose|puff|tablet)\b)?)",
+    rf"(?P<quantity>\b(?P<count>{_COUNT})(?:\s*(?:-|to|or)\s*(?P<count_max>{_COUNT}))?\s*"
+    rf"(?P<form>{'|'.join(sorted(FORMS, key=len, reverse=True))})(?:e?s)?\b)",
+    rf"(?P<every>\b(?:every|q)\s*(?P<hours>\d+)\s*(?:-\s*\d+\s*)?(?:hours?|hourly|hrs?|h)\b)",
+    r"(?P<prn>\b(?:p\.?r\.?n\.?|as (?:needed|required)|when required|if (?:needed|required))(?![a-z]))",
+    r"(?P<duration>\b(?:for|x|×)\s*(?P<duration_value>\d+)\s*(?P<duration_unit>days?|weeks?|months?)\b)",
+]
+_alternatives += [rf"(?P<route_{i}>\b(?:{pattern})(?![a-z]))" for i, (_, pattern) in enumerate(ROUTES)]
+_alternatives += [rf"(?P<freq_{i}>\b(?:{pattern})(?![a-z]))" for i, (_, _, pattern) in enumerate(FREQUENCIES)]
+
+# One scan of the text after a drug name finds all of its attributes. Every
+# alternative starts a word, so the leading check lets the scan skip mid-word
+# positions without trying each alternative there.
+ATTRIBUTE_PATTERN = re.compile(r"(?<![A-Za-z0-9])(?:" + "|".join(_alternatives) + ")", re.IGNORECASE)
+# Dose written before the name: "500 mg amoxicillin", "2 puffs of salbutamol"
+LEADING_DOSE = re.compile(rf"(?:{_alternatives[0]}|{_alternatives[1]})\s*(?:of\s+)?$", re.IGNORECASE)
+ACTION_PATTERN = re.compile(
+    "|".join(rf"(?P<action_{i}>\b(?:{pattern})\b)" for i, (_, pattern) in enumerate(ACTIONS)), re.IGNORECASE
+)
+# Only a conjunction between two names: the second shares the first's verb ("stop X and Y")
+CONJUNCTION = re.compile(r"\s*(?:,|and|or|&|/|\+)?\s*", re.IGNORECASE)
+# Clause ends: a semicolon, a line break, or a full stop before a capital or the
+# end (not a decimal point or the dots of "p.o. t.d.s.")
+CLAUSE_END = re.compile(r"[;\n]|\.(?=\s+[A-Z]|\s*$)")
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    value = value.lower()
+    if value in _WORD_NUMBERS:
+        return _WORD_NUMBERS[value]
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _strength(m: "re.Match") -> Dict[str, Any]:
+    dose = {"value": _number(m.group("value")), "value_max": _number(m.group("value_max")),
+            "unit": UNITS[m.group("unit").lower()]}
+    if m.group("per_unit"):
+        dose["per"] = {"value": _number(m.group("per_value")) or 1, "unit": m.group("per_unit").lower()}
+    return dose
+
+
+def _quantity(m: "re.Match") -> Dict[str, Any]:
+    return {"value": _number(m.group("count")), "value_max": _number(m.group("count_max")),
+            "form": FORMS[m.group("form").lower()]}
+
+
+def _attributes(text: str, start: int, end: int, medication: Dict[str, Any]):
+    for m in ATTRIBUTE_PATTERN.finditer(text, start, end):
+        kind = m.lastgroup
+        if kind == "strength":
+            medication["dose"] = medication["dose"] or _strength(m)
+        elif kind == "quantity":
+            medication["quantity"] = medication["quantity"] or _quantity(m)
+        elif kind == "every":
+            hours = int(m.group("hours"))
+            if medication["frequency"] is None and hours:
+                medication["frequency"] = {"code": f"Q{hours}H", "per_day": round(24 / hours, 2), "text": m.group()}
+        elif kind == "prn":
+            medication["prn"] = True
+        elif kind == "duration":
+            medication["duration"] = medication["duration"] or {
+                "value": int(m.group("duration_value")), "unit": m.group("duration_unit").lower().rstrip("s")}
+        elif kind.startswith("route_"):
+            medication["route"] = medication["route"] or ROUTES[int(kind[6:])][0]
+        elif kind.startswith("freq_") and medication["frequency"] is None:
+            code, per_day, _ = FREQUENCIES[int(kind[5:])]
+            medication["frequency"] = {"code": code, "per_day": round(per_day, 2) if per_day else per_day,
+                                       "text": m.group()}
+
+
+def parse_text(text: str) -> List[Dict[str, Any]]:
+    """
+    One entry per drug named in `text`, with whatever dose, quantity, route,
+    frequency, PRN flag and duration were written next to it, and the action
+    ("start", "stop", "continue", "increase", "reduce") the text applies to it.
+    Attributes are read from the drug name up to the next drug name or the end
+    of the clause, so "amlodipine 5 mg daily and ramipril 2.5 mg" keeps them apart.
+    """
+    mentions = list(iter_mentions(text))
+    if not mentions:
+        return []
+    clause_starts = [0] + [m.end() for m in CLAUSE_END.finditer(text)]
+    medications = []
+    for k, mention in enumerate(mentions):
+        clause_start = clause_starts[bisect_right(clause_starts, mention.start) - 1]
+        # Attributes: from the name to the next name or the end of the clause
+        end = next((c for c in clause_starts if c > mention.end), len(text) + 1) - 1
+        if k + 1 < len(mentions):
+            end = min(end, mentions[k + 1].start)
+        # Verbs and a leading dose: from the previous name in the clause (or its start)
+        previous = medications[-1] if medications and mentions[k - 1].end > clause_start else None
+        before = text[mentions[k - 1].end if previous else clause_start:mention.start]
+
+        classes, _ = FORMULARY[mention.name]
+        medication = {
+            "name": mention.name,
+            "matched": text[mention.start:mention.end],
+            "classes": list(classes),
+            "high_alert": mention.name in HIGH_ALERT_MEDICATIONS,
+            "action": "start",
+            "dose": None, "quantity": None, "route": None, "frequency": None, "prn": False, "duration": None,
+            "span": [mention.start, mention.end],
+        }
+        actions = list(ACTION_PATTERN.finditer(before))
+        if actions:
+            medication["action"] = ACTIONS[int(actions[-1].lastgroup[7:])][0]
+        elif previous and CONJUNCTION.fullmatch(before):
+            medication["action"] = previous["action"]
+        leading = LEADING_DOSE.search(before)
+        if leading:
+            if leading.group("strength"):
+                medication["dose"] = _strength(leading)
+            else:
+                medication["quantity"] = _quantity(leading)
+        _attributes(text, mention.end, max(end, mention.end), medication)
+        medications.append(medication)
+    return medications
+
+
+# treatment_plan keys whose text can prescribe; lifestyle advice and the like never does
+PLAN_SECTIONS = ("immediate", "ongoing", "medications", "treatment_details")
+
+
+def _lines(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    return []
+
+
+def parse_treatment_plan(plan: Any) -> List[Dict[str, Any]]:
+    """
+    Structured medications for an agent treatment_plan, each tagged with the
+    plan section and line it came from.
+    """
+    if not isinstance(plan, dict):
+        return []
+    medications = []
+    for section in PLAN_SECTIONS:
+        for i, line in enumerate(_lines(plan.get(section))):
+            for medication in parse_text(line):
+                medication["source"] = {"section": section, "line": i}
+                medications.append(medication)
+    return medications
+
+
+def is_medication_line(line: str) -> bool:
+    """
+    True for a plan line that names a formulary drug or gives a dose.
+    """
+    if next(iter_mentions(line), None) is not None:
+        return True
+    m = ATTRIBUTE_PATTERN.search(line)
+    return m is not None and m.lastgroup in ("strength", "quantity")
+
+
+def iter_medications(text: str, pos: int = 0) -> Iterator[Tuple[str, Mention]]:
+    """
+    (generic name, mention) for each drug named in `text` from `pos` on.
+    """
+    for mention in iter_mentions(text, pos):
+        yield mention.name, mention
@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Any
+
+# Lightweight in-process metrics.
+# The last few hundred samples of each series are kept for /metrics. Each sample is
+# also logged as a single "METRIC" line at DEBUG, for CloudWatch metric filters when
+# the function's log level is lowered; at the default level nothing is written per sample.
+
+logger = logging.getLogger(__name__)
+
+_MAX_SAMPLES = 500
+
+_lock = threading.Lock()
+_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=_MAX_SAMPLES))
+
+
+def _series_key(name: str, dims: Dict[str, Any]) -> str:
+    if not dims:
+        return name
+    labels = ",".join(f"{k}={v}" for k, v in sorted(dims.items()))
+    return f"{name}{{{labels}}}"
+
+
+def record(name: str, value: float, **dims):
+    """
+    Record one sample for a metric, e.g. record("agent.latency_ms", 812.4, mode="delta").
+    """
+    key = _series_key(name, dims)
+    with _lock:
+        _samples[key].append(float(value))
+    logger.debug("METRIC %s %.2f", key, value)
+
+
+class timer:
+    """
+    Context manager that records elapsed milliseconds:
+
+        with metrics.timer("agent.latency_ms", mode="full"):
+            ...
+    """
+
+    def __init__(self, name: str, **dims):
+        self.name = name
+        self.dims = dims
+        self.elapsed_ms = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        record(self.name, self.elapsed_ms, **self.dims)
+        return False
+
+
+def percentile(name: str, pct: float, **dims) -> float | None:
+    """
+    Percentile over the retained samples of one series, or None if there are none.
+    """
+    with _lock:
+        values = sorted(_samples.get(_series_key(name, dims), ()))
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def count(name: str, **dims) -> int:
+    """
+    Number of retained samples of one series.
+    """
+    with _lock:
+        return len(_samples.get(_series_key(name, dims), ()))
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """
+    Summary (count/mean/p50/p95/max) of every series, for the /metrics route.
+    """
+    with _lock:
+        series = {key: sorted(values) for key, values in _samples.items() if values}
+
+    summary = {}
+    for key, values in series.items():
+        count = len(values)
+        summary[key] = {
+            "count": count,
+            "mean": round(sum(values) / count, 2),
+            "p50": round(values[int(0.50 * (count - 1))], 2),
+            "p95": round(values[int(round(0.95 * (count - 1)))], 2),
+            "max": round(values[-1], 2),
+        }
+    return summary
@@ -0,0 +1,132 @@
+import os
+import time
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Iterable
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+from . import metrics
+from .cache import LRUTTLCache, MISSING
+
+# Digital Twin table holding longitudinal patient history, keyed by PatientID.
+PATIENT_TABLE = os.getenv("VITE_PATIENT_TABLE_NAME")
+# Point at DynamoDB Local (e.g. http://localhost:8000) for development
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+HISTORY_CACHE_SIZE = int(os.getenv("PATIENT_HISTORY_CACHE_SIZE", "1000"))
+HISTORY_CACHE_TTL_SECONDS = int(os.getenv("PATIENT_HISTORY_CACHE_TTL_SECONDS", "300"))
+
+BATCH_GET_LIMIT = 100  # DynamoDB BatchGetItem maximum keys per request
+BATCH_GET_MAX_ROUNDS = 5
+
+_deserializer = TypeDeserializer()
+
+
+def _plain(value):
+    """
+    DynamoDB numbers come back as Decimal and sets as set; make them JSON friendly.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+def item_to_history(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _plain(_deserializer.deserialize(v)) for k, v in item.items()}
+
+
+class PatientHistoryRepository:
+    """
+    Read-through cache over the Digital Twin DynamoDB table.
+    """
+
+    def __init__(self, table_name: Optional[str] = PATIENT_TABLE, client=None, cache: Optional[LRUTTLCache] = None):
+        self.table_name = table_name
+        self._client = client
+        self.cache = cache or LRUTTLCache(HISTORY_CACHE_SIZE, HISTORY_CACHE_TTL_SECONDS)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.table_name)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "dynamodb",
+                region_name=os.environ.get("VITE_AWS_REGION", "us-east-1"),
+                endpoint_url=DYNAMODB_ENDPOINT_URL
+            )
+        return self._client
+
+    def get(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        cached = self.cache.get(patient_id)
+        if cached is not MISSING:
+            metrics.record("patient_history.cache", 1, result="hit")
+            return cached
+
+        metrics.record("patient_history.cache", 1, result="miss")
+        with metrics.timer("patient_history.get_item_ms"):
+            response = self.client.get_item(
+                TableName=self.table_name,
+                Key={"PatientID": {"S": patient_id}}
+            )
+        history = item_to_history(response["Item"]) if "Item" in response else None
+        self.cache.put(patient_id, history)
+        return history
+
+    def get_many(self, patient_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Histories for several patients: cache hits first, the rest via BatchGetItem.
+        """
+        if not self.enabled:
+            return {}
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing: List[str] = []
+        for patient_id in dict.fromkeys(patient_ids):
+            cached = self.cache.get(patient_id)
+            if cached is MISSING:
+                missing.append(patient_id)
+            else:
+                results[patient_id] = cached
+
+        with metrics.timer("patient_history.batch_get_ms"):
+            for start in range(0, len(missing), BATCH_GET_LIMIT):
+                chunk = missing[start:start + BATCH_GET_LIMIT]
+                found, unprocessed = self._batch_get(chunk)
+                for patient_id in chunk:
+                    history = found.get(patient_id)
+                    if patient_id not in unprocessed:
+                        self.cache.put(patient_id, history)
+                    results[patient_id] = history
+        return results
+
+    def _batch_get(self, patient_ids: List[str]):
+        """
+        Returns (histories found, IDs still unprocessed after retrying throttled keys).
+        """
+        found = {}
+        request = {self.table_name: {"Keys": [{"PatientID": {"S": p}} for p in patient_ids]}}
+        for attempt in range(BATCH_GET_MAX_ROUNDS):
+            response = self.client.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(self.table_name, []):
+                history = item_to_history(item)
+                found[history["PatientID"]] = history
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            # Throttled keys: back off before asking again
+            time.sleep(0.05 * (2 ** attempt))
+        unprocessed = {
+            key["PatientID"]["S"] for key in request.get(self.table_name, {}).get("Keys", [])
+        }
+        return found, unprocessed
+
+
+patient_histories = PatientHistoryRepository()
@@ -0,0 +1,42 @@
+import json
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is the fallback
+    orjson = None
+
+
+def _default(value: Any):
+    # Values that can leak in from DynamoDB (Decimal, sets) or dataclass-ish objects
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized in one pass by orjson (stdlib json if it isn't installed).
+
+    Returning this from a route skips FastAPI's jsonable_encoder walk over the
+    agent result / SOAP note, which otherwise copies the whole object graph in
+    Python before json.dumps walks it a second time.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,12 +1,37 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+import asyncio
+import json
+from functools import lru_cache
+from urllib.parse import urlencode
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from .service import HealthScribeService
+from . import metrics
+from .batch import batches, MAX_BATCH_ITEMS
+from .analysis_jobs import analysis_jobs
+from .scheduler import agent_scheduler
+from .patient_history import patient_histories
+from .analysis_store import analysis_history
+from .search_index import search_index
+from .fhir_export import export_ndjson, export_page, decode_cursor, parse_since, RESOURCE_TYPES
+from .suggestions import suggestion_versions
+from .speculative import speculative_analyses
+from .decisions import decision_log, DecisionQueueFull, ACTIONS, MAX_DECISIONS_PER_REQUEST
+from .responses import FastJSONResponse, dumps
+from .http_cache import conditional_json_response
+from .live_transcription import LiveTranscriptionSession, create_transcriber, MEDIA_ENCODINGS
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # Define the router with metadata for the API docs
-router = APIRouter(prefix="/healthscribe", tags=["HealthScribe & AI Agent"])
+router = APIRouter(
+    prefix="/healthscribe",
+    tags=["HealthScribe & AI Agent"],
+    default_response_class=FastJSONResponse
+)
 
-# Dependency to get the service instance
+# Dependency to get the service instance. One per process: its boto3 clients
+# (and their connection pools) are reused across requests instead of rebuilt each time.
+@lru_cache(maxsize=None)
 def get_service():
     return HealthScribeService()
 
@@ -19,6 +44,72 @@ class PatientContext(BaseModel):
 class AgentRequest(BaseModel):
     transcript: str = Field(..., description="The medical transcript text to analyze")
     patient: Optional[Dict[str, Any]] = Field(None, description="Optional patient metadata")
+    consult_id: Optional[str] = Field(None, description="Stable consult ID; re-analysis only sends the new part of the transcript")
+    urgent: bool = Field(False, description="Clinician-marked urgency; dispatched ahead of routine work")
+    soap_note: Optional[Dict[str, Any]] = Field(None, description="HealthScribe SOAP note for this consult, kept with the stored analysis")
+
+class SuggestionsRequest(AgentRequest):
+    base_version: Optional[str] = Field(None, description="Suggestions version the client already holds; only changes since it are returned")
+
+class DecisionEvent(BaseModel):
+    suggestion_id: str = Field(..., description="Suggestion card ID")
+    action: str = Field(..., description="approve, reject or modify")
+    content: Optional[str] = Field(None, description="The edited card text (modify only)")
+    decided_at: Optional[float] = Field(None, description="Client epoch seconds when the clinician decided")
+    suggestion_version: Optional[str] = Field(None, description="Suggestions version the card came from")
+
+class DecisionBatch(BaseModel):
+    decisions: List[DecisionEvent] = Field(..., description="Decision events, in the order they were made")
+    patient_id: Optional[str] = None
+    clinician_id: Optional[str] = None
+
+class PrefetchRequest(BaseModel):
+    patient_ids: List[str] = Field(..., description="Patients whose Digital Twin history should be cached")
+
+class BatchAgentRequest(BaseModel):
+    items: List[AgentRequest] = Field(..., description="Transcripts to analyze")
+
+# Response models document the contract in OpenAPI. Heavy routes return a
+# FastJSONResponse directly, so the payload is serialized once and not re-validated.
+class SoapNote(BaseModel):
+    summary: str = ""
+    subjective: str = ""
+    objective: str = ""
+    assessment: str = ""
+    plan: str = ""
+    fullTranscript: str = ""
+
+class JobStatusResponse(BaseModel):
+    status: str
+    jobName: Optional[str] = None
+    clinicalNotes: Optional[SoapNote] = None
+
+    class Config:
+        extra = "allow"
+
+class ICDCode(BaseModel):
+    code: str
+    description: str = ""
+    confidence: float = 0.0
+
+class SafetyFindings(BaseModel):
+    red_flags: List[str] = []
+    contraindications_found: List[str] = []
+    conflicts: List[Dict[str, Any]] = Field([], description="Allergy, intolerance and interaction findings from the local checker")
+
+    class Config:
+        extra = "allow"
+
+class AgentAnalysis(BaseModel):
+    diagnosis: Dict[str, Any] = {}
+    icd_codes: List[ICDCode] = []
+    safety: SafetyFindings = SafetyFindings()
+    treatment_plan: Dict[str, Any] = {}
+    follow_ups: List[Dict[str, Any]] = []
+    medications: List[Dict[str, Any]] = Field([], description="Drugs in the treatment plan with parsed dose, route and frequency")
+
+    class Config:
+        extra = "allow"
 
 @router.post("/upload")
 async def upload_audio(
@@ -40,23 +131,62 @@ async def upload_audio(
         print(f"Error in /upload: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/status/{job_name}")
+@router.get("/status/{job_name}", response_model=JobStatusResponse)
 async def get_healthscribe_status(
     job_name: str, 
+    request: Request,
+    patient_id: Optional[str] = None,
     service: HealthScribeService = Depends(get_service)
 ):
     """
     Check if HealthScribe is done. 
     Returns the transcript and clinical notes if COMPLETED.
+    Send the ETag back as If-None-Match to get a 304 when nothing changed.
+    On completion the transcript is analyzed speculatively (for `patient_id`), so
+    /agent/analyze with the same transcript can answer without waiting on the agent.
     """
     try:
         result = await service.get_job_result(job_name)
-        return result
+        if result["status"] == "completed":
+            await speculative_analyses.start(job_name, result, patient_id, get_service)
+        return conditional_json_response(request, result)
     except Exception as e:
         print(f"Error in /status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/agent/analyze")
+@router.get("/transcript/{job_name}/segments")
+async def get_transcript_segments(
+    job_name: str,
+    request: Request,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    words: bool = False,
+    service: HealthScribeService = Depends(get_service)
+):
+    """
+    Timestamped transcript segments of a completed job in columnar form
+    (parallel begin/end/speaker/text lists), optionally limited to [start, end) seconds.
+    Also returns per-speaker talk time and merged speaker turns for the range.
+    """
+    try:
+        segments = await service.get_job_segments(job_name)
+    except Exception as e:
+        print(f"Error in /transcript/segments: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if segments is None:
+        raise HTTPException(status_code=409, detail="HealthScribe job has not completed yet.")
+
+    if start is not None or end is not None:
+        segments = segments.slice_time(start if start is not None else 0.0,
+                                       end if end is not None else float("inf"))
+    return conditional_json_response(request, {
+        "jobName": job_name,
+        "segments": segments.to_payload(include_words=words),
+        "talkTime": segments.talk_time_by_speaker(),
+        "turns": segments.turns(),
+    })
+
+@router.post("/agent/analyze", response_model=AgentAnalysis)
 async def analyze_with_agent(
     request: AgentRequest, 
     service: HealthScribeService = Depends(get_service)
@@ -67,9 +197,384 @@ async def analyze_with_agent(
     try:
         result = await service.call_bedrock_agent(
             transcript=request.transcript,
-            patient=request.patient
+            patient=request.patient,
+            consult_id=request.consult_id,
+            urgent=request.urgent,
+            soap_note=request.soap_note
         )
-        return result
+        return FastJSONResponse(result)
     except Exception as e:
         print(f"Error in /agent/analyze: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/agent/analyze/stream")
+async def analyze_with_agent_stream(
+    request: AgentRequest,
+    service: HealthScribeService = Depends(get_service)
+):
+    """
+    Same analysis as /agent/analyze, streamed as NDJSON: a {"type": "chunk", "text": ...}
+    line per agent chunk as it arrives, then one {"type": "result", "result": ...} line.
+    Chunks are a preview; the result line is authoritative. Served through the
+    streaming entry point (streaming.py), the browser sees chunks as they are produced.
+    """
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+
+    def on_chunk(text: str):
+        # Called from the agent's worker thread
+        loop.call_soon_threadsafe(updates.put_nowait, {"type": "chunk", "text": text})
+
+    async def run():
+        try:
+            result = await service.call_bedrock_agent(
+                transcript=request.transcript,
+                patient=request.patient,
+                consult_id=request.consult_id,
+                urgent=request.urgent,
+                on_chunk=on_chunk,
+                soap_note=request.soap_note
+            )
+            updates.put_nowait({"type": "result", "result": result})
+        except Exception as e:
+            print(f"Error in /agent/analyze/stream: {e}")
+            updates.put_nowait({"type": "error", "message": str(e)})
+
+    async def lines():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                update = await updates.get()
+                yield dumps(update) + b"\n"
+                if update["type"] != "chunk":
+                    return
+        finally:
+            # Client went away: give up the scheduler slot if the agent hasn't started yet
+            task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/agent/suggestions")
+async def analyze_to_suggestions(
+    request: SuggestionsRequest,
+    service: HealthScribeService = Depends(get_service)
+):
+    """
+    Runs the analysis and returns suggestion cards instead of the raw agent result.
+    Card IDs are stable across re-analyses of the consult. With `base_version` set to
+    the version the client holds, only added/changed/removed cards are returned.
+    """
+    if not request.consult_id:
+        raise HTTPException(status_code=400, detail="consult_id is required for versioned suggestions.")
+    try:
+        result = await service.call_bedrock_agent(
+            transcript=request.transcript,
+            patient=request.patient,
+            consult_id=request.consult_id,
+            urgent=request.urgent,
+            soap_note=request.soap_note
+        )
+        return suggestion_versions.update(request.consult_id, result, request.base_version)
+    except Exception as e:
+        print(f"Error in /agent/suggestions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/consults/{consult_id}/suggestions")
+async def get_consult_suggestions(consult_id: str, request: Request):
+    """
+    The consult's current suggestion cards and version, for a client that has lost its copy.
+    """
+    current = suggestion_versions.current(consult_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="No suggestions for this consult.")
+    return conditional_json_response(request, current)
+
+@router.post("/consults/{consult_id}/decisions", status_code=202)
+async def record_decisions(consult_id: str, batch: DecisionBatch, wait: bool = False):
+    """
+    Records the clinician's approve/reject/modify decisions for the consult's
+    suggestion cards in the audit log. Returns once they are queued for the
+    next group commit; `wait=true` returns once that commit is durable.
+    """
+    if not batch.decisions:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one decision.")
+    if len(batch.decisions) > MAX_DECISIONS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_DECISIONS_PER_REQUEST} decisions.")
+    for event in batch.decisions:
+        if event.action not in ACTIONS:
+            raise HTTPException(status_code=400, detail=f"action must be one of: {', '.join(ACTIONS)}.")
+        if event.action == "modify" and event.content is None:
+            raise HTTPException(status_code=400, detail="modify decisions need the edited content.")
+    try:
+        receipt = decision_log.record(consult_id, [e.dict() for e in batch.decisions],
+                                      patient_id=batch.patient_id, clinician_id=batch.clinician_id)
+    except DecisionQueueFull as e:
+        print(f"⚠️ Decisions refused for consult {consult_id}: {e}")
+        raise HTTPException(status_code=503, detail="Decision log is backed up, retry shortly.")
+    durable = await asyncio.to_thread(decision_log.wait, receipt["sequence"], 5.0) if wait else False
+    return {**receipt, "durable": durable}
+
+@router.get("/consults/{consult_id}/decisions")
+async def list_decisions(consult_id: str):
+    """
+    The consult's decisions in the order they were recorded, and the latest decision per card.
+    """
+    try:
+        return await asyncio.to_thread(decision_log.list, consult_id)
+    except Exception as e:
+        print(f"Error in /consults/decisions: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/agent/batch", status_code=202)
+async def submit_agent_batch(request: BatchAgentRequest):
+    """
+    Queue many transcripts (e.g. an end-of-clinic backlog) for agent analysis.
+    Each becomes an analysis job run by the workers at bulk priority;
+    poll /agent/batch/{batch_id} for results.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one transcript.")
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_BATCH_ITEMS} transcripts.")
+
+    try:
+        return await batches.submit([item.dict() for item in request.items], service_factory=get_service)
+    except Exception as e:
+        print(f"Error in /agent/batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/agent/batch/{batch_id}")
+async def get_agent_batch(batch_id: str, request: Request, cursor: Optional[str] = None):
+    """
+    Batch progress plus the results finished since `cursor`.
+    Pass the returned `cursor` on the next poll to only receive new results.
+    """
+    batch = await batches.get(batch_id, cursor)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found or expired.")
+    return conditional_json_response(request, batch)
+
+@router.post("/agent/jobs", status_code=202)
+async def submit_agent_job(request: AgentRequest):
+    """
+    Queue an analysis and return immediately with a job ID, instead of holding the
+    request open for the whole agent run (API Gateway cuts off at 29s).
+    Poll GET /agent/jobs/{job_id} for the result.
+    """
+    try:
+        job = await analysis_jobs.submit(request.dict(), service_factory=get_service)
+        return FastJSONResponse(job, status_code=202,
+                                headers={"Location": f"{router.prefix}/agent/jobs/{job['jobId']}"})
+    except Exception as e:
+        print(f"Error in /agent/jobs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/agent/jobs/{job_id}")
+async def get_agent_job(job_id: str, request: Request, wait: float = 0):
+    """
+    Job status (queued | running | completed | failed), with the analysis once completed.
+    `wait` (seconds, max 20) long-polls until the job finishes instead of returning at once.
+    """
+    job = await analysis_jobs.wait(job_id, min(max(wait, 0), 20))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return conditional_json_response(request, job)
+
+@router.post("/patients/{patient_id}/prefetch")
+async def prefetch_patient_history(patient_id: str):
+    """
+    Called by the UI when a patient is selected, so their Digital Twin history
+    is already cached when the analysis runs.
+    """
+    if not patient_histories.enabled:
+        return {"patientId": patient_id, "cached": False}
+    try:
+        history = await asyncio.to_thread(patient_histories.get, patient_id)
+        return {"patientId": patient_id, "cached": True, "found": history is not None}
+    except Exception as e:
+        print(f"Error in /patients/prefetch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/patients/prefetch")
+async def prefetch_patient_histories(request: PrefetchRequest):
+    """
+    Warm the history cache for several patients (e.g. a clinic list) with BatchGetItem.
+    """
+    if not patient_histories.enabled:
+        return {"cached": 0, "found": 0}
+    try:
+        histories = await asyncio.to_thread(patient_histories.get_many, request.patient_ids)
+        return {"cached": len(histories), "found": sum(1 for h in histories.values() if h is not None)}
+    except Exception as e:
+        print(f"Error in /patients/prefetch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/patients/{patient_id}/analyses")
+async def list_patient_analyses(patient_id: str, request: Request, limit: int = 20, cursor: Optional[str] = None):
+    """
+    The patient's stored analyses, newest first, as summaries (primary condition,
+    ICD-10 codes, safety counts). Pass `nextCursor` back as `cursor` for the next page.
+    """
+    try:
+        # Analyses recorded moments ago may still be in the write queue
+        await asyncio.to_thread(analysis_history.flush, 1.0)
+        page = await asyncio.to_thread(analysis_history.list, patient_id, limit, cursor)
+        return conditional_json_response(request, page)
+    except Exception as e:
+        print(f"Error in /patients/analyses: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/patients/{patient_id}/analyses/{analysis_id}")
+async def get_patient_analysis(patient_id: str, analysis_id: str, request: Request):
+    """
+    One stored analysis in full: transcript, SOAP note and agent result.
+    """
+    try:
+        analysis = await asyncio.to_thread(analysis_history.get, patient_id, analysis_id)
+    except Exception as e:
+        print(f"Error in /patients/analyses: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found.")
+    return conditional_json_response(request, analysis)
+
+@router.get("/patients/{patient_id}/search")
+async def search_patient_consults(patient_id: str, q: str, limit: int = 10, sort: str = "relevance"):
+    """
+    Full-text search over the patient's stored transcripts, SOAP notes and plans.
+    Results carry snippets with [start, end) highlight offsets; `sort=recent`
+    orders matches newest first instead of by relevance.
+    """
+    if sort not in ("relevance", "recent"):
+        raise HTTPException(status_code=400, detail="sort must be 'relevance' or 'recent'.")
+    try:
+        return await asyncio.to_thread(search_index.search, patient_id, q, limit, sort)
+    except Exception as e:
+        print(f"Error in /patients/search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _export_params(_type: Optional[str], _since: Optional[str], cursor: Optional[str]):
+    types = tuple(t.strip() for t in _type.split(",") if t.strip()) if _type else RESOURCE_TYPES
+    unsupported = [t for t in types if t not in RESOURCE_TYPES]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported _type: {', '.join(unsupported)}")
+    try:
+        since = parse_since(_since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="_since must be an ISO 8601 instant.")
+    try:
+        return types, since, decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor must come from a previous page's Link header.")
+
+async def _export_response(request: Request, patient_id: Optional[str], _type: Optional[str],
+                           _since: Optional[str], cursor: Optional[str]):
+    types, since, after = _export_params(_type, _since, cursor)
+    # Mangum (index.py) sets aws.event and buffers the body; streaming.py marks its scope as streamed
+    if "aws.event" not in request.scope or request.scope.get("aws.response_stream"):
+        return StreamingResponse(export_ndjson(since, types, patient_id, after), media_type="application/fhir+ndjson")
+    body, next_cursor = await asyncio.to_thread(export_page, since, types, patient_id, after)
+    headers = {}
+    if next_cursor:
+        # Relative to the current URL, so it keeps the API Gateway stage prefix
+        params = urlencode({**request.query_params, "cursor": next_cursor})
+        headers["Link"] = f'<?{params}>; rel="next"'
+    return Response(body, media_type="application/fhir+ndjson", headers=headers)
+
+@router.get("/fhir/$export")
+async def fhir_export(request: Request, _type: Optional[str] = None, _since: Optional[str] = None,
+                      cursor: Optional[str] = None):
+    """
+    FHIR R4 bulk export of every stored consult as NDJSON (Encounter, Condition
+    with ICD-10 codings, DocumentReference for the SOAP note, MedicationRequest
+    from the treatment plan). Streamed as it is generated rather than as
+    separate files to poll for; `_type` and `_since` filter as in the Bulk Data spec.
+    Through the buffered Lambda handler the export comes in pages of
+    FHIR_BUFFERED_EXPORT_MAX_CONSULTS consults, each with a `Link: rel="next"` to the
+    following one; use the streaming Function URL (streaming.py) for the whole export at once.
+    """
+    return await _export_response(request, None, _type, _since, cursor)
+
+@router.get("/fhir/Patient/{patient_id}/$export")
+async def fhir_patient_export(patient_id: str, request: Request, _type: Optional[str] = None,
+                              _since: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    Same as /fhir/$export, limited to one patient's consults.
+    """
+    return await _export_response(request, patient_id, _type, _since, cursor)
+
+def _control_type(text: str) -> Optional[str]:
+    """
+    "type" of a client control frame; None for anything that isn't a JSON object,
+    so a malformed frame is ignored instead of ending the session.
+    """
+    try:
+        frame = json.loads(text)
+    except ValueError:
+        return None
+    return frame.get("type") if isinstance(frame, dict) else None
+
+@router.websocket("/live/{consult_id}")
+async def live_transcription(websocket: WebSocket, consult_id: str, media_encoding: str = "ogg-opus", sample_rate: int = 48000):
+    """
+    Live transcription during the consult. The client sends MediaRecorder chunks as
+    binary frames and {"type": "stop"} when recording ends; partial/final segments
+    are pushed back as soon as the transcriber emits them, followed immediately by any
+    red-flag/medication alerts they trigger, then a "done" message carrying the full transcript.
+    """
+    if media_encoding not in MEDIA_ENCODINGS:
+        await websocket.close(code=1003)
+        return
+    await websocket.accept()
+    session = LiveTranscriptionSession(create_transcriber(media_encoding, sample_rate), consult_id)
+    try:
+        await session.transcriber.start()
+    except Exception as e:
+        print(f"Error starting live transcription: {e}")
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close(code=1011)
+        return
+    await websocket.send_json({"type": "ready", "sessionId": session.session_id})
+
+    async def pump_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    await session.send_audio(message["bytes"])
+                elif message.get("text") and _control_type(message["text"]) == "stop":
+                    return
+        finally:
+            # Lets the transcriber flush its last finals and end the update stream
+            await session.transcriber.end()
+
+    audio_task = asyncio.create_task(pump_audio())
+    try:
+        async for update in session.updates():
+            await websocket.send_json(update.to_message())
+            for alert in session.alerts.feed(update):
+                await websocket.send_json(alert)
+        await audio_task
+        await websocket.send_json(session.summary())
+        await websocket.close()
+    except WebSocketDisconnect:
+        print(f"Live transcription client disconnected (consult {consult_id})")
+    except Exception as e:
+        print(f"Error in live transcription: {e}")
+        try:
+            await websocket.send_json({"type": "error", "message": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        audio_task.cancel()
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    In-process latency/token/queue-wait metrics (count, mean, p50, p95, max per series)
+    plus the current agent queue depth.
+    """
+    return {"series": metrics.snapshot(), "agent_queue": agent_scheduler.stats()}
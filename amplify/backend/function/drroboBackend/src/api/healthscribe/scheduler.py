@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Any, TypeVar
+
+from . import metrics
+from .triage import PRIORITY_NAMES
+
+T = TypeVar("T")
+
+# Agent invocations allowed in flight per container; everything else waits in the queue.
+MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+# A waiting request is promoted one priority class for every AGING_SECONDS it waits,
+# so routine and bulk work still progress while urgent traffic keeps arriving.
+AGING_SECONDS = float(os.getenv("AGENT_QUEUE_AGING_SECONDS", "30"))
+
+
+class AgentScheduler:
+    """
+    Priority work queue in front of the Bedrock Agent.
+    Lower priority value = dispatched first (see triage.URGENT/ROUTINE/BULK).
+    """
+
+    def __init__(self, concurrency: int = MAX_CONCURRENCY, aging_seconds: float = AGING_SECONDS):
+        self.concurrency = concurrency
+        self.aging_seconds = aging_seconds
+        self._active = 0
+        # One FIFO per priority class; only the heads compete, which keeps dispatch O(classes)
+        self._waiting: Dict[int, deque] = {p: deque() for p in PRIORITY_NAMES}
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def _next_waiter(self):
+        now = time.monotonic()
+        best = None
+        best_score = None
+        for priority, queue in self._waiting.items():
+            # A waiter cancelled this tick is still queued until its except block runs
+            while queue and queue[0][1].done():
+                queue.popleft()
+            if not queue:
+                continue
+            enqueued_at, _ = queue[0]
+            score = (priority - (now - enqueued_at) / self.aging_seconds, priority)
+            if best_score is None or score < best_score:
+                best, best_score = priority, score
+        return self._waiting[best].popleft()[1] if best is not None else None
+
+    def _release(self):
+        waiter = self._next_waiter()
+        if waiter is not None:
+            # Hand the slot straight to the next waiter; _active stays the same
+            waiter.set_result(None)
+        else:
+            self._active -= 1
+
+    async def run(self, priority: int, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Wait for a slot according to `priority`, then await `work()`.
+        """
+        enqueued_at = time.monotonic()
+        if self._active < self.concurrency and self._queued() == 0:
+            self._active += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            entry = (enqueued_at, waiter)
+            self._waiting[priority].append(entry)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Slot was handed to us just as we were cancelled: pass it on
+                    self._release()
+                elif entry in self._waiting[priority]:
+                    self._waiting[priority].remove(entry)
+                raise
+
+        metrics.record("agent.queue_wait_ms", (time.monotonic() - enqueued_at) * 1000,
+                       priority=PRIORITY_NAMES[priority])
+        try:
+            return await work()
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "concurrency": self.concurrency,
+            "queued": {PRIORITY_NAMES[p]: len(q) for p, q in self._waiting.items()},
+        }
+
+
+agent_scheduler = AgentScheduler()
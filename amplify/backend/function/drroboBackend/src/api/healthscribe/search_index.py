@@ -0,0 +1,318 @@
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Union
+
+from . import metrics
+from .analysis_store import analysis_history, AnalysisRecord
+
+# Full-text search over a patient's stored consults (transcript, SOAP sections and
+# the agent's plan). One in-memory index partition per patient, built from the
+# analysis store the first time that patient is searched and caught up after that.
+
+SEARCH_MAX_PARTITIONS = int(os.getenv("SEARCH_MAX_PARTITIONS", "500"))
+# Other processes' writes are picked up at most this long after they land
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "30"))
+# Catch-up re-reads this far behind the newest indexed ID: the async writers of other
+# processes can commit an older ID after a newer one
+CATCH_UP_OVERLAP_MS = 120_000
+SNIPPET_CHARS = 160
+MAX_SNIPPETS_PER_HIT = 3
+MAX_RESULTS = 50
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SOAP_FIELDS = ("summary", "subjective", "objective", "assessment", "plan")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset("""
+a about after again all am an and any are as at be been before being but by can could did do does
+doing for from had has have he her here him his how i if in into is it its last me my no not of on
+or our she so than that the their them then there these they this those to up us was we were what
+when where which while who why will with would you your
+""".split())
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase with accents folded, so "Naïve" and "naive" index the same.
+    """
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def stem(token: str) -> str:
+    # Light plural folding only: "tablets" -> "tablet", "headaches" -> "headache"
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(t) for t in TOKEN_PATTERN.findall(normalize(text)) if t not in STOPWORDS]
+
+
+def _flatten_strings(value: Any, out: List[str]):
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _flatten_strings(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _flatten_strings(v, out)
+
+
+def searchable_fields(record: Dict[str, Any]) -> Dict[str, str]:
+    """
+    field name -> text for one stored analysis: the transcript, each SOAP
+    section, and the agent's diagnosis/plan text.
+    """
+    fields = {}
+    if record.get("transcript"):
+        fields["transcript"] = record["transcript"]
+    soap = {str(k).lower(): v for k, v in (record.get("soapNote") or {}).items()}
+    for name in SOAP_FIELDS:
+        if isinstance(soap.get(name), str) and soap[name].strip():
+            fields[name] = soap[name]
+    result = record.get("result") or {}
+    parts: List[str] = []
+    for key in ("diagnosis", "treatment_plan", "follow_ups"):
+        _flatten_strings(result.get(key), parts)
+    if parts:
+        fields["analysis"] = "\n".join(parts)
+    return fields
+
+
+class _Partition:
+    """
+    One patient's index. A posting is one packed int, doc number << 8 | term
+    frequency. Most terms occur in a single consult, so a term's postings are a
+    bare int until it has a second one, then an array("I") appended in doc order
+    (4 bytes per posting). Field texts are kept zlib-compressed for snippets.
+    """
+
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.analysis_ids: List[str] = []
+        self.consult_ids: List[Optional[str]] = []
+        self.created_at = array("d")
+        self.lengths = array("I")
+        self.texts: List[bytes] = []
+        self.postings: Dict[str, Union[int, array]] = {}
+        self.indexed = set()
+        self.total_length = 0
+        self.newest_id: Optional[str] = None
+        self.refreshed_at = 0.0
+        self.stale = True
+        self.lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        analysis_id = record["analysisId"]
+        if analysis_id in self.indexed:
+            return
+        fields = searchable_fields(record)
+        terms = Counter()
+        for text in fields.values():
+            terms.update(tokenize(text))
+        doc = len(self.analysis_ids)
+        postings = self.postings
+        for term, count in terms.items():
+            posting = doc << 8 | min(count, 255)
+            entry = postings.get(term)
+            if entry is None:
+                # Interned so every partition shares one copy of each term string
+                postings[sys.intern(term)] = posting
+            elif type(entry) is int:
+                postings[term] = array("I", (entry, posting))
+            else:
+                entry.append(posting)
+        length = sum(terms.values())
+        self.analysis_ids.append(analysis_id)
+        self.consult_ids.append(record.get("consultId"))
+        self.created_at.append(record.get("createdAt") or 0.0)
+        self.lengths.append(length)
+        self.texts.append(zlib.compress(json.dumps(fields).encode(), 1))
+        self.total_length += length
+        self.indexed.add(analysis_id)
+        if self.newest_id is None or analysis_id > self.newest_id:
+            self.newest_id = analysis_id
+
+    def _postings(self, term: str):
+        entry = self.postings.get(term)
+        if entry is None:
+            return ()
+        return (entry,) if type(entry) is int else entry
+
+    def search(self, terms: List[str], limit: int, sort: str) -> Tuple[List[Tuple[float, int]], int]:
+        """
+        BM25 over the query terms (any term matches, more and rarer terms rank
+        higher). Returns ([(score, doc)] best first, total matching docs).
+        """
+        n = len(self.analysis_ids)
+        if not n:
+            return [], 0
+        # BM25 length normalization k1 * (1 - b + b * length / average), split into constants
+        norm_base = BM25_K1 * (1 - BM25_B)
+        norm_per_token = BM25_K1 * BM25_B * n / (self.total_length or 1)
+        lengths = self.lengths
+        scores: Dict[int, float] = {}
+        for term in dict.fromkeys(terms):
+            postings = self._postings(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5)) * (BM25_K1 + 1)
+            for posting in postings:
+                doc, tf = posting >> 8, posting & 0xFF
+                scores[doc] = scores.get(doc, 0.0) + idf * tf / (tf + norm_base + norm_per_token * lengths[doc])
+        if sort == "recent":
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: self.created_at[item[0]])
+        else:
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, doc) for doc, score in ranked], len(scores)
+
+    def contains(self, term: str, doc: int) -> bool:
+        postings = self._postings(term)
+        i = bisect_left(postings, doc << 8)
+        return i < len(postings) and postings[i] >> 8 == doc
+
+    def fields(self, doc: int) -> Dict[str, str]:
+        return json.loads(zlib.decompress(self.texts[doc]))
+
+
+def snippets(fields: Dict[str, str], terms: Iterable[str], max_snippets: int = MAX_SNIPPETS_PER_HIT) -> List[Dict[str, Any]]:
+    """
+    For each field containing a query term, a window of text around the densest
+    cluster of matches, with [start, end) offsets of the matched words in the snippet.
+    """
+    wanted = set(terms)
+    found = []
+    for field, text in fields.items():
+        normalized = normalize(text)
+        # NFKD folding can change lengths; fall back to raw lowercase offsets if it did
+        if len(normalized) != len(text):
+            normalized = text.lower()
+        matches = [(m.start(), m.end()) for m in TOKEN_PATTERN.finditer(normalized) if stem(m.group()) in wanted]
+        if not matches:
+            continue
+        # Window that covers the most matches
+        best, best_count, j = 0, 0, 0
+        for i, (start, _) in enumerate(matches):
+            while matches[j][0] < start - SNIPPET_CHARS // 2:
+                j += 1
+            if i - j + 1 > best_count:
+                best, best_count = j, i - j + 1
+        anchor = matches[best][0]
+        begin = max(0, anchor - SNIPPET_CHARS // 4)
+        if begin:
+            # Start on a word boundary
+            space = text.rfind(" ", 0, begin)
+            begin = space + 1 if space >= 0 and begin - space < 20 else begin
+        end = min(len(text), begin + SNIPPET_CHARS)
+        prefix = "…" if begin else ""
+        shift = begin - len(prefix)
+        found.append((best_count, {
+            "field": field,
+            "text": prefix + text[begin:end] + ("…" if end < len(text) else ""),
+            "highlights": [[s - shift, e - shift] for s, e in matches if s >= begin and e <= end],
+        }))
+    found.sort(key=lambda item: item[0], reverse=True)
+    return [snippet for _, snippet in found[:max_snippets]]
+
+
+class SearchIndex:
+    """
+    Per-patient partitions, least recently searched evicted first. Writes made
+    by this process mark the partition stale (caught up on the next search);
+    writes from other processes are picked up every SEARCH_REFRESH_SECONDS.
+    """
+
+    def __init__(self, history=analysis_history, max_partitions: int = SEARCH_MAX_PARTITIONS):
+        self.history = history
+        self.max_partitions = max_partitions
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+        history.listeners.append(self.on_written)
+
+    def on_written(self, records: List[AnalysisRecord]):
+        for record in records:
+            partition = self._partitions.get(record.patient_id)
+            if partition is not None:
+                partition.stale = True
+
+    def _partition(self, patient_id: str) -> _Partition:
+        with self._lock:
+            partition = self._partitions.get(patient_id)
+            if partition is None:
+                partition = self._partitions[patient_id] = _Partition(patient_id)
+                while len(self._partitions) > self.max_partitions:
+                    self._partitions.popitem(last=False)
+            else:
+                self._partitions.move_to_end(patient_id)
+        return partition
+
+    def _catch_up(self, partition: _Partition):
+        """
+        Index the patient's records newer than what the partition has (all of
+        them on first use). Caller holds partition.lock.
+        """
+        started = time.perf_counter()
+        after = None
+        if partition.newest_id is not None:
+            newest_ms = int(partition.newest_id.split("-")[0])
+            after = f"{max(0, newest_ms - CATCH_UP_OVERLAP_MS):013d}"
+        before = len(partition.analysis_ids)
+        partition.stale = False
+        partition.refreshed_at = time.monotonic()
+        for record in self.history.store.iter_records(partition.patient_id, after=after):
+            partition.add(record)
+        added = len(partition.analysis_ids) - before
+        if added:
+            metrics.record("search.index_ms", (time.perf_counter() - started) * 1000)
+            metrics.record("search.indexed_docs", added)
+
+    def search(self, patient_id: str, query: str, limit: int = 10, sort: str = "relevance") -> Dict[str, Any]:
+        started = time.perf_counter()
+        terms = tokenize(query)
+        limit = max(1, min(limit, MAX_RESULTS))
+        # Analyses recorded moments ago by this process may still be queued
+        self.history.flush(1.0)
+        partition = self._partition(patient_id)
+        with partition.lock:
+            if partition.stale or time.monotonic() - partition.refreshed_at >= SEARCH_REFRESH_SECONDS:
+                self._catch_up(partition)
+            ranked, total = partition.search(terms, limit, sort) if terms else ([], 0)
+            hits = [
+                {
+                    "analysisId": partition.analysis_ids[doc],
+                    "consultId": partition.consult_ids[doc],
+                    "createdAt": partition.created_at[doc],
+                    "score": round(score, 3),
+                    "matchedTerms": [t for t in dict.fromkeys(terms) if partition.contains(t, doc)],
+                    "snippets": snippets(partition.fields(doc), terms),
+                }
+                for score, doc in ranked
+            ]
+        took = (time.perf_counter() - started) * 1000
+        metrics.record("search.query_ms", took)
+        return {"patientId": patient_id, "query": query, "terms": terms, "total": total,
+                "results": hits, "tookMs": round(took, 2)}
+
+
+search_index = SearchIndex()
@@ -1,3 +1,4 @@
+import asyncio
 import boto3
 import json
 import uuid
@@ -9,10 +10,76 @@ from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 from typing import Optional, Union
 from botocore.config import Config
-from typing import Optional, Dict, Any
+from urllib.parse import urlparse, unquote
+from typing import Optional, Dict, Any, Callable
+from . import metrics
+from .sessions import consult_sessions, SESSION_TTL_SECONDS
+from .scheduler import agent_scheduler
+from .triage import triage_priority, BULK
+from .patient_history import patient_histories
+from .cache import LRUTTLCache, MISSING
+from .transcript_segments import SegmentStore
+from .audio_spool import AudioSpool
+from .analysis_store import analysis_history
+from .medications import parse_treatment_plan
+from .contraindications import apply_safety_checks, cached_profile
+from .speculative import speculative_analyses
+from .agent_routing import AgentRouter, AgentTarget, secondary_target
 
 load_dotenv()
 
+# Rough chars-per-token ratio used to estimate agent token usage
+CHARS_PER_TOKEN = 4
+
+# Completed HealthScribe results, keyed by job name (output is immutable once COMPLETED)
+completed_jobs = LRUTTLCache(max_size=200, ttl_seconds=6 * 3600)
+# Columnar segment/word timings for the same jobs, served by /transcript/{job}/segments
+transcript_segments = LRUTTLCache(max_size=50, ttl_seconds=6 * 3600)
+
+# HealthScribe summary sections -> SOAP fields expected by normalize_healthscribe_output
+SOAP_SECTIONS = {
+    "Summary": ["CHIEF_COMPLAINT"],
+    "Subjective": [
+        "HISTORY_OF_PRESENT_ILLNESS", "REVIEW_OF_SYSTEMS", "PAST_MEDICAL_HISTORY",
+        "PAST_FAMILY_HISTORY", "PAST_SOCIAL_HISTORY",
+    ],
+    "Objective": ["PHYSICAL_EXAMINATION", "DIAGNOSTIC_TESTING"],
+    "Assessment": ["ASSESSMENT"],
+    "Plan": ["PLAN"],
+}
+
+
+def s3_location(uri: str):
+    """
+    (bucket, key) from an s3:// URI or a path-/virtual-hosted-style S3 HTTPS URL.
+    """
+    parsed = urlparse(uri)
+    path = unquote(parsed.path.lstrip("/"))
+    if parsed.scheme == "s3":
+        return parsed.netloc, path
+    if parsed.netloc.startswith("s3.") or parsed.netloc.startswith("s3-"):
+        bucket, _, key = path.partition("/")
+        return bucket, key
+    return parsed.netloc.split(".s3.")[0], path
+
+
+def scribe_output_to_raw(summary: Dict[str, Any], segments: SegmentStore) -> Dict[str, Any]:
+    """
+    Flatten HealthScribe summary.json and the columnar transcript into the
+    {"ClinicalNotes": ..., "Transcript": ...} shape used by normalize_healthscribe_output.
+    """
+    sections = {}
+    for section in summary.get("ClinicalDocumentation", {}).get("Sections", []):
+        lines = [s.get("SummarizedSegment", "").strip() for s in section.get("Summary", [])]
+        sections[section.get("SectionName")] = "\n".join(line for line in lines if line)
+
+    clinical_notes = {
+        field: "\n".join(sections[name] for name in names if sections.get(name))
+        for field, names in SOAP_SECTIONS.items()
+    }
+    return {"ClinicalNotes": clinical_notes, "Transcript": {"TranscriptText": segments.transcript_text()}}
+
+
 class HealthScribeService:
     def __init__(self):
         self.region = os.environ.get("VITE_AWS_REGION", "us-east-1")
@@ -22,7 +89,8 @@ class HealthScribeService:
         timeout_config = Config(
             read_timeout=170, 
             connect_timeout=170,
-            retries={'max_attempts': 2}
+            # Adaptive mode also rate-limits client-side when Bedrock starts throttling
+            retries={'max_attempts': 2, 'mode': 'adaptive'}
         )
 
         self.bedrock_agent = boto3.client(
@@ -33,19 +101,23 @@ class HealthScribeService:
         
         self.agent_id = os.getenv("VITE_BEDROCK_AGENT_ID")
         self.agent_alias_id = os.getenv("VITE_BEDROCK_AGENT_ALIAS_ID")
+        # Optional second region/alias that slow first chunks are hedged to
+        self.agent_router = AgentRouter(
+            secondary_target(self.region, self.agent_id, self.agent_alias_id, config=timeout_config)
+        )
+
+        self.s3 = boto3.client("s3", region_name=self.region)
+        self.transcribe = boto3.client("transcribe", region_name=self.region)
+        self.bucket = os.getenv("VITE_S3_BUCKET_NAME")
 
     async def process_audio(self, audio_file):
+            timestamp = int(time.time())
+            s3_key = f"healthscribe/input/{timestamp}.webm"
             try:
-                audio_bytes = await audio_file.read()
-                timestamp = int(time.time())
-                s3_key = f"healthscribe/input/{timestamp}.webm"
-
-                self.s3.put_object(
-                    Bucket=self.bucket,
-                    Key=s3_key,
-                    Body=audio_bytes,
-                    ContentType="audio/webm"
-                )
+                # Spooled in chunks (spilling to /tmp for long consults) rather than one bytes blob
+                with AudioSpool() as spool:
+                    await spool.write_upload(audio_file)
+                    await asyncio.to_thread(spool.upload_to_s3, self.s3, self.bucket, s3_key, "audio/webm")
 
                 job_name = f"healthscribe-{timestamp}"
 
@@ -72,6 +144,73 @@ class HealthScribeService:
                 return {"status": "error", "message": str(e), "s3_path": s3_key}
 
 
+    def _read_s3_json(self, uri: str) -> Dict[str, Any]:
+        bucket, key = s3_location(uri)
+        body = self.s3.get_object(Bucket=bucket, Key=key)["Body"]
+        return json.loads(body.read())
+
+    def _read_s3_segments(self, uri: str) -> SegmentStore:
+        """
+        transcript.json can be many MB for long consults, so it is parsed as a
+        stream straight into the columnar store instead of json.load-ing it.
+        """
+        bucket, key = s3_location(uri)
+        body = self.s3.get_object(Bucket=bucket, Key=key)["Body"]
+        try:
+            with metrics.timer("healthscribe.transcript_parse_ms"):
+                return SegmentStore.from_healthscribe_stream(body)
+        finally:
+            body.close()
+
+    async def get_job_result(self, job_name: str) -> Dict[str, Any]:
+        """
+        Poll a HealthScribe job. Completed output never changes, so the normalized
+        SOAP note is cached and later polls don't touch Transcribe or S3 at all.
+        """
+        cached = completed_jobs.get(job_name)
+        if cached is not MISSING:
+            return cached
+
+        response = await asyncio.to_thread(
+            self.transcribe.get_medical_scribe_job, MedicalScribeJobName=job_name
+        )
+        job = response["MedicalScribeJob"]
+        status = job["MedicalScribeJobStatus"]
+
+        if status == "FAILED":
+            return {"status": "failed", "jobName": job_name, "message": job.get("FailureReason", "")}
+        if status != "COMPLETED":
+            return {"status": "in_progress", "jobName": job_name}
+
+        output = job["MedicalScribeOutput"]
+        summary, segments = await asyncio.gather(
+            asyncio.to_thread(self._read_s3_json, output["ClinicalDocumentUri"]),
+            asyncio.to_thread(self._read_s3_segments, output["TranscriptFileUri"]),
+        )
+        result = {
+            "status": "completed",
+            "jobName": job_name,
+            "clinicalNotes": self.normalize_healthscribe_output(scribe_output_to_raw(summary, segments)),
+            "segmentCount": len(segments),
+            "talkTime": segments.talk_time_by_speaker(),
+        }
+        transcript_segments.put(job_name, segments)
+        completed_jobs.put(job_name, result)
+        return result
+
+    async def get_job_segments(self, job_name: str) -> Optional[SegmentStore]:
+        """
+        Columnar transcript of a completed job (None while it is still running).
+        """
+        segments = transcript_segments.get(job_name)
+        if segments is MISSING:
+            completed_jobs.invalidate(job_name)
+            result = await self.get_job_result(job_name)
+            if result["status"] != "completed":
+                return None
+            segments = transcript_segments.get(job_name)
+        return segments
+
     def extract_json_from_text(self, text: str) -> Optional[Dict[str, Any]]:
         """
         Extracts JSON from the Agent response even if it contains conversational noise.
@@ -92,45 +231,175 @@ class HealthScribeService:
             print(f"JSON Parsing failed: {str(e)}")
             return None
 
-    async def call_bedrock_agent(self, transcript: str, patient: dict | None = None):
-        session_id = str(uuid.uuid4())
-        p_id = patient.get("PatientID", "PATIENT001") if patient else "PATIENT001"
-        
+    def _invoke_agent(self, session_id: str, prompt: str, session_state: Optional[Dict[str, Any]] = None,
+                      on_chunk: Optional[Callable[[str], None]] = None, hedge: bool = True) -> str:
+        params = dict(
+            sessionId=session_id,
+            inputText=prompt
+        )
+        if session_state:
+            params["sessionState"] = session_state
+        # Read at call time: local_runtime.py swaps in a fake client
+        primary = AgentTarget(self.region, self.agent_id, self.agent_alias_id, client=self.bedrock_agent)
+        return self.agent_router.invoke(primary, params, on_chunk, hedge=hedge)
+
+    def _parse_agent_completion(self, completion: str) -> Dict[str, Any]:
+        parsed_data = self.extract_json_from_text(completion)
+        if not parsed_data:
+            raise ValueError("Incomplete or missing JSON in Agent response")
+
+        # Ensure all required keys exist for the React frontend
+        required_keys = ["diagnosis", "icd_codes", "safety", "treatment_plan"]
+        for key in required_keys:
+            if key not in parsed_data:
+                parsed_data[key] = {} if key != "icd_codes" else []
+
+        # Structured dose/route/frequency for each drug in the plan, so clients don't regex the text
+        with metrics.timer("medications.parse_ms"):
+            parsed_data["medications"] = parse_treatment_plan(parsed_data["treatment_plan"])
+        return parsed_data
+
+    def _patient_history(self, p_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return patient_histories.get(p_id)
+        except Exception as e:
+            print(f"Patient history lookup failed: {str(e)}")
+            return None
+
+    def _history_session_state(self, history: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Hand the (cached) Digital Twin history to the agent up front, so its
+        reasoning doesn't have to wait on a DynamoDB lookup of its own.
+        """
+        if not history:
+            return None
+        encoded = json.dumps(history, separators=(",", ":"))
+        return {
+            "sessionAttributes": {"patient_history": encoded},
+            "promptSessionAttributes": {"patient_history": encoded},
+        }
+
+    def _run_analysis(self, mode: str, session_id: str, prompt: str, p_id: str,
+                      on_chunk: Optional[Callable[[str], None]] = None,
+                      patient: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        One agent round-trip, recording latency and (estimated) token usage per mode
+        so delta and full re-analysis can be compared.
+        """
+        history = self._patient_history(p_id)
+        session_state = self._history_session_state(history)
+        with metrics.timer("agent.latency_ms", mode=mode):
+            completion = self._invoke_agent(session_id, prompt, session_state, on_chunk, hedge=mode == "full")
+        metrics.record("agent.input_tokens_est", len(prompt) / CHARS_PER_TOKEN, mode=mode)
+        metrics.record("agent.output_tokens_est", len(completion) / CHARS_PER_TOKEN, mode=mode)
+        result = self._parse_agent_completion(completion)
+        # 🛡️ Allergies / failed meds / interactions from the Digital Twin, whether or not the agent looked
+        apply_safety_checks(result, cached_profile(p_id, history, patient))
+        return result
+
+    def _full_prompt(self, p_id: str, transcript: str) -> str:
         # Clear prompt to guide the Agent
-        prompt = (
+        return (
             f"PatientID: {p_id}\n"
             f"Transcript: {transcript}\n\n"
             "Analyze and return a clinical plan in strict JSON format."
         )
 
-        try:
-            response = self.bedrock_agent.invoke_agent(
-                agentId=self.agent_id,
-                agentAliasId=self.agent_alias_id,
-                sessionId=session_id,
-                inputText=prompt
+    async def _adopt_speculation(self, claimed, transcript: str, patient: Optional[Dict[str, Any]], p_id: str,
+                                 consult_id: Optional[str], soap_note: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Take over a speculative result as this consult's analysis: the safety check is
+        redone with the request's patient details, and the consult continues in the
+        speculative run's agent session so the next re-analysis is a delta. A session
+        idle for longer than Bedrock keeps it isn't adopted: a delta sent into it would
+        arrive without the transcript it updates.
+        """
+        spec_id, result, completed_at = claimed
+        history = await asyncio.to_thread(self._patient_history, p_id)
+        apply_safety_checks(result, cached_profile(p_id, history, patient))
+        if consult_id and time.time() - completed_at < SESSION_TTL_SECONDS:
+            # Aged from when the speculative run last used it, not from now
+            session = consult_sessions.start(consult_id, session_id=spec_id)
+            consult_sessions.mark_analyzed(session, transcript, result, used_at=completed_at)
+        analysis_history.record(p_id, consult_id, "speculative", transcript, result, soap_note)
+        return result
+
+    async def call_bedrock_agent(
+        self,
+        transcript: str,
+        patient: dict | None = None,
+        consult_id: str | None = None,
+        urgent: bool = False,
+        priority: int | None = None,
+        raise_errors: bool = False,
+        on_chunk: Callable[[str], None] | None = None,
+        soap_note: dict | None = None,
+        speculative: bool = False
+    ):
+        p_id = patient.get("PatientID", "PATIENT001") if patient else "PATIENT001"
+        if priority is None:
+            priority = BULK if speculative else triage_priority(transcript, urgent=urgent)
+
+        if speculative:
+            # Nobody is waiting on it: no consult session, nothing stored until it is claimed
+            prompt = self._full_prompt(p_id, transcript)
+            return await agent_scheduler.run(
+                priority,
+                lambda: asyncio.to_thread(self._run_analysis, "speculative", consult_id, prompt, p_id, None, patient)
             )
 
-            completion = ""
-            for event in response.get("completion", []):
-                if "chunk" in event:
-                    completion += event["chunk"]["bytes"].decode("utf-8")
-
-            print(f"DEBUG - AGENT RESPONSE: {completion}")
-
-            parsed_data = self.extract_json_from_text(completion)
-            if parsed_data:
-                # Ensure all required keys exist for the React frontend
-                required_keys = ["diagnosis", "icd_codes", "safety", "treatment_plan"]
-                for key in required_keys:
-                    if key not in parsed_data:
-                        parsed_data[key] = {} if key != "icd_codes" else []
-                return parsed_data
-            
-            raise ValueError("Incomplete or missing JSON in Agent response")
+        try:
+            # ⚡ First analysis of a transcript that was already analyzed speculatively
+            if not (consult_id and consult_sessions.get(consult_id)):
+                claimed = await speculative_analyses.claim(transcript, p_id)
+                if claimed is not None:
+                    return await self._adopt_speculation(claimed, transcript, patient, p_id, consult_id, soap_note)
+
+            # 🔁 Consult already analyzed: send only what was said since then
+            session, delta = consult_sessions.resume(consult_id, transcript) if consult_id else (None, None)
+            if session is not None:
+                if not delta.strip() and session.last_result is not None:
+                    return session.last_result
+
+                prompt = (
+                    f"PatientID: {p_id}\n"
+                    f"Transcript update (new since your last analysis): {delta}\n\n"
+                    "Update the clinical plan with this new information and return the "
+                    "complete updated plan in strict JSON format."
+                )
+                try:
+                    result = await agent_scheduler.run(
+                        priority,
+                        lambda: asyncio.to_thread(self._run_analysis, "delta", session.session_id, prompt, p_id, on_chunk, patient)
+                    )
+                    consult_sessions.mark_analyzed(session, transcript, result)
+                    analysis_history.record(p_id, consult_id, "delta", transcript, result, soap_note)
+                    return result
+                except Exception as e:
+                    # Session expired on the Bedrock side or the update was unusable
+                    print(f"Delta analysis failed, falling back to full analysis: {str(e)}")
+
+            session = consult_sessions.start(consult_id) if consult_id else None
+            session_id = session.session_id if session else str(uuid.uuid4())
+
+            prompt = self._full_prompt(p_id, transcript)
+            result = await agent_scheduler.run(
+                priority,
+                lambda: asyncio.to_thread(self._run_analysis, "full", session_id, prompt, p_id, on_chunk, patient)
+            )
+            if session:
+                consult_sessions.mark_analyzed(session, transcript, result)
+            # Queued for the background writer; placeholder fallbacks below are never stored
+            analysis_history.record(p_id, consult_id, "full", transcript, result, soap_note)
+            return result
 
         except Exception as e:
             print(f"Agent Logic Failed: {str(e)}")
+            if consult_id:
+                consult_sessions.discard(consult_id)
+            if raise_errors:
+                # Queue workers retry instead of storing the placeholder plan
+                raise
             # Fallback to ensure UI stays functional
             return {
                 "diagnosis": {
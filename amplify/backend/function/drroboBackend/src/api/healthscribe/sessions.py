@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Tuple
+
+# Bedrock keeps an agent session alive for idleSessionTTLInSeconds (600s by default).
+# We expire our side a little earlier so a delta is never sent into a dead session.
+SESSION_TTL_SECONDS = int(os.getenv("AGENT_SESSION_TTL_SECONDS", "540"))
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "500"))
+
+
+def transcript_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ConsultSession:
+    """
+    One consult mapped to one Bedrock Agent session.
+    `analyzed_chars` is the length of the transcript prefix the agent has already seen.
+    """
+    consult_id: str
+    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    analyzed_chars: int = 0
+    prefix_digest: str = ""
+    last_result: Optional[Dict[str, Any]] = None
+    last_used: float = field(default_factory=time.time)
+
+
+class ConsultSessionStore:
+    """
+    In-memory consult -> agent session map (LRU bounded, idle TTL).
+    Lives at module level so it survives across requests in a warm container.
+    """
+
+    def __init__(self, ttl_seconds: int = SESSION_TTL_SECONDS, max_sessions: int = MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ConsultSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, consult_id: str) -> Optional[ConsultSession]:
+        with self._lock:
+            session = self._sessions.get(consult_id)
+            if session is None:
+                return None
+            if time.time() - session.last_used > self.ttl_seconds:
+                del self._sessions[consult_id]
+                return None
+            self._sessions.move_to_end(consult_id)
+            return session
+
+    def start(self, consult_id: str, session_id: Optional[str] = None) -> ConsultSession:
+        """
+        Begin a fresh agent session for the consult (replaces any previous one).
+        `session_id` adopts an agent session that was started elsewhere.
+        """
+        session = ConsultSession(consult_id=consult_id)
+        if session_id:
+            session.session_id = session_id
+        with self._lock:
+            self._sessions[consult_id] = session
+            self._sessions.move_to_end(consult_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def resume(self, consult_id: str, transcript: str) -> Tuple[Optional[ConsultSession], Optional[str]]:
+        """
+        Returns (session, delta) when the live session has already analyzed a prefix
+        of `transcript`, otherwise (None, None) and the caller runs a full analysis.
+        An empty delta means nothing new was said since the last analysis.
+        """
+        session = self.get(consult_id)
+        if session is None or session.analyzed_chars == 0:
+            return None, None
+        if len(transcript) < session.analyzed_chars:
+            return None, None
+        if transcript_digest(transcript[:session.analyzed_chars]) != session.prefix_digest:
+            # Transcript was edited, not just extended
+            return None, None
+        return session, transcript[session.analyzed_chars:]
+
+    def mark_analyzed(self, session: ConsultSession, transcript: str, result: Dict[str, Any],
+                      used_at: Optional[float] = None):
+        """
+        `used_at` is when the agent session last ran, if that wasn't just now.
+        """
+        with self._lock:
+            session.analyzed_chars = len(transcript)
+            session.prefix_digest = transcript_digest(transcript)
+            session.last_result = result
+            session.last_used = used_at if used_at is not None else time.time()
+
+    def discard(self, consult_id: str):
+        with self._lock:
+            self._sessions.pop(consult_id, None)
+
+
+consult_sessions = ConsultSessionStore()
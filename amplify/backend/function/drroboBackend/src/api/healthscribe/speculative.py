@@ -0,0 +1,184 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from . import metrics
+from .analysis_jobs import analysis_jobs, JobExists
+from .cache import LRUTTLCache, MISSING
+from .scheduler import agent_scheduler
+
+# Speculative pre-analysis: when a HealthScribe job is first seen COMPLETED, its
+# transcript is queued as a low-priority analysis job before anyone clicks Analyze.
+# The job ID is derived from (patient, transcript), so the analyze request that
+# follows finds it with one lookup from any container, and a second status poll
+# (here or elsewhere) can't queue it twice.
+
+SPECULATIVE_ANALYSIS = os.getenv("SPECULATIVE_ANALYSIS", "1") == "1"
+# Bedrock quota guard: speculative runs allowed per container per hour (token bucket)
+SPECULATIVE_MAX_PER_HOUR = int(os.getenv("SPECULATIVE_MAX_PER_HOUR", "30"))
+# Transcripts shorter than this aren't worth a speculative run
+SPECULATIVE_MIN_CHARS = int(os.getenv("SPECULATIVE_MIN_CHARS", "200"))
+# Results older than this are re-run (the Digital Twin may have changed)
+SPECULATIVE_MAX_AGE_SECONDS = int(os.getenv("SPECULATIVE_MAX_AGE_SECONDS", "3600"))
+# How long an analyze request waits for a speculative run that is already in flight
+SPECULATIVE_JOIN_SECONDS = float(os.getenv("SPECULATIVE_JOIN_SECONDS", "90"))
+
+DEFAULT_PATIENT_ID = "PATIENT001"
+
+
+def patient_key(patient: Optional[Dict[str, Any]]) -> str:
+    # Same default as call_bedrock_agent
+    return patient.get("PatientID", DEFAULT_PATIENT_ID) if patient else DEFAULT_PATIENT_ID
+
+
+def speculation_id(patient_id: str, transcript: str) -> str:
+    """
+    Job ID for a (patient, transcript) pair. Whitespace is normalized, so the
+    transcript pasted back by the client still matches. Also used as the Bedrock
+    session ID of the speculative run.
+    """
+    normalized = " ".join(transcript.split())
+    digest = hashlib.blake2b(f"{patient_id}\x1f{normalized}".encode("utf-8"), digest_size=16).hexdigest()
+    return f"spec-{digest}"
+
+
+class SpeculationBudget:
+    """
+    Token bucket: `per_hour` runs, refilled continuously, bursting to the full hour's allowance.
+    """
+
+    def __init__(self, per_hour: int = SPECULATIVE_MAX_PER_HOUR):
+        self.capacity = float(per_hour)
+        self.rate = per_hour / 3600.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class SpeculativeAnalyses:
+    """
+    Starts speculative runs from the status path and hands their results to the
+    analyze request that asks for the same transcript.
+    """
+
+    def __init__(self, jobs=analysis_jobs, budget: Optional[SpeculationBudget] = None,
+                 enabled: bool = SPECULATIVE_ANALYSIS):
+        self.jobs = jobs
+        self.budget = budget or SpeculationBudget()
+        self.enabled = enabled
+        # HealthScribe job name -> speculation ID, so repeated polls don't touch the job store
+        self._started = LRUTTLCache(max_size=500, ttl_seconds=6 * 3600)
+        # Patient -> their latest speculation ID, to cancel it if a different transcript is analyzed
+        self._latest = LRUTTLCache(max_size=500, ttl_seconds=6 * 3600)
+
+    def _skip(self, reason: str):
+        metrics.record("speculation.skipped", 1, reason=reason)
+        return None
+
+    async def start(self, job_name: str, scribe_result: Dict[str, Any], patient_id: Optional[str] = None,
+                    service_factory=None) -> Optional[str]:
+        """
+        Queue a speculative analysis of a completed HealthScribe job. Returns the
+        speculation ID, or None when it was skipped. Never raises: a failure here
+        must not fail the status poll.
+        """
+        if not self.enabled:
+            return None
+        started = self._started.get(job_name)
+        if started is not MISSING:
+            return started
+
+        notes = scribe_result.get("clinicalNotes") or {}
+        transcript = notes.get("fullTranscript") or ""
+        if len(transcript.strip()) < SPECULATIVE_MIN_CHARS:
+            self._started.put(job_name, None)
+            return self._skip("short")
+        # Clinicians are already waiting on the agent: don't add to the queue
+        if any(agent_scheduler.stats()["queued"].values()):
+            return self._skip("busy")
+        if not self.budget.take():
+            return self._skip("budget")
+
+        patient_id = patient_id or DEFAULT_PATIENT_ID
+        spec_id = speculation_id(patient_id, transcript)
+        request = {
+            "transcript": transcript,
+            "patient": {"PatientID": patient_id},
+            # The speculative run uses its own ID as the agent session
+            "consult_id": spec_id,
+            "soap_note": notes,
+            "speculative": True,
+        }
+        try:
+            await self.jobs.submit(request, service_factory, job_id=spec_id)
+            metrics.record("speculation.started", 1)
+        except JobExists:
+            # Already queued by another poll or container
+            self.budget.refund()
+        except Exception as e:
+            self.budget.refund()
+            print(f"⚠️ Speculative analysis for {job_name} not started: {str(e)}")
+            return None
+        self._started.put(job_name, spec_id)
+        self._latest.put(patient_id, spec_id)
+        return spec_id
+
+    async def claim(self, transcript: str, patient_id: str) -> Optional[Tuple[str, Dict[str, Any], float]]:
+        """
+        (speculation ID, result, completion time) when a speculative run of this exact
+        transcript has finished, or finishes within SPECULATIVE_JOIN_SECONDS. None means run the
+        analysis normally; a speculative run that hasn't started yet is cancelled,
+        since the clinician's own request is dispatched ahead of it anyway.
+        """
+        if not self.enabled:
+            return None
+        spec_id = speculation_id(patient_id, transcript)
+        stale = self._latest.get(patient_id)
+        if stale is not MISSING and stale != spec_id:
+            # The transcript was edited after scribing: that run can't be used
+            self._latest.invalidate(patient_id)
+            try:
+                if await self.jobs.cancel(stale):
+                    metrics.record("speculation.cancelled", 1, reason="stale")
+            except Exception as e:
+                print(f"⚠️ Could not cancel speculative analysis {stale}: {str(e)}")
+
+        try:
+            job = await self.jobs.get(spec_id)
+            if job is not None and job["status"] == "queued" and await self.jobs.cancel(spec_id):
+                metrics.record("speculation.cancelled", 1, reason="superseded")
+                return None
+            if job is not None and job["status"] == "running":
+                with metrics.timer("speculation.join_ms"):
+                    job = await self.jobs.wait(spec_id, SPECULATIVE_JOIN_SECONDS, interval=0.2)
+        except Exception as e:
+            print(f"⚠️ Speculative analysis lookup failed: {str(e)}")
+            return None
+
+        if job is None or job["status"] != "completed" or job["result"] is None:
+            metrics.record("speculation.miss", 1, state=job["status"] if job else "none")
+            return None
+        if time.time() - job["updatedAt"] > SPECULATIVE_MAX_AGE_SECONDS:
+            metrics.record("speculation.miss", 1, state="expired")
+            return None
+        metrics.record("speculation.hit", 1)
+        return spec_id, job["result"], job["updatedAt"]
+
+
+speculative_analyses = SpeculativeAnalyses()
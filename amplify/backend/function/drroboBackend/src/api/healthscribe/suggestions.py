@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional, Dict, Any, List
+
+from .cache import LRUTTLCache, MISSING
+from .medications import is_medication_line
+
+# Server-side version of the frontend's mapAgentResultToSuggestions. Each card's ID
+# is derived from what the card is about (its slot, or the ICD-10 code), not from
+# its text, so a re-analysis that rewords a card reports it as changed under the
+# same ID and the clinician's approve/reject state for it can be kept.
+
+SUGGESTION_VERSIONS_SIZE = int(os.getenv("SUGGESTION_VERSIONS_SIZE", "2000"))
+SUGGESTION_VERSIONS_TTL_SECONDS = int(os.getenv("SUGGESTION_VERSIONS_TTL_SECONDS", str(12 * 3600)))
+
+
+def suggestion_id(kind: str, key: str) -> str:
+    return hashlib.blake2b(f"{kind}\x1f{key}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _card(kind: str, key: str, title: str, content: str, confidence: float) -> Dict[str, Any]:
+    return {
+        "id": suggestion_id(kind, key),
+        "type": kind,
+        "title": title,
+        "content": content,
+        "confidence": round(confidence),
+        "status": "pending",
+    }
+
+
+def _strings(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    return [v for v in value or [] if isinstance(v, str)]
+
+
+def materialize(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Suggestion cards for one agent result, in display order.
+    """
+    cards = []
+    diagnosis = result.get("diagnosis") if isinstance(result.get("diagnosis"), dict) else {}
+    safety = result.get("safety") if isinstance(result.get("safety"), dict) else {}
+    plan = result.get("treatment_plan") if isinstance(result.get("treatment_plan"), dict) else {}
+
+    primary = diagnosis.get("primary")
+    if isinstance(primary, dict):
+        cards.append(_card("diagnosis", "primary", "Primary Diagnosis",
+                           f"{primary.get('condition')}\nRationale: {primary.get('rationale')}",
+                           (primary.get("confidence") or 0) * 100))
+
+    red_flags = _strings(safety.get("red_flags")) or _strings(result.get("warnings"))
+    if red_flags:
+        cards.append(_card("warning", "red_flags", "CRITICAL: Red Flags",
+                           "\n".join(f"⚠️ {w}" for w in red_flags), 100))
+
+    symptoms = diagnosis.get("symptoms")
+    if isinstance(symptoms, dict):
+        cards.append(_card("diagnosis", "symptoms", "Symptoms Detected",
+                           f"Primary: {', '.join(_strings(symptoms.get('primary'))) or 'None'}\n"
+                           f"Secondary: {', '.join(_strings(symptoms.get('secondary'))) or 'None'}", 85))
+
+    for icd in result.get("icd_codes") or []:
+        if isinstance(icd, dict) and icd.get("code"):
+            cards.append(_card("icd", icd["code"].upper(), "ICD-10 Classification",
+                               f"{icd['code']} — {icd.get('description', '')}", (icd.get("confidence") or 0) * 100))
+
+    contraindications = _strings(safety.get("contraindications_found"))
+    if contraindications:
+        cards.append(_card("warning", "contraindications", "Personalization Alert (Digital Twin)",
+                           "\n".join(f"❌ Avoid: {c}" for c in contraindications), 100))
+
+    # The frontend's keyword regex matched "iv" inside "positive"; the formulary parser doesn't
+    medication_lines = [line for line in _strings(plan.get("ongoing")) + _strings(plan.get("immediate"))
+                        if is_medication_line(line)]
+    if medication_lines:
+        cards.append(_card("prescription", "prescriptions", "Prescription Suggestions",
+                           "\n".join(f"• {m}" for m in dict.fromkeys(medication_lines)), 95))
+
+    lifestyle = _strings(plan.get("lifestyle"))
+    if lifestyle:
+        cards.append(_card("treatment", "lifestyle", "Lifestyle Advice", "\n".join(f"• {item}" for item in lifestyle), 80))
+
+    follow_ups = [f for f in result.get("follow_ups") or [] if isinstance(f, dict)]
+    if follow_ups:
+        cards.append(_card("followup", "follow_ups", "Follow-Up Plan",
+                           "\n".join(f"• {f.get('action')} ({f.get('timeframe')})" for f in follow_ups), 90))
+
+    # Two ICD entries with the same code would collide; keep the first
+    unique = {}
+    for card in cards:
+        unique.setdefault(card["id"], card)
+    return list(unique.values())
+
+
+def diff(previous: Dict[str, Dict[str, Any]], current: List[Dict[str, Any]]) -> Dict[str, Any]:
+    added, changed = [], []
+    for card in current:
+        before = previous.get(card["id"])
+        if before is None:
+            added.append(card)
+        elif before != card:
+            changed.append(card)
+    current_ids = {card["id"] for card in current}
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": [card_id for card_id in previous if card_id not in current_ids],
+        "order": [card["id"] for card in current],
+    }
+
+
+def suggestions_version(cards: List[Dict[str, Any]]) -> str:
+    """
+    Content hash of the cards in display order. Equal versions mean equal card
+    sets, whichever container computed them.
+    """
+    body = json.dumps(cards, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+class SuggestionVersions:
+    """
+    Latest materialized suggestions per consult, versioned by content hash. A
+    client whose version matches the one cached here gets only what changed since;
+    any other client (unknown consult, evicted, a stale base, or a base this
+    container never saw) gets the full set.
+    """
+
+    def __init__(self, max_size: int = SUGGESTION_VERSIONS_SIZE, ttl_seconds: int = SUGGESTION_VERSIONS_TTL_SECONDS):
+        self._versions = LRUTTLCache(max_size, ttl_seconds)
+        self._lock = threading.Lock()
+
+    def update(self, consult_id: str, result: Dict[str, Any], base_version: Optional[str] = None) -> Dict[str, Any]:
+        cards = materialize(result)
+        by_id = {card["id"]: card for card in cards}
+        version = suggestions_version(cards)
+        with self._lock:
+            entry = self._versions.get(consult_id)
+            previous_version, previous = entry if entry is not MISSING else (None, {})
+            self._versions.put(consult_id, (version, by_id))
+        response = {"consultId": consult_id, "version": version}
+        if base_version is not None and base_version == previous_version:
+            return {**response, "baseVersion": base_version, "full": False, **diff(previous, cards)}
+        return {**response, "baseVersion": None, "full": True, "suggestions": cards}
+
+    def current(self, consult_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._versions.get(consult_id)
+        if entry is MISSING:
+            return None
+        version, cards = entry
+        return {"consultId": consult_id, "version": version, "full": True, "suggestions": list(cards.values())}
+
+
+suggestion_versions = SuggestionVersions()
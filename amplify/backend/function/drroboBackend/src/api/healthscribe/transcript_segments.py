@@ -0,0 +1,275 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional
+
+from .json_stream import iter_prefixed_items
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python loops over the same arrays
+    np = None
+
+SEGMENT_SEPARATOR = "\n"
+
+SEGMENTS_PREFIX = "Conversation.TranscriptSegments.item"
+ITEMS_PREFIX = "Conversation.TranscriptItems.item"
+
+# HealthScribe TranscriptItems "Type" values
+WORD_TYPES = ("PRONUNCIATION", "PUNCTUATION")
+
+
+class SegmentStore:
+    """
+    Columnar HealthScribe transcript.
+
+    Instead of one dict per segment/word, every field is a parallel typed array:
+    times as float64, speakers as small integer IDs into an interned label list,
+    and text as (start, end) offsets into a single string buffer. A one-hour
+    consult is a handful of flat buffers rather than tens of thousands of dicts.
+    Segments are assumed to be in time order, as HealthScribe emits them.
+    """
+
+    def __init__(self):
+        self.speakers: List[str] = []
+        self._speaker_ids: Dict[str, int] = {}
+
+        self.begin = array("d")
+        self.end = array("d")
+        self.speaker = array("H")
+        self.text_start = array("I")
+        self.text_end = array("I")
+        self._parts: List[str] = []
+        self._length = 0
+        self._text: Optional[str] = None
+
+        self.word_begin = array("d")
+        self.word_end = array("d")
+        self.word_confidence = array("f")
+        self.word_type = array("B")
+        self.word_start = array("I")
+        self.word_stop = array("I")
+        self._word_parts: List[str] = []
+        self._word_length = 0
+        self._word_text: Optional[str] = None
+
+    # ---------- building ----------
+
+    def _speaker_id(self, label: str) -> int:
+        speaker_id = self._speaker_ids.get(label)
+        if speaker_id is None:
+            speaker_id = self._speaker_ids[label] = len(self.speakers)
+            self.speakers.append(sys.intern(label))
+        return speaker_id
+
+    def add_segment(self, begin: float, end: float, speaker: str, content: str):
+        self.begin.append(begin)
+        self.end.append(end)
+        self.speaker.append(self._speaker_id(speaker))
+        self.text_start.append(self._length)
+        self._length += len(content)
+        self.text_end.append(self._length)
+        # Newline separator between segments, so a run of segments is one contiguous span
+        self._parts.append(content + SEGMENT_SEPARATOR)
+        self._length += 1
+        self._text = None
+
+    def add_word(self, begin: float, end: float, content: str, confidence: float = 1.0, word_type: str = "PRONUNCIATION"):
+        self.word_begin.append(begin)
+        self.word_end.append(end)
+        self.word_confidence.append(confidence)
+        self.word_type.append(WORD_TYPES.index(word_type) if word_type in WORD_TYPES else 0)
+        self.word_start.append(self._word_length)
+        self._word_parts.append(content)
+        self._word_length += len(content)
+        self.word_stop.append(self._word_length)
+        self._word_text = None
+
+    def add_healthscribe_segment(self, segment: Dict[str, Any]):
+        self.add_segment(
+            float(segment.get("BeginAudioTime", 0.0)),
+            float(segment.get("EndAudioTime", 0.0)),
+            segment.get("ParticipantDetails", {}).get("ParticipantRole", "SPEAKER"),
+            segment.get("Content", ""),
+        )
+
+    def add_healthscribe_item(self, item: Dict[str, Any]):
+        self.add_word(
+            float(item.get("BeginAudioTime", 0.0)),
+            float(item.get("EndAudioTime", 0.0)),
+            item.get("Content", ""),
+            float(item.get("Confidence", 1.0)),
+            item.get("Type", "PRONUNCIATION"),
+        )
+
+    @classmethod
+    def from_healthscribe(cls, transcript: Dict[str, Any]) -> "SegmentStore":
+        """
+        Build from a parsed HealthScribe transcript.json document.
+        """
+        store = cls()
+        conversation = transcript.get("Conversation", {})
+        for segment in conversation.get("TranscriptSegments", []):
+            store.add_healthscribe_segment(segment)
+        for item in conversation.get("TranscriptItems", []):
+            store.add_healthscribe_item(item)
+        return store
+
+    @classmethod
+    def from_healthscribe_stream(cls, stream) -> "SegmentStore":
+        """
+        Build straight from a transcript.json byte stream (e.g. an S3 StreamingBody).
+        Only one segment/item dict exists at a time; peak memory is the columns
+        plus one read chunk, not the parsed document.
+        """
+        store = cls()
+        for prefix, value in iter_prefixed_items(stream, (SEGMENTS_PREFIX, ITEMS_PREFIX)):
+            if prefix == SEGMENTS_PREFIX:
+                store.add_healthscribe_segment(value)
+            else:
+                store.add_healthscribe_item(value)
+        return store
+
+    # ---------- access ----------
+
+    def __len__(self) -> int:
+        return len(self.begin)
+
+    @property
+    def text_buffer(self) -> str:
+        if self._text is None:
+            # Join once; the per-segment strings are released afterwards
+            self._text = "".join(self._parts)
+            self._parts = [self._text]
+        return self._text
+
+    @property
+    def word_buffer(self) -> str:
+        if self._word_text is None:
+            self._word_text = "".join(self._word_parts)
+            self._word_parts = [self._word_text]
+        return self._word_text
+
+    def text(self, index: int) -> str:
+        return self.text_buffer[self.text_start[index]:self.text_end[index]]
+
+    def transcript_text(self) -> str:
+        """
+        "ROLE: content" per segment, the flat form used for fullTranscript.
+        """
+        buffer = self.text_buffer
+        speakers = self.speakers
+        return "\n".join(
+            f"{speakers[s]}: {buffer[a:b]}"
+            for s, a, b in zip(self.speaker, self.text_start, self.text_end)
+        )
+
+    # ---------- analytics ----------
+
+    def talk_time_by_speaker(self) -> Dict[str, float]:
+        """
+        Total seconds spoken per speaker label.
+        """
+        if not len(self):
+            return {}
+        if np is not None:
+            durations = np.frombuffer(self.end, dtype=np.float64) - np.frombuffer(self.begin, dtype=np.float64)
+            totals = np.bincount(np.frombuffer(self.speaker, dtype=np.uint16), weights=durations,
+                                 minlength=len(self.speakers))
+            return {label: round(float(totals[i]), 3) for i, label in enumerate(self.speakers)}
+
+        totals = [0.0] * len(self.speakers)
+        for s, b, e in zip(self.speaker, self.begin, self.end):
+            totals[s] += e - b
+        return {label: round(totals[i], 3) for i, label in enumerate(self.speakers)}
+
+    def turns(self) -> List[Dict[str, Any]]:
+        """
+        Consecutive segments by the same speaker merged into conversational turns.
+        """
+        count = len(self)
+        if not count:
+            return []
+        speaker = self.speaker
+        # Indices where the speaker changes; each turn is one contiguous span of the text buffer
+        starts = [0] + [i for i in range(1, count) if speaker[i] != speaker[i - 1]]
+        stops = starts[1:] + [count]
+        buffer = self.text_buffer
+        return [
+            {
+                "speaker": self.speakers[speaker[a]],
+                "begin": self.begin[a],
+                "end": self.end[b - 1],
+                "text": buffer[self.text_start[a]:self.text_end[b - 1]].replace(SEGMENT_SEPARATOR, " "),
+            }
+            for a, b in zip(starts, stops)
+        ]
+
+    def slice_time(self, start: float, end: float) -> "SegmentStore":
+        """
+        Segments (and words) overlapping [start, end), as a new store.
+        Binary search over the sorted time columns, then array slices.
+        """
+        # A segment overlaps if it ends after `start` and begins before `end`
+        lo = bisect_right(self.end, start)
+        hi = bisect_left(self.begin, end)
+        sliced = SegmentStore()
+        sliced.speakers = list(self.speakers)
+        sliced._speaker_ids = dict(self._speaker_ids)
+        if lo < hi:
+            base = self.text_start[lo]
+            sliced.begin = self.begin[lo:hi]
+            sliced.end = self.end[lo:hi]
+            sliced.speaker = self.speaker[lo:hi]
+            sliced.text_start = array("I", (o - base for o in self.text_start[lo:hi]))
+            sliced.text_end = array("I", (o - base for o in self.text_end[lo:hi]))
+            sliced._parts = [self.text_buffer[base:self.text_end[hi - 1] + len(SEGMENT_SEPARATOR)]]
+            sliced._length = len(sliced._parts[0])
+
+        wlo = bisect_right(self.word_end, start)
+        whi = bisect_left(self.word_begin, end)
+        if wlo < whi:
+            base = self.word_start[wlo]
+            sliced.word_begin = self.word_begin[wlo:whi]
+            sliced.word_end = self.word_end[wlo:whi]
+            sliced.word_confidence = self.word_confidence[wlo:whi]
+            sliced.word_type = self.word_type[wlo:whi]
+            sliced.word_start = array("I", (o - base for o in self.word_start[wlo:whi]))
+            sliced.word_stop = array("I", (o - base for o in self.word_stop[wlo:whi]))
+            sliced._word_parts = [self.word_buffer[base:self.word_stop[whi - 1]]]
+            sliced._word_length = len(sliced._word_parts[0])
+        return sliced
+
+    def to_payload(self, include_words: bool = False) -> Dict[str, Any]:
+        """
+        Columnar JSON for the UI: one list per field instead of a list of objects.
+        """
+        buffer = self.text_buffer
+        payload = {
+            "speakers": self.speakers,
+            "begin": self.begin.tolist(),
+            "end": self.end.tolist(),
+            "speaker": self.speaker.tolist(),
+            "text": [buffer[a:b] for a, b in zip(self.text_start, self.text_end)],
+        }
+        if include_words:
+            words = self.word_buffer
+            payload["words"] = {
+                "begin": self.word_begin.tolist(),
+                "end": self.word_end.tolist(),
+                "confidence": [round(c, 3) for c in self.word_confidence],
+                "type": [WORD_TYPES[t] for t in self.word_type],
+                "text": [words[a:b] for a, b in zip(self.word_start, self.word_stop)],
+            }
+        return payload
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the columns and text buffers.
+        """
+        columns = (self.begin, self.end, self.speaker, self.text_start, self.text_end,
+                   self.word_begin, self.word_end, self.word_confidence, self.word_type,
+                   self.word_start, self.word_stop)
+        return (sum(c.itemsize * len(c) for c in columns)
+                + sum(sys.getsizeof(p) for p in self._parts)
+                + sum(sys.getsizeof(p) for p in self._word_parts))
@@ -0,0 +1,85 @@
+import re
+from typing import Iterator, List, Tuple
+
+# Cheap local triage used to order agent work before Bedrock has seen the transcript.
+# This is a scheduling hint only; the agent's own safety.red_flags stay authoritative.
+
+URGENT = 0
+ROUTINE = 1
+BULK = 2
+PRIORITY_NAMES = {URGENT: "urgent", ROUTINE: "routine", BULK: "bulk"}
+
+# Canonical red flag -> phrases that indicate it in conversational transcripts
+RED_FLAG_LEXICON = {
+    "Chest pain (possible ACS/MI)": [
+        "chest pain", "chest tightness", "crushing chest", "pain in my chest",
+        "pain radiating to (?:my|the) (?:left )?arm", "heart attack",
+    ],
+    "Breathing difficulty": [
+        "short(?:ness)? of breath", "can'?t breathe", "cannot breathe",
+        "difficulty breathing", "struggling to breathe",
+    ],
+    "Stroke symptoms": [
+        "stroke", "facial droop", "face (?:is )?drooping", "slurred speech",
+        "weakness (?:on|down) one side", "sudden numbness",
+    ],
+    "Possible sepsis": [
+        "sepsis", "septic", "rigors", "mottled skin", "non-?blanching rash",
+    ],
+    "Anaphylaxis": [
+        "anaphylaxis", "throat (?:is )?swelling", "tongue swelling", "swollen tongue",
+    ],
+    "Severe headache / meningism": [
+        "worst headache", "thunderclap headache", "neck stiffness", "stiff neck", "meningitis",
+    ],
+    "Loss of consciousness / seizure": [
+        "unconscious", "passed out", "fainted", "seizure", "fitting", "collapsed",
+    ],
+    "Significant bleeding": [
+        "coughing up blood", "vomiting blood", "black (?:tarry )?stools?",
+        "haemoptysis", "hemoptysis", "haematemesis", "hematemesis",
+    ],
+    "Suicide / self-harm risk": [
+        "suicid(?:e|al)", "self[- ]harm", "kill myself", "end my life", "overdose",
+    ],
+}
+
+_PHRASE_TO_FLAG = {}
+_alternatives = []
+for _flag, _phrases in RED_FLAG_LEXICON.items():
+    for _phrase in _phrases:
+        _PHRASE_TO_FLAG[len(_alternatives)] = _flag
+        _alternatives.append(f"({_phrase})")
+
+# One alternation with a group per phrase, so a single scan finds every flag
+RED_FLAG_PATTERN = re.compile(r"\b(?:" + "|".join(_alternatives) + r")\b", re.IGNORECASE)
+
+
+def iter_red_flags(text: str, pos: int = 0) -> Iterator[Tuple[str, "re.Match"]]:
+    """
+    (flag, match) for every red-flag phrase in `text` from offset `pos` on.
+    Word boundaries still see the characters before `pos`, so scanning a tail is safe.
+    """
+    for match in RED_FLAG_PATTERN.finditer(text, pos):
+        yield _PHRASE_TO_FLAG[match.lastindex - 1], match
+
+
+def find_red_flags(text: str) -> List[str]:
+    """
+    Canonical red flags mentioned in `text`, in order of first mention.
+    """
+    found = []
+    for flag, _ in iter_red_flags(text):
+        if flag not in found:
+            found.append(flag)
+    return found
+
+
+def triage_priority(transcript: str, urgent: bool = False, default: int = ROUTINE) -> int:
+    """
+    URGENT when the clinician marked the consult urgent or a red flag is mentioned,
+    otherwise `default` (ROUTINE for interactive requests, BULK for batches).
+    """
+    if urgent or RED_FLAG_PATTERN.search(transcript):
+        return URGENT
+    return default
@@ -0,0 +1,133 @@
+import os
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+
+from . import metrics
+
+# Lambda sets this to "on-demand", "provisioned-concurrency" or "snap-start"
+INITIALIZATION_TYPE = os.getenv("AWS_LAMBDA_INITIALIZATION_TYPE", "on-demand")
+
+# Ordered (name, fn) pairs; later modules append their own with @warmup_step
+_steps: List[Tuple[str, Callable[[], Any]]] = []
+_done: Dict[str, float] = {}
+
+
+def warmup_step(name: str):
+    """
+    Register `fn` to run once per container during warm-up.
+    """
+    def register(fn):
+        _steps.append((name, fn))
+        return fn
+    return register
+
+
+def is_warmup_event(event: Any) -> bool:
+    """
+    EventBridge schedule rules ("Scheduled Event"), serverless-plugin-warmup,
+    or an explicit {"warmup": true} test invoke.
+    """
+    if not isinstance(event, dict):
+        return False
+    if event.get("warmup"):
+        return True
+    if event.get("source") == "serverless-plugin-warmup":
+        return True
+    return event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+
+
+def warm_up(reason: str) -> Dict[str, Any]:
+    """
+    Run every registered step that hasn't run in this container yet, and log
+    a per-step timing breakdown. Steps that fail are logged and retried next time.
+    """
+    breakdown = {}
+    started = time.perf_counter()
+    for name, fn in _steps:
+        if name in _done:
+            continue
+        step_started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Warm-up step {name} failed: {str(e)}")
+            continue
+        elapsed = (time.perf_counter() - step_started) * 1000
+        _done[name] = elapsed
+        breakdown[name] = round(elapsed, 1)
+        metrics.record("warmup.step_ms", elapsed, step=name)
+
+    total = (time.perf_counter() - started) * 1000
+    if breakdown:
+        metrics.record("warmup.total_ms", total, reason=reason)
+        print(f"🔥 Warm-up ({reason}, init={INITIALIZATION_TYPE}) {total:.0f} ms: "
+              + ", ".join(f"{k}={v:.0f}ms" for k, v in breakdown.items()))
+    return {"warmed": True, "reason": reason, "totalMs": round(total, 1), "steps": breakdown,
+            "alreadyWarm": sorted(set(_done) - set(breakdown))}
+
+
+# ---------- steps ----------
+
+@warmup_step("aws_clients")
+def _build_clients():
+    from .router import get_service
+    get_service()
+
+
+@warmup_step("s3_connection")
+def _open_s3_connection():
+    # Puts a TLS connection to S3 in the client's pool before the first upload
+    from .router import get_service
+    service = get_service()
+    if service.bucket:
+        try:
+            service.s3.head_bucket(Bucket=service.bucket)
+        except ClientError:
+            pass  # 403/404 still leaves the connection in the pool
+
+
+@warmup_step("patient_table_connection")
+def _open_dynamodb_connection():
+    from .patient_history import patient_histories
+    if patient_histories.enabled:
+        # A miss on a sentinel key is the cheapest call GetItem permission allows
+        try:
+            patient_histories.client.get_item(
+                TableName=patient_histories.table_name, Key={"PatientID": {"S": "__warmup__"}}
+            )
+        except ClientError:
+            pass
+
+
+@warmup_step("analysis_queue")
+def _open_analysis_queue():
+    from .analysis_jobs import analysis_jobs
+    analysis_jobs.store.get("__warmup__")
+
+
+@warmup_step("lexicons")
+def _exercise_lexicons():
+    # Patterns are compiled at import; one match each also primes re's cache for
+    # the inline patterns used in agent response parsing
+    from .triage import find_red_flags
+    from .medications import parse_text
+    from .contraindications import build_profile
+    from .router import get_service
+    find_red_flags("chest pain")
+    parse_text("Stop warfarin; start apixaban 5 mg orally twice daily")
+    build_profile({"Allergies": ["Penicillins"], "FailedMedications": [{"name": "lisinopril", "reason": "cough"}]})
+    get_service().extract_json_from_text('noise {"warm": true}')
+
+
+@warmup_step("analysis_store")
+def _open_analysis_store():
+    from .analysis_store import analysis_history
+    analysis_history.store.list("__warmup__", 1)
+
+
+@warmup_step("decision_log")
+def _open_decision_log():
+    from .decisions import decision_log
+    list(decision_log.store.list("__warmup__"))
@@ -1,13 +1,111 @@
+import json
 import os
 import sys
+import time
+
+_init_started = time.perf_counter()
 
 # Standard pathing for local and Lambda
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
-from main import app
+from main import app, HEALTH_RESPONSE
 from mangum import Mangum
+from api.healthscribe import metrics
+from api.healthscribe.warmup import INITIALIZATION_TYPE, is_warmup_event, warm_up, warmup_step
+from api.healthscribe.decisions import decision_log
+from api.healthscribe.analysis_store import analysis_history
+
+_import_ms = (time.perf_counter() - _init_started) * 1000
+metrics.record("warmup.import_ms", _import_ms, init=INITIALIZATION_TYPE)
+
+_mangum = Mangum(app, lifespan="off")
+
+# How long queued writes may hold the response, capped by the invocation's remaining time
+FLUSH_TIMEOUT_SECONDS = 5.0
+FLUSH_RESERVE_MS = 1000
+
+# GET / is hit by health checks and uptime monitors far more often than anything else.
+# Its response is static, so answer it without building an ASGI scope at all.
+_HEALTH_BODY = json.dumps(HEALTH_RESPONSE)
+
+
+def _is_health_check(event) -> bool:
+    if not isinstance(event, dict):
+        return False
+    http = event.get("requestContext", {}).get("http")
+    if http is not None:  # HTTP API / Function URL (payload v2)
+        return http.get("method") == "GET" and event.get("rawPath") == "/"
+    return event.get("httpMethod") == "GET" and event.get("path") == "/"
+
+
+def _health_response(event):
+    response = {
+        "statusCode": 200,
+        "headers": {"content-type": "application/json", "content-length": str(len(_HEALTH_BODY))},
+        "body": _HEALTH_BODY,
+        "isBase64Encoded": False,
+    }
+    if "requestContext" in event and "http" not in event["requestContext"]:
+        response["multiValueHeaders"] = {}
+    return response
+
+# Minimal API Gateway event for the health route, used to exercise the request path once
+_WARMUP_REQUEST = {
+    "resource": "/", "path": "/", "httpMethod": "GET", "headers": {}, "multiValueHeaders": {},
+    "queryStringParameters": None, "multiValueQueryStringParameters": None, "pathParameters": None,
+    "stageVariables": None, "body": None, "isBase64Encoded": False,
+    "requestContext": {"resourcePath": "/", "httpMethod": "GET", "path": "/", "stage": "warmup",
+                       "identity": {"sourceIp": "127.0.0.1"}, "requestId": "warmup"},
+}
+
+
+class _WarmupContext:
+    aws_request_id = "warmup"
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+@warmup_step("app_request")
+def _warm_request_path():
+    # First request through Mangum/Starlette pulls in lazily imported code (anyio backend, routing)
+    _mangum(_WARMUP_REQUEST, _WarmupContext())
+
+
+def _flush_writes(context):
+    """
+    Lambda freezes the writer threads once the handler returns, so decisions and
+    analysis history queued by this request are written before handing the
+    response back. Whatever misses the deadline waits for the next invocation
+    (or is lost with the container), so it is logged and counted.
+    """
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    timeout = FLUSH_TIMEOUT_SECONDS
+    if remaining is not None:
+        timeout = max(0.5, min(timeout, (remaining() - FLUSH_RESERVE_MS) / 1000))
+    deadline = time.monotonic() + timeout
+    if decision_log.pending and not decision_log.flush(timeout=max(0.0, deadline - time.monotonic())):
+        unwritten = decision_log.pending
+        metrics.record("decisions.flush_timeout", unwritten)
+        print(f"⚠️ Returning with {unwritten} acknowledged decisions not yet written")
+    if not analysis_history.flush(timeout=max(0.0, deadline - time.monotonic())):
+        metrics.record("analysis_store.flush_timeout", 1)
+        print("⚠️ Returning with analysis history writes still queued")
+
 
 # This 'handler' is what the Lambda looks for
-handler = Mangum(app, lifespan="off")
\ No newline at end of file
+def handler(event, context):
+    if _is_health_check(event):
+        return _health_response(event)
+    if is_warmup_event(event):
+        return warm_up("scheduled")
+    response = _mangum(event, context)
+    _flush_writes(context)
+    return response
+
+
+# Provisioned concurrency runs init ahead of traffic, so do all of it now
+if INITIALIZATION_TYPE == "provisioned-concurrency":
+    warm_up("provisioned-concurrency")
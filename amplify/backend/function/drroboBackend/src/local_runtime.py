@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Lambda Runtime API, for checking that streaming.py
+# delivers chunks as they are produced rather than all at the end:
+#   python local_runtime.py --fake-agent-delay 0.3
+# starts streaming.py against it, sends one Function URL event for
+# /healthscribe/agent/analyze/stream and prints when each chunk arrived.
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_TRANSCRIPT = "Patient reports chest pain and shortness of breath since this morning. Takes lisinopril."
+
+
+class _Invocation:
+    def __init__(self, event):
+        self.request_id = str(uuid.uuid4())
+        self.event = event
+        self.chunks = []  # (seconds since the invocation was handed out, bytes)
+        self.trailers = {}
+        self.dispatched_at = None
+        self.done = threading.Event()
+
+
+class _RuntimeState:
+    def __init__(self):
+        self.pending = []
+        self.by_id = {}
+        self.ready = threading.Condition()
+        self.init_error = None
+
+
+def _handler(state: _RuntimeState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if not self.path.endswith("/runtime/invocation/next"):
+                return self._reply(404, {})
+            with state.ready:
+                while not state.pending:
+                    state.ready.wait()
+                invocation = state.pending.pop(0)
+            invocation.dispatched_at = time.perf_counter()
+            body = json.dumps(invocation.event).encode()
+            self.send_response(200)
+            self.send_header("Lambda-Runtime-Aws-Request-Id", invocation.request_id)
+            self.send_header("Lambda-Runtime-Deadline-Ms", str(int(time.time() * 1000) + 900000))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.endswith("/runtime/init/error"):
+                state.init_error = self._read_body()
+                with state.ready:
+                    for invocation in state.pending:
+                        invocation.done.set()
+                return self._reply(202, {})
+
+            request_id = self.path.split("/")[-2]
+            invocation = state.by_id.get(request_id)
+            if invocation is None:
+                return self._reply(404, {})
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                self._read_chunks(invocation)
+            else:
+                invocation.chunks.append((time.perf_counter() - invocation.dispatched_at, self._read_body()))
+                if self.path.endswith("/error"):
+                    invocation.trailers["Lambda-Runtime-Function-Error-Type"] = self.headers.get(
+                        "Lambda-Runtime-Function-Error-Type", "")
+            self._reply(202, {"status": "OK"})
+            invocation.done.set()
+
+        def _read_body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _read_chunks(self, invocation: _Invocation):
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    break
+                data = self.rfile.read(size)
+                self.rfile.readline()
+                invocation.chunks.append((time.perf_counter() - invocation.dispatched_at, data))
+            # Trailers end at an empty line
+            while True:
+                line = self.rfile.readline().strip()
+                if not line:
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                invocation.trailers[name.strip()] = value.strip()
+
+        def _reply(self, status: int, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class LocalRuntime:
+    """
+    Threaded Runtime API server. invoke() queues an event and blocks until the
+    function posts its (streamed or buffered) response.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.state = _RuntimeState()
+        self.server = ThreadingHTTPServer((host, port), _handler(self.state))
+        self.server.daemon_threads = True
+        self.address = f"{host}:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def invoke(self, event, timeout: float = 120) -> _Invocation:
+        invocation = _Invocation(event)
+        self.state.by_id[invocation.request_id] = invocation
+        with self.state.ready:
+            self.state.pending.append(invocation)
+            self.state.ready.notify()
+        if not invocation.done.wait(timeout):
+            raise TimeoutError(f"No response for {invocation.request_id} within {timeout}s")
+        if self.state.init_error is not None:
+            raise RuntimeError(f"Init failed: {self.state.init_error.decode(errors='replace')}")
+        return invocation
+
+    def close(self):
+        self.server.shutdown()
+
+
+def function_url_event(method: str, path: str, body=None):
+    raw = json.dumps(body) if body is not None else None
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"content-type": "application/json", "host": "localhost"},
+        "requestContext": {"http": {"method": method, "path": path, "sourceIp": "127.0.0.1"},
+                           "domainName": "localhost"},
+        "body": raw,
+        "isBase64Encoded": False,
+    }
+
+
+def split_prelude(invocation: _Invocation):
+    """
+    (prelude dict, [(offset_seconds, body_bytes), ...]) from a streamed response.
+    """
+    from streaming import PRELUDE_DELIMITER
+    data, chunks = b"", list(invocation.chunks)
+    while chunks and PRELUDE_DELIMITER not in data:
+        data += chunks.pop(0)[1]
+    prelude, _, rest = data.partition(PRELUDE_DELIMITER)
+    body = [(invocation.chunks[0][0], rest)] if rest else []
+    return json.loads(prelude), body + chunks
+
+
+def _fake_agent_env(delay: float, pieces: int):
+    # Read by _fake_agent_boot below in the runtime process
+    return {"LOCAL_RUNTIME_FAKE_AGENT_DELAY": str(delay), "LOCAL_RUNTIME_FAKE_AGENT_PIECES": str(pieces)}
+
+
+def _fake_agent_boot():
+    """
+    In the child: replace the Bedrock agent client with one that yields a canned
+    completion in pieces, sleeping between them like a model generating tokens.
+    """
+    delay = float(os.environ["LOCAL_RUNTIME_FAKE_AGENT_DELAY"])
+    pieces = int(os.environ["LOCAL_RUNTIME_FAKE_AGENT_PIECES"])
+    completion = json.dumps({
+        "soap_note": {"subjective": "Chest pain and shortness of breath.", "objective": "",
+                      "assessment": "Possible ACS.", "plan": "ECG, troponin."},
+        "diagnosis": [{"condition": "Acute coronary syndrome", "icd10": "I24.9", "confidence": 0.6}],
+        "safety": {"red_flags": ["chest pain"]},
+    })
+    step = max(1, len(completion) // pieces)
+
+    class FakeAgent:
+        def invoke_agent(self, **params):
+            def completion_events():
+                for i in range(0, len(completion), step):
+                    time.sleep(delay)
+                    yield {"chunk": {"bytes": completion[i:i + step].encode()}}
+            return {"completion": completion_events()}
+
+    from api.healthscribe.router import get_service
+    service = get_service()
+    service.bedrock_agent = FakeAgent()
+    service.agent_id = service.agent_id or "LOCAL"
+    service.agent_alias_id = service.agent_alias_id or "LOCAL"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run streaming.py against a local Runtime API")
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT)
+    parser.add_argument("--fake-agent-delay", type=float, default=None,
+                        help="Seconds between fake agent chunks (omit to call the real agent)")
+    parser.add_argument("--fake-agent-pieces", type=int, default=6)
+    args = parser.parse_args()
+
+    runtime = LocalRuntime()
+    env = dict(os.environ, AWS_LAMBDA_RUNTIME_API=runtime.address, PYTHONUNBUFFERED="1")
+    # Like index.py, the app directory goes after site-packages so the local interpreter's
+    # own packages win over the Lambda-built ones vendored next to the handler
+    boot = f"import sys; sys.path.remove(''); sys.path.append({current_dir!r}); import streaming"
+    if args.fake_agent_delay is not None:
+        env.update(_fake_agent_env(args.fake_agent_delay, args.fake_agent_pieces))
+        boot += "; import local_runtime; local_runtime._fake_agent_boot()"
+    command = [sys.executable, "-c", boot + "; streaming.main()"]
+    process = subprocess.Popen(command, cwd=current_dir, env=env)
+
+    def watch_process():
+        # A crash before the runtime posts /init/error would otherwise leave invoke() waiting
+        process.wait()
+        if runtime.state.init_error is None:
+            runtime.state.init_error = f"runtime exited with status {process.returncode}".encode()
+        for invocation in runtime.state.by_id.values():
+            invocation.done.set()
+
+    threading.Thread(target=watch_process, daemon=True).start()
+
+    try:
+        started = time.perf_counter()
+        invocation = runtime.invoke(function_url_event(
+            "POST", "/healthscribe/agent/analyze/stream", {"transcript": args.transcript}
+        ))
+        prelude, chunks = split_prelude(invocation)
+        print(f"status={prelude['statusCode']} content-type={prelude['headers'].get('content-type')} "
+              f"(round trip {(time.perf_counter() - started) * 1000:.0f} ms incl. cold start)")
+        for offset, data in chunks:
+            for line in data.splitlines():
+                update = json.loads(line)
+                detail = f"{len(update['text'])} chars" if update["type"] == "chunk" else ""
+                print(f"  +{offset * 1000:7.0f} ms  {update['type']:<6} {detail}")
+        if invocation.trailers:
+            print(f"  trailers: {invocation.trailers}")
+    finally:
+        process.terminate()
+        process.wait()
+        runtime.close()
+
+
+if __name__ == "__main__":
+    main()
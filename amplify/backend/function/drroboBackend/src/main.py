@@ -1,16 +1,31 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from api.healthscribe.router import router as healthscribe_router
 
+
+class DebugPathMiddleware:
+    """
+    Logs each request path. Pure ASGI rather than @app.middleware("http"): the
+    decorator form runs every request through BaseHTTPMiddleware's extra task and
+    memory stream, and buffers streaming responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            print(f"DEBUG: Request Path Received -> {scope['path']}")
+        await self.app(scope, receive, send)
+
+
 app = FastAPI(title="Digital Doctor API")
+app.add_middleware(DebugPathMiddleware)
 
 app.include_router(healthscribe_router)
 print("✅ HealthScribe Router Loaded")
 
-@app.middleware("http")
-async def debug_paths(request: Request, call_next):
-    print(f"DEBUG: Request Path Received -> {request.url.path}")
-    return await call_next(request)
+HEALTH_RESPONSE = {"message": "API is online"}
 
 @app.get("/")
 async def root():
-    return {"message": "API is online"}
+    return HEALTH_RESPONSE
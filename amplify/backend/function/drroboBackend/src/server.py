@@ -0,0 +1,160 @@
+import importlib.util
+import os
+import signal
+import sys
+import threading
+import time
+
+# Standard pathing, as in index.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+import uvicorn
+
+# Container / on-prem entry point: `python server.py`
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+# Longer than the usual 60s load-balancer idle timeout, so the balancer always closes first
+SERVER_KEEP_ALIVE_SECONDS = int(os.getenv("SERVER_KEEP_ALIVE_SECONDS", "75"))
+# On SIGTERM, in-flight requests (agent runs, live transcription sockets) get this long to finish
+SERVER_DRAIN_SECONDS = float(os.getenv("SERVER_DRAIN_SECONDS", "30"))
+# After the drain deadline, how long cancelled requests get before the worker exits hard
+SERVER_HARD_EXIT_SECONDS = 5
+# On exit, how long queued decision and analysis history writes get to reach the store
+SERVER_FLUSH_SECONDS = float(os.getenv("SERVER_FLUSH_SECONDS", "10"))
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0")) or None
+SERVER_ACCESS_LOG = os.getenv("SERVER_ACCESS_LOG", "false").lower() == "true"
+# App-level gzip/br (http_cache.CompressionMiddleware); under Lambda the API Gateway compresses
+SERVER_COMPRESSION = os.getenv("SERVER_COMPRESSION", "1") == "1"
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn stops accepting on the first SIGTERM and waits for open requests.
+    Its wait has no deadline, so a stuck stream could block shutdown; this one
+    force-closes after SERVER_DRAIN_SECONDS.
+    """
+
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            print(f"🛑 Worker {os.getpid()} draining (up to {SERVER_DRAIN_SECONDS:.0f}s)")
+            timer = threading.Timer(SERVER_DRAIN_SECONDS, self._force_exit)
+            timer.daemon = True
+            timer.start()
+        super().handle_exit(sig, frame)
+
+    def _force_exit(self):
+        print(f"⚠️ Worker {os.getpid()} drain deadline reached, closing remaining connections")
+        self.force_exit = True
+        # Agent calls blocked in worker threads can't be cancelled; don't let them hold the process
+        timer = threading.Timer(SERVER_HARD_EXIT_SECONDS, os._exit, args=(1,))
+        timer.daemon = True
+        timer.start()
+
+
+def build_config(app) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        timeout_keep_alive=SERVER_KEEP_ALIVE_SECONDS,
+        limit_concurrency=SERVER_LIMIT_CONCURRENCY,
+        access_log=SERVER_ACCESS_LOG,
+        lifespan="off",
+    )
+
+
+def _serve(config: uvicorn.Config, sock):
+    from api.healthscribe.router import get_service
+
+    # Per-process AWS clients, built before the first request rather than during it
+    get_service()
+    DrainingServer(config).run(sockets=[sock])
+
+
+def _flush_writes(timeout: float = SERVER_FLUSH_SECONDS):
+    """
+    Decisions and analysis history are written by background threads; wait for
+    them before the process exits, since os._exit and interpreter shutdown don't.
+    """
+    from api.healthscribe.analysis_store import analysis_history
+    from api.healthscribe.decisions import decision_log
+
+    deadline = time.monotonic() + timeout
+    if not decision_log.flush(timeout):
+        print(f"⚠️ Worker {os.getpid()} exiting with {decision_log.pending} decisions unwritten")
+    if not analysis_history.flush(max(0.0, deadline - time.monotonic())):
+        print(f"⚠️ Worker {os.getpid()} exiting with analysis history writes still queued")
+
+
+def _spawn(config: uvicorn.Config, sock) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            _serve(config, sock)
+        finally:
+            _flush_writes()
+            os._exit(0)
+    return pid
+
+
+def main():
+    started = time.perf_counter()
+    # Preload once in the parent: app, routers, compiled lexicons. Forked workers
+    # share these pages copy-on-write instead of each importing from scratch.
+    from main import app
+
+    if SERVER_COMPRESSION:
+        from api.healthscribe.http_cache import CompressionMiddleware
+        app.add_middleware(CompressionMiddleware)
+    config = build_config(app)
+    sock = config.bind_socket()
+    print(f"✅ App preloaded in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"(loop={config.loop}, http={config.http}, workers={SERVER_WORKERS})")
+
+    if SERVER_WORKERS <= 1 or not hasattr(os, "fork"):
+        _serve(config, sock)
+        _flush_writes()
+        return
+
+    children = {_spawn(config, sock) for _ in range(SERVER_WORKERS)}
+    stopping = False
+
+    def stop(sig, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            # A worker crashed: replace it so capacity doesn't silently shrink
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            children.add(_spawn(config, sock))
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import http.client
+import json
+import os
+import sys
+import time
+import traceback
+
+# Standard pathing, as in index.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+# Response-streaming entry point for a Lambda Function URL with InvokeMode RESPONSE_STREAM.
+# The managed Python runtime can only return buffered responses, so this runs as a custom
+# runtime (see ./bootstrap) and talks to the Lambda Runtime API directly, writing each
+# ASGI body message to the client as soon as the app sends it.
+
+RUNTIME_API_VERSION = "2018-06-01"
+STREAMING_CONTENT_TYPE = "application/vnd.awslambda.http-integration-response"
+# Separates the JSON prelude (status, headers) from the body in an HTTP-integration stream
+PRELUDE_DELIMITER = b"\x00" * 8
+
+
+class ResponseStream:
+    """
+    One invocation's streamed response: a chunked POST to the Runtime API where
+    every write() goes out as its own HTTP chunk.
+    """
+
+    def __init__(self, connection: http.client.HTTPConnection, request_id: str):
+        self.connection = connection
+        self.bytes_sent = 0
+        connection.putrequest("POST", f"/{RUNTIME_API_VERSION}/runtime/invocation/{request_id}/response")
+        connection.putheader("Lambda-Runtime-Function-Response-Mode", "streaming")
+        connection.putheader("Content-Type", STREAMING_CONTENT_TYPE)
+        connection.putheader("Transfer-Encoding", "chunked")
+        connection.putheader("Trailer", "Lambda-Runtime-Function-Error-Type, Lambda-Runtime-Function-Error-Body")
+        connection.endheaders()
+
+    def write(self, data: bytes):
+        if data:
+            self.connection.send(b"%x\r\n%s\r\n" % (len(data), data))
+            self.bytes_sent += len(data)
+
+    def finish(self, error: BaseException = None):
+        if error is None:
+            self.connection.send(b"0\r\n\r\n")
+        else:
+            # Errors after the stream started are reported as trailers
+            body = base64.b64encode(json.dumps(_error_payload(error)).encode()).decode()
+            self.connection.send(
+                b"0\r\nLambda-Runtime-Function-Error-Type: %s\r\nLambda-Runtime-Function-Error-Body: %s\r\n\r\n"
+                % (type(error).__name__.encode(), body.encode())
+            )
+        self.connection.getresponse().read()
+
+
+class RuntimeAPI:
+    def __init__(self, address: str):
+        host, _, port = address.partition(":")
+        self.host, self.port = host, int(port or 80)
+
+    def _connection(self, timeout=None) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def next_invocation(self):
+        connection = self._connection()
+        connection.request("GET", f"/{RUNTIME_API_VERSION}/runtime/invocation/next")
+        response = connection.getresponse()
+        event = json.loads(response.read() or b"{}")
+        headers = {k.lower(): v for k, v in response.getheaders()}
+        connection.close()
+        return headers["lambda-runtime-aws-request-id"], event, headers
+
+    def open_stream(self, request_id: str) -> ResponseStream:
+        return ResponseStream(self._connection(), request_id)
+
+    def post_response(self, request_id: str, payload):
+        self._post(f"/{RUNTIME_API_VERSION}/runtime/invocation/{request_id}/response", payload)
+
+    def post_error(self, request_id: str, error: BaseException):
+        self._post(f"/{RUNTIME_API_VERSION}/runtime/invocation/{request_id}/error", _error_payload(error),
+                   {"Lambda-Runtime-Function-Error-Type": type(error).__name__})
+
+    def post_init_error(self, error: BaseException):
+        self._post(f"/{RUNTIME_API_VERSION}/runtime/init/error", _error_payload(error),
+                   {"Lambda-Runtime-Function-Error-Type": type(error).__name__})
+
+    def _post(self, path: str, payload, headers=None):
+        connection = self._connection(timeout=10)
+        connection.request("POST", path, body=json.dumps(payload), headers=headers or {})
+        connection.getresponse().read()
+        connection.close()
+
+
+def _error_payload(error: BaseException):
+    return {
+        "errorMessage": str(error),
+        "errorType": type(error).__name__,
+        "stackTrace": traceback.format_exception(type(error), error, error.__traceback__),
+    }
+
+
+def function_url_scope(event):
+    """
+    ASGI HTTP scope from a Function URL (payload v2) event.
+    """
+    context = event.get("requestContext", {})
+    http_context = context.get("http", {})
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (event.get("headers") or {}).items()]
+    if event.get("cookies"):
+        headers.append((b"cookie", "; ".join(event["cookies"]).encode("latin-1")))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": http_context.get("method", "GET"),
+        "scheme": "https",
+        "path": event.get("rawPath", "/"),
+        "raw_path": None,
+        "root_path": "",
+        "query_string": (event.get("rawQueryString") or "").encode("latin-1"),
+        "headers": headers,
+        "client": (http_context.get("sourceIp", ""), 0),
+        "server": (context.get("domainName", "lambda"), 443),
+        "aws.event": event,
+        # Routes that would page a buffered response (FHIR export) stream it whole here
+        "aws.response_stream": True,
+    }
+
+
+async def run_asgi(app, event, stream: ResponseStream):
+    """
+    Drive the app for one event. The status/headers prelude is written on
+    http.response.start and every body message is forwarded as it is sent.
+    """
+    body = event.get("body") or ""
+    body = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode()
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers, cookies = {}, []
+            for k, v in message.get("headers", []):
+                name, value = k.decode("latin-1").lower(), v.decode("latin-1")
+                if name == "set-cookie":
+                    cookies.append(value)
+                else:
+                    headers[name] = f"{headers[name]}, {value}" if name in headers else value
+            prelude = {"statusCode": message["status"], "headers": headers, "cookies": cookies}
+            stream.write(json.dumps(prelude).encode() + PRELUDE_DELIMITER)
+        elif message["type"] == "http.response.body":
+            stream.write(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_done.set()
+
+    try:
+        await app(function_url_scope(event), receive, send)
+    finally:
+        response_done.set()
+
+
+def main():
+    runtime = RuntimeAPI(os.environ["AWS_LAMBDA_RUNTIME_API"])
+    try:
+        started = time.perf_counter()
+        from main import app
+        from api.healthscribe.warmup import INITIALIZATION_TYPE, is_warmup_event, warm_up
+        if INITIALIZATION_TYPE == "provisioned-concurrency":
+            warm_up("provisioned-concurrency")
+        print(f"✅ Streaming runtime ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as e:
+        runtime.post_init_error(e)
+        raise
+
+    # One loop for the life of the container, so per-process state bound to it survives invocations
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    while True:
+        request_id, event, headers = runtime.next_invocation()
+        os.environ["_X_AMZN_TRACE_ID"] = headers.get("lambda-runtime-trace-id", "")
+        if is_warmup_event(event):
+            runtime.post_response(request_id, warm_up("scheduled"))
+            continue
+
+        stream = runtime.open_stream(request_id)
+        try:
+            loop.run_until_complete(run_asgi(app, event, stream))
+            stream.finish()
+        except Exception as e:
+            print(f"Streaming invocation {request_id} failed: {str(e)}")
+            stream.finish(error=e)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import asyncio
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from api.healthscribe.analysis_jobs import analysis_jobs
+from api.healthscribe.analysis_store import analysis_history
+from api.healthscribe.service import HealthScribeService
+
+# Built once per container and reused across SQS batches
+service = HealthScribeService()
+
+
+def handler(event, context):
+    """
+    Lambda entry point for the analysis queue's SQS event source mapping.
+    """
+    response = asyncio.run(analysis_jobs.handle_sqs_event(event, service))
+    # The container is frozen once we return; don't leave history writes queued
+    analysis_history.flush(timeout=10)
+    return response
+
+
+if __name__ == "__main__":
+    # Long-running poller for containers / local development
+    print("🛠️ Analysis worker polling for jobs")
+    asyncio.run(analysis_jobs.run_worker(service))
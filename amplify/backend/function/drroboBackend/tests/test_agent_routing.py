@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from api.healthscribe import agent_routing
+from api.healthscribe.agent_routing import AgentRouter, AgentTarget, _Attempt, _Race
+
+
+class FakeStream:
+    def __init__(self, chunks, delay=0.0, error=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        for chunk in self.chunks:
+            yield {"chunk": {"bytes": chunk.encode("utf-8")}}
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeAgent:
+    def __init__(self, stream):
+        self.stream = stream
+        self.calls = []
+
+    def invoke_agent(self, **params):
+        self.calls.append(params)
+        return {"completion": self.stream}
+
+
+def targets(name, primary_stream, secondary_stream):
+    # Region names are per test: routing reads per-target samples from the shared metrics
+    primary = AgentTarget(f"{name}-1", "AGENT", "ALIAS", client=FakeAgent(primary_stream))
+    secondary = AgentTarget(f"{name}-2", "AGENT", "ALIAS", client=FakeAgent(secondary_stream))
+    return primary, AgentRouter(secondary, hedging=True)
+
+
+def invoke(router, primary, session_id="s1"):
+    chunks = []
+    started = time.perf_counter()
+    completion = router.invoke(primary, {"sessionId": session_id, "inputText": "t"}, chunks.append)
+    return completion, chunks, time.perf_counter() - started
+
+
+def test_slow_primary_is_hedged_and_the_loser_is_closed(monkeypatch):
+    monkeypatch.setattr(agent_routing, "HEDGE_DEFAULT_MS", 50)
+    slow = FakeStream(["late"], delay=0.5)
+    primary, router = targets("slow", slow, FakeStream(["fast ", "answer"]))
+
+    completion, chunks, _ = invoke(router, primary)
+    assert completion == "fast answer" and chunks == ["fast ", "answer"]
+    assert slow.closed.wait(2)
+    # The session stays where it started: the next call goes only to the secondary
+    assert invoke(router, primary)[0] == "fast answer"
+    assert len(primary.client.calls) == 1 and len(router.secondary.client.calls) == 2
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(agent_routing, "HEDGE_DEFAULT_MS", 2000)
+    primary, router = targets("fast", FakeStream(["primary"]), FakeStream(["secondary"]))
+    assert invoke(router, primary)[:2] == ("primary", ["primary"])
+    assert router.secondary.client.calls == []
+
+
+def test_primary_failing_before_the_delay_hedges_at_once(monkeypatch):
+    monkeypatch.setattr(agent_routing, "HEDGE_DEFAULT_MS", 5000)
+    primary, router = targets("failed", FakeStream([], error=RuntimeError("throttled")), FakeStream(["secondary"]))
+
+    completion, chunks, seconds = invoke(router, primary)
+    assert (completion, chunks) == ("secondary", ["secondary"])
+    assert seconds < 1  # didn't sit out the hedge delay
+    # The failed target is tried last until its cooldown passes
+    assert router.targets(primary) == [router.secondary, primary]
+
+
+def test_both_targets_failing_raises_the_primary_error(monkeypatch):
+    monkeypatch.setattr(agent_routing, "HEDGE_DEFAULT_MS", 5000)
+    primary, router = targets("both", FakeStream([], error=RuntimeError("primary down")),
+                              FakeStream([], delay=0.05, error=RuntimeError("secondary down")))
+    with pytest.raises(RuntimeError, match="primary down"):
+        invoke(router, primary)
+    assert len(router.secondary.client.calls) == 1
+    assert not router._healthy(primary) and not router._healthy(router.secondary)
+
+
+def test_attempt_without_chunks_still_wins_and_errors_are_reported():
+    race, failed = _Race(), []
+    empty = _Attempt(AgentTarget("r", "A", "B", client=FakeAgent(FakeStream([]))), {}, None, race, {}, failed.append)
+    empty.run()
+    assert race.winner is empty and empty.completion == "" and empty.error is None
+
+    broken = _Attempt(AgentTarget("r", "A", "B", client=FakeAgent(FakeStream([], error=ValueError("bad")))),
+                      {}, None, _Race(), {}, failed.append)
+    broken.run()
+    assert isinstance(broken.error, ValueError) and failed == [broken.target] and broken.done.is_set()
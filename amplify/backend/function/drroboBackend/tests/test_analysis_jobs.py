@@ -0,0 +1,71 @@
+import asyncio
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from api.healthscribe.analysis_jobs import AnalysisJobs, SQLiteJobQueue, DynamoJobStore, JobExists
+
+
+class RecordingService:
+    def __init__(self):
+        self.calls = 0
+
+    async def call_bedrock_agent(self, **kwargs):
+        self.calls += 1
+        return {"ok": True}
+
+
+def test_job_cancelled_after_read_is_not_run(tmp_path):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    jobs = AnalysisJobs(local, local)
+    service = RecordingService()
+
+    async def scenario():
+        await jobs.submit({"transcript": "t"}, job_id="spec-1")
+        message = local.receive()
+        read = local.get
+
+        def get_then_cancel(job_id):
+            # The job is read as queued, then cancelled before the worker marks it running
+            job = read(job_id)
+            local.cancel(job_id)
+            return job
+
+        local.get = get_then_cancel
+        assert await jobs.process(message, service) is True
+        local.get = read
+        return await jobs.get("spec-1")
+
+    job = asyncio.run(scenario())
+    assert service.calls == 0
+    assert job["status"] == "cancelled"
+    assert local.receive() is None
+
+
+def test_redelivered_running_job_can_start_again(tmp_path):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    local.create("j", {"transcript": "t"})
+    assert local.start("j", 1)
+    assert local.start("j", 2)
+    local.update("j", "completed", 2, result={})
+    assert not local.start("j", 3)
+
+
+@mock_aws
+def test_dynamo_conditional_create_start_and_cancel():
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    client.create_table(
+        TableName="Jobs", KeySchema=[{"AttributeName": "JobID", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "JobID", "AttributeType": "S"}], BillingMode="PAY_PER_REQUEST",
+    )
+    store = DynamoJobStore("Jobs", client)
+    store.create("a", {"transcript": "t"})
+    with pytest.raises(JobExists):
+        store.create("a", {})
+    assert store.cancel("a")
+    assert not store.start("a", 1)
+    store.create("b", {"transcript": "t"})
+    assert store.start("b", 1)
+    assert not store.cancel("b")
+    assert store.get("b")["status"] == "running"
@@ -0,0 +1,97 @@
+import asyncio
+import io
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from api.healthscribe.audio_spool import AudioSpool, AudioTooLarge, _ViewReader
+
+MIB = 1024 * 1024
+
+
+class FakeUpload:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+        self.reads = []
+
+    async def read(self, size=-1):
+        self.reads.append(size)
+        return self._stream.read(size)
+
+
+def test_spool_spills_to_disk_past_the_memory_limit():
+    data = os.urandom(10_000)
+    with AudioSpool(memory_bytes=4096, max_bytes=20_000) as spool:
+        upload = FakeUpload(data)
+        asyncio.run(spool.write_upload(upload, chunk_size=3000))
+        assert spool.on_disk and spool.size == len(data)
+        assert max(upload.reads) == 3000
+        assert bytes(spool.view()) == data
+        assert b"".join(bytes(p) for p in spool.parts(4000)) == data
+        assert [len(p) for p in spool.parts(4000)] == [4000, 4000, 2000]
+        # Parts have been taken: the mapped file is read-only from here
+        with pytest.raises(ValueError):
+            spool.write(b"more")
+
+    with AudioSpool(memory_bytes=4096, max_bytes=5000) as small:
+        small.write(b"x" * 4096)
+        assert not small.on_disk and bytes(small.view()) == b"x" * 4096
+        with pytest.raises(AudioTooLarge):
+            small.write(b"x" * 1000)
+
+
+def test_view_reader_reads_and_rewinds():
+    reader = _ViewReader(memoryview(b"0123456789"))
+    assert reader.read(4) == b"0123" and reader.tell() == 4
+    reader.seek(-2, io.SEEK_END)
+    assert reader.read() == b"89"
+    reader.seek(0)
+    assert reader.read() == b"0123456789" and len(reader) == 10
+
+
+@mock_aws
+def test_small_and_multipart_uploads_round_trip():
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket="audio")
+    small, large = os.urandom(1000), os.urandom(11 * MIB)
+
+    with AudioSpool() as spool:
+        spool.write(small)
+        spool.upload_to_s3(s3, "audio", "small.webm", "audio/webm", part_bytes=5 * MIB)
+    with AudioSpool(memory_bytes=MIB) as spool:
+        spool.write(large)
+        spool.upload_to_s3(s3, "audio", "large.webm", "audio/webm", part_bytes=5 * MIB)
+
+    assert s3.get_object(Bucket="audio", Key="small.webm")["Body"].read() == small
+    stored = s3.get_object(Bucket="audio", Key="large.webm")
+    assert stored["Body"].read() == large and stored["ContentType"] == "audio/webm"
+    assert stored["ETag"].endswith('-3"')  # three parts
+
+
+def test_failed_part_aborts_the_multipart_upload():
+    class FailingS3:
+        def __init__(self):
+            self.aborted = []
+
+        def create_multipart_upload(self, **kwargs):
+            return {"UploadId": "u1"}
+
+        def upload_part(self, PartNumber, Body, **kwargs):
+            if PartNumber == 2:
+                raise RuntimeError("connection reset")
+            return {"ETag": f'"{PartNumber}"'}
+
+        def complete_multipart_upload(self, **kwargs):
+            raise AssertionError("must not complete")
+
+        def abort_multipart_upload(self, UploadId, **kwargs):
+            self.aborted.append(UploadId)
+
+    s3 = FailingS3()
+    with AudioSpool() as spool:
+        spool.write(b"a" * 300)
+        with pytest.raises(RuntimeError, match="connection reset"):
+            spool.upload_to_s3(s3, "audio", "k", "audio/webm", part_bytes=100)
+    assert s3.aborted == ["u1"]
@@ -0,0 +1,122 @@
+import asyncio
+
+import boto3
+from moto import mock_aws
+
+from api.healthscribe import analysis_jobs as jobs_module
+from api.healthscribe.analysis_jobs import AnalysisJobs, SQLiteJobQueue, DynamoJobStore, SQSQueue
+from api.healthscribe.batch import AnalysisBatches
+
+
+class FakeService:
+    def __init__(self):
+        self.calls = []
+
+    async def call_bedrock_agent(self, transcript, raise_errors=False, **kwargs):
+        self.calls.append((transcript, raise_errors, kwargs.get("priority")))
+        if "fail" in transcript:
+            raise RuntimeError("agent throttled")
+        return {"diagnosis": {"primary": {"condition": transcript}}}
+
+
+async def drain(jobs, service):
+    while True:
+        message = jobs.queue.receive()
+        if message is None:
+            return
+        await jobs.process(message, service)
+
+
+def test_batch_runs_on_job_queue_and_reports_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs_module, "MAX_ATTEMPTS", 1)
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    jobs = AnalysisJobs(local, local)
+    batches = AnalysisBatches(jobs)
+    service = FakeService()
+
+    async def scenario():
+        batch = await batches.submit([
+            {"transcript": "cough", "consult_id": "c1"},
+            {"transcript": "please fail"},
+            {"transcript": "chest pain", "urgent": True},
+        ])
+        queued = await batches.get(batch["batchId"])
+        assert (queued["status"], queued["items"]) == ("queued", [])
+
+        await drain(jobs, service)
+        first = await batches.get(batch["batchId"])
+        again = await batches.get(batch["batchId"], first["cursor"])
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert (first["status"], first["completed"], first["failed"]) == ("completed", 2, 1)
+    by_index = {item["index"]: item for item in first["items"]}
+    assert by_index[0]["consult_id"] == "c1"
+    assert by_index[0]["result"]["diagnosis"]["primary"]["condition"] == "cough"
+    # The placeholder plan is never reported: the failure is
+    assert by_index[1]["status"] == "failed" and by_index[1]["result"] is None
+    assert "throttled" in by_index[1]["error"]
+    assert again["items"] == []
+    assert all(raise_errors for _, raise_errors, _ in service.calls)
+    # Routine batch items run as BULK; a red flag is promoted
+    assert {t: p for t, _, p in service.calls} == {"cough": 2, "please fail": 2, "chest pain": 0}
+
+
+def test_item_committed_late_with_an_earlier_timestamp_is_still_returned(tmp_path, monkeypatch):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    jobs = AnalysisJobs(local, local)
+    batches = AnalysisBatches(jobs)
+    service = FakeService()
+    real_time = jobs_module.time.time
+
+    async def scenario():
+        batch = await batches.submit([{"transcript": "cough"}, {"transcript": "wheeze"}])
+        early, late = jobs.queue.receive(), jobs.queue.receive()
+        await jobs.process(early, service)
+        first = await batches.get(batch["batchId"])
+        # The other item finishes on a worker whose clock is a minute behind
+        monkeypatch.setattr(jobs_module.time, "time", lambda: real_time() - 60)
+        await jobs.process(late, service)
+        monkeypatch.setattr(jobs_module.time, "time", real_time)
+        second = await batches.get(batch["batchId"], first["cursor"])
+        third = await batches.get(batch["batchId"], second["cursor"])
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert [item["index"] for item in first["items"]] == [0]
+    assert [item["index"] for item in second["items"]] == [1]
+    assert second["status"] == "completed" and third["items"] == []
+    # An unreadable or old-style (timestamp) cursor starts over rather than failing
+    for cursor in ("not a cursor!", "1712345678.25:0", "AAAA"):
+        assert len(asyncio.run(batches.get(first["batchId"], cursor))["items"]) == 2
+
+
+def test_unknown_batch_is_none(tmp_path):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    assert asyncio.run(AnalysisBatches(AnalysisJobs(local, local)).get("nope")) is None
+
+
+@mock_aws
+def test_dynamo_and_sqs_batched_writes():
+    dynamodb = boto3.client("dynamodb", region_name="us-east-1")
+    dynamodb.create_table(
+        TableName="Jobs", KeySchema=[{"AttributeName": "JobID", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "JobID", "AttributeType": "S"}], BillingMode="PAY_PER_REQUEST",
+    )
+    sqs = boto3.client("sqs", region_name="us-east-1")
+    queue_url = sqs.create_queue(QueueName="analysis")["QueueUrl"]
+    jobs = AnalysisJobs(DynamoJobStore("Jobs", dynamodb), SQSQueue(queue_url, sqs))
+    batches = AnalysisBatches(jobs)
+    items = [{"transcript": f"consult {n}"} for n in range(60)]
+
+    batch = asyncio.run(batches.submit(items))
+    progress = asyncio.run(batches.get(batch["batchId"]))
+    assert (progress["total"], progress["status"]) == (60, "queued")
+    attributes = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"])
+    assert attributes["Attributes"]["ApproximateNumberOfMessages"] == "60"
+
+    job_id = f"{batch['batchId']}:0007"
+    jobs.store.update(job_id, "completed", 1, result={"ok": True})
+    progress = asyncio.run(batches.get(batch["batchId"]))
+    assert [(i["index"], i["result"]) for i in progress["items"]] == [(7, {"ok": True})]
+    assert (progress["status"], progress["completed"]) == ("running", 1)
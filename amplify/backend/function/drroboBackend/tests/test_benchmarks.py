@@ -0,0 +1,68 @@
+import importlib.util
+import os
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BENCHMARKS, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_search_index_benchmark_runs_small(monkeypatch):
+    bench = load("bench_search_index")
+    # main() pins the refresh interval for its query timings; put it back afterwards
+    monkeypatch.setattr(bench.search_index, "SEARCH_REFRESH_SECONDS", bench.search_index.SEARCH_REFRESH_SECONDS)
+    report = bench.main(["--notes", "200", "--patients", "4", "--vocab", "500", "--queries", "5"])
+    assert report["notes"] == 200 and report["postings"] > 0
+
+
+def test_fhir_export_benchmark_runs_small(monkeypatch):
+    bench = load("bench_fhir_export")
+    # main() points the shared analysis history at its throwaway store; put it back afterwards
+    monkeypatch.setattr(bench.fhir_export.analysis_history, "store", bench.fhir_export.analysis_history.store)
+    report = bench.main(["--resources", "600", "--patients", "10"])
+    assert report["resources"] >= 600
+
+
+def test_serialization_benchmark_runs_small():
+    report = load("bench_serialization").main(["--kb", "20", "--iterations", "3"])
+    assert report["bytes"] > 10_000 and report["default_ms"] > 0
+
+
+def test_transcript_parse_benchmark_runs_small():
+    report = load("bench_transcript_parse").main(["--sizes", "0.2"])
+    row, = report["rows"]
+    assert row["segments"] > 0 and row["streaming_peak_mb"] < row["json_load_peak_mb"]
+
+
+def test_live_alerts_benchmark_runs_small():
+    report = load("bench_live_alerts").main(["--utterances", "40"])
+    assert report["updates"] > 40 and report["incremental"]["mean_us"] > 0 and "rescan" in report
+
+
+def test_server_throughput_benchmark_runs_small(monkeypatch):
+    bench = load("bench_server_throughput")
+    from api.healthscribe.router import get_service
+    # The Lambda half swaps a fake agent into the shared service; put the real client back afterwards
+    service = get_service()
+    for name in ("bedrock_agent", "agent_id", "agent_alias_id"):
+        monkeypatch.setattr(service, name, getattr(service, name))
+    # main() sets these in os.environ for the server workers; registered here so they are removed again
+    monkeypatch.setenv("LOCAL_RUNTIME_FAKE_AGENT_DELAY", "0")
+    monkeypatch.setenv("LOCAL_RUNTIME_FAKE_AGENT_PIECES", "1")
+    report = bench.main(["--agent-delay", "0", "--requests", "5", "--concurrency", "2", "--workers", "1"])
+    assert report["server_1"]["analyze"]["rps"] > 0 and report["lambda"]["analyze"]["rps"] > 0
+
+
+def test_invocation_overhead_benchmark_runs_small():
+    report = load("bench_invocation_overhead").main(["--iterations", "20"])
+    assert report["GET /"]["after_us"] < report["GET /"]["before_us"]
+
+
+def test_decisions_benchmark_runs_small():
+    report = load("bench_decisions").main(["--decisions", "200", "--clients", "4", "--batch", "5",
+                                           "--write-latency-ms", "1", "--baseline", "20"])
+    assert report["file"]["decisions"] == 200 and report["dynamo"]["write_calls"] >= 8
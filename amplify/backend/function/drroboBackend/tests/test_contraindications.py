@@ -0,0 +1,85 @@
+from api.healthscribe.contraindications import apply_safety_checks, build_profile, check
+from api.healthscribe.medications import parse_treatment_plan
+
+
+def plan(*immediate, ongoing=()):
+    return {"immediate": list(immediate), "ongoing": list(ongoing)}
+
+
+def findings(profile, *lines, stop=()):
+    return [(c["medication"], c["kind"], c["conflictWith"])
+            for c in check(parse_treatment_plan(plan(*lines, *stop)), profile)]
+
+
+def test_allergy_through_class_and_cross_reactivity():
+    profile = build_profile({"Allergies": ["Penicillin - anaphylaxis"]})
+    conflicts = check(parse_treatment_plan(plan("Amoxicillin 500 mg PO TID", "Cefalexin 500 mg PO QID")), profile)
+    by_drug = {c["medication"]: c for c in conflicts}
+    assert by_drug["amoxicillin"]["kind"] == "allergy" and by_drug["amoxicillin"]["severity"] == "high"
+    assert by_drug["amoxicillin"]["detail"] == ""
+    assert by_drug["cefalexin"]["kind"] == "cross_reactivity" and by_drug["cefalexin"]["severity"] == "moderate"
+    # Most severe first
+    assert conflicts[0]["medication"] == "amoxicillin"
+
+
+def test_intolerance_of_the_drug_and_of_its_class():
+    profile = build_profile({"FailedMedications": [{"name": "Atorvastatin", "reaction": "myalgia"}]})
+    assert check(parse_treatment_plan(plan("Atorvastatin 20 mg nightly")), profile)[0]["severity"] == "high"
+    same_class = check(parse_treatment_plan(plan("Simvastatin 20 mg nightly")), profile)
+    assert [(c["kind"], c["severity"], c["detail"]) for c in same_class] == [("intolerance", "moderate", "myalgia")]
+
+
+def test_interactions_with_current_medications_unless_stopped():
+    profile = build_profile({"CurrentMedications": ["Warfarin 5 mg daily", "Sertraline 50 mg daily"]})
+    assert set(findings(profile, "Naproxen 500 mg BD")) == {
+        ("naproxen", "interaction", "warfarin"), ("naproxen", "interaction", "sertraline")}
+    assert findings(profile, "Naproxen 500 mg BD", stop=["Stop warfarin"]) == [
+        ("naproxen", "interaction", "sertraline")]
+
+
+def test_interactions_and_duplicates_within_the_plan():
+    profile = build_profile({"Allergies": ["latex"]})
+    assert findings(profile, "Lisinopril 10 mg daily", "Losartan 50 mg daily") == [
+        ("lisinopril", "interaction", "losartan")]
+    assert findings(profile, "Lisinopril 10 mg daily", "Ramipril 5 mg daily") == [
+        ("lisinopril", "duplicate", "ramipril")]
+
+
+def test_no_profile_means_no_findings():
+    result = {"treatment_plan": plan("Ibuprofen 400 mg TID")}
+    assert apply_safety_checks(result, build_profile({})) == []
+    assert result["safety"] == {"conflicts": [], "contraindications_found": []}
+
+
+def test_agent_line_about_another_finding_does_not_hide_the_allergy():
+    profile = build_profile({"Allergies": ["NSAIDs"], "CurrentMedications": ["Warfarin 5 mg daily"]})
+    result = {"treatment_plan": plan("Start ibuprofen 400 mg PO TID"),
+              "safety": {"contraindications_found": ["Ibuprofen + warfarin: bleeding risk"]}}
+    conflicts = apply_safety_checks(result, profile)
+    assert {c["kind"] for c in conflicts} == {"allergy", "interaction"}
+    # The agent reported the interaction; the allergy is added next to it
+    assert result["safety"]["contraindications_found"] == [
+        "Ibuprofen + warfarin: bleeding risk", "Ibuprofen: nsaid allergy (NSAIDs) [high]"]
+
+
+def test_drug_named_allergy_is_not_hidden_by_an_unrelated_line():
+    profile = build_profile({"Allergies": ["ibuprofen"], "CurrentMedications": ["Warfarin"]})
+    result = {"treatment_plan": plan("Ibuprofen 400 mg TID"),
+              "safety": {"contraindications_found": ["Ibuprofen + warfarin: bleeding risk"]}}
+    apply_safety_checks(result, profile)
+    assert any("allergy" in line for line in result["safety"]["contraindications_found"][1:])
+
+
+def test_agent_lines_covering_the_same_finding_are_not_repeated():
+    profile = build_profile({"Allergies": ["NSAIDs"], "CurrentMedications": ["Warfarin 5 mg daily"],
+                             "FailedMedications": ["Atorvastatin - myalgia"]})
+    agent_lines = ["Avoid ibuprofen: documented NSAID allergy",
+                   "Warfarin with ibuprofen raises bleeding risk",
+                   "Simvastatin: patient did not tolerate a statin before"]
+    result = {"treatment_plan": plan("Ibuprofen 400 mg TID", "Simvastatin 20 mg nightly"),
+              "safety": {"contraindications_found": list(agent_lines)}}
+    conflicts = apply_safety_checks(result, profile)
+    assert {c["kind"] for c in conflicts} == {"allergy", "interaction", "intolerance"}
+    assert result["safety"]["contraindications_found"] == agent_lines
+    # Everything is still in the structured findings
+    assert result["safety"]["conflicts"] == conflicts
@@ -0,0 +1,99 @@
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from api.healthscribe import decisions as decisions_module
+from api.healthscribe.decisions import DecisionLog, DecisionQueueFull, DynamoDecisionStore, FileDecisionLog
+
+EVENTS = [{"suggestion_id": "med-1", "action": "approve"},
+          {"suggestion_id": "med-2", "action": "modify", "content": "Amlodipine 10 mg once daily"},
+          {"suggestion_id": "med-1", "action": "reject"}]
+
+
+class GatedStore:
+    """
+    Records each commit's group; commits block until released, so callers can pile up behind one.
+    """
+
+    def __init__(self, fail_first=0):
+        self.groups = []
+        self.fail_first = fail_first
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+    def put_many(self, group):
+        self.entered.set()
+        self.release.wait(5)
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RuntimeError("throttled")
+        self.groups.append([d.decision_id for d in group])
+
+
+def test_decisions_queued_during_a_commit_go_in_one_group():
+    store = GatedStore()
+    log = DecisionLog(store)
+    first = log.record("c1", EVENTS[:1])
+    assert store.entered.wait(5)
+    # Arrive while the first commit is in progress
+    later = [log.record(f"c{n}", EVENTS) for n in range(2, 6)]
+    assert log.pending == 13 and not log.wait(first["sequence"], 0.01)
+
+    store.release.set()
+    assert log.flush(5) and log.pending == 0
+    assert store.groups == [first["decisionIds"], [i for r in later for i in r["decisionIds"]]]
+
+
+def test_failed_commit_is_retried_not_dropped():
+    store = GatedStore(fail_first=2)
+    store.release.set()
+    log = DecisionLog(store)
+    result = log.record("c1", EVENTS)
+    assert log.wait(result["sequence"], 5)
+    assert store.groups == [result["decisionIds"]]
+
+
+def test_queue_limit_refuses_new_batches(monkeypatch):
+    monkeypatch.setattr(decisions_module, "DECISION_QUEUE_MAX", 4)
+    store = GatedStore()
+    log = DecisionLog(store)
+    log.record("c1", EVENTS[:1])
+    assert store.entered.wait(5)
+    log.record("c1", EVENTS)
+    with pytest.raises(DecisionQueueFull):
+        log.record("c1", EVENTS[:2])
+    store.release.set()
+    assert log.flush(5)
+
+
+def test_file_log_lists_a_consults_decisions_in_order(tmp_path):
+    log = DecisionLog(FileDecisionLog(str(tmp_path / "decisions.jsonl")))
+    log.record("c1", EVENTS, patient_id="P1", clinician_id="dr-a")
+    log.record("c2", EVENTS[:1])
+    listed = log.list("c1")
+    assert [(d["suggestionId"], d["action"]) for d in listed["decisions"]] == [
+        ("med-1", "approve"), ("med-2", "modify"), ("med-1", "reject")]
+    assert listed["latest"]["med-1"]["action"] == "reject"
+    assert listed["latest"]["med-2"]["content"] == "Amlodipine 10 mg once daily"
+    assert log.list("c3")["decisions"] == []
+
+
+@mock_aws
+def test_dynamo_store_writes_large_groups_in_batches():
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    client.create_table(
+        TableName="Decisions",
+        KeySchema=[{"AttributeName": "ConsultID", "KeyType": "HASH"}, {"AttributeName": "DecisionID", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "ConsultID", "AttributeType": "S"},
+                              {"AttributeName": "DecisionID", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    store = DynamoDecisionStore("Decisions", client)
+    log = DecisionLog(store)
+    events = [{"suggestion_id": f"s{n}", "action": "approve", "suggestion_version": "v1"} for n in range(60)]
+    result = log.record("c1", events, patient_id="P1")
+    listed = log.list("c1")
+    assert [d["decisionId"] for d in listed["decisions"]] == result["decisionIds"]
+    assert listed["decisions"][0]["suggestionVersion"] == "v1" and listed["decisions"][0]["content"] is None
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI
+
+from api.healthscribe import fhir_export
+from api.healthscribe.analysis_store import AnalysisRecord, SQLiteAnalysisStore, new_analysis_id
+from api.healthscribe.router import router
+
+
+def seed(tmp_path, monkeypatch, patients=("P1", "P2"), per_patient=3):
+    store = SQLiteAnalysisStore(str(tmp_path / "analyses.sqlite3"))
+    store.put_many([
+        AnalysisRecord(analysis_id=new_analysis_id(), patient_id=patient_id, consult_id=None, created_at=1.7e9,
+                       mode="full", summary={}, payload={"transcript": "", "soapNote": None, "result": {}})
+        for patient_id in patients for _ in range(per_patient)
+    ])
+    monkeypatch.setattr(fhir_export.analysis_history, "store", store)
+
+
+def encounters(body: bytes):
+    return [json.loads(line)["id"] for line in body.splitlines()]
+
+
+def test_export_pages_cover_every_consult_once(tmp_path, monkeypatch):
+    seed(tmp_path, monkeypatch)
+    seen, after = [], None
+    while True:
+        body, cursor = fhir_export.export_page(types=("Encounter",), after=after and fhir_export.decode_cursor(after), limit=4)
+        seen += encounters(body)
+        if cursor is None:
+            break
+        after = cursor
+    assert len(seen) == 6 and len(set(seen)) == 6
+    # The last page ends exactly at the last consult: no cursor to an empty page
+    assert fhir_export.export_page(types=("Encounter",), limit=6)[1] is None
+
+
+def app_behind_mangum():
+    app = FastAPI()
+    app.include_router(router)
+
+    async def with_aws_event(scope, receive, send):
+        await app({**scope, "aws.event": {}}, receive, send)
+    return with_aws_event
+
+
+async def get(app, url):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(url)
+
+
+def test_buffered_handler_pages_the_export_with_link(tmp_path, monkeypatch):
+    seed(tmp_path, monkeypatch)
+    monkeypatch.setattr(fhir_export, "BUFFERED_EXPORT_MAX_CONSULTS", 4)
+    app = app_behind_mangum()
+
+    first = asyncio.run(get(app, "/healthscribe/fhir/$export?_type=Encounter"))
+    assert len(encounters(first.content)) == 4
+    link = first.headers["link"]
+    assert link.startswith("<?_type=Encounter&cursor=") and link.endswith('>; rel="next"')
+
+    second = asyncio.run(get(app, "/healthscribe/fhir/$export" + link[1:link.index(">")]))
+    assert len(encounters(second.content)) == 2
+    assert "link" not in second.headers
+    assert set(encounters(first.content)).isdisjoint(encounters(second.content))
+
+
+def test_export_streams_whole_outside_lambda(tmp_path, monkeypatch):
+    seed(tmp_path, monkeypatch)
+    app = FastAPI()
+    app.include_router(router)
+    response = asyncio.run(get(app, "/healthscribe/fhir/Patient/P2/$export?_type=Encounter"))
+    assert len(encounters(response.content)) == 3
+    assert "link" not in response.headers
+
+
+def test_one_encounter_per_consult_from_its_latest_analysis(tmp_path, monkeypatch):
+    store = SQLiteAnalysisStore(str(tmp_path / "analyses.sqlite3"))
+    # Full, delta and speculative analyses of c1, interleaved with c2 and one without a consult
+    analyses = [("P1", "c1", "I10"), ("P1", "c2", "J20.9"), ("P1", "c1", "R51.9"), ("P1", None, "K21.9"),
+                ("P1", "c1", "G43.909"), ("P2", "c1", "E11.9")]
+    store.put_many([
+        AnalysisRecord(analysis_id=new_analysis_id(), patient_id=patient_id, consult_id=consult_id, created_at=1.7e9,
+                       mode="full", summary={},
+                       payload={"transcript": "", "soapNote": None, "result": {"icd_codes": [{"code": code}]}})
+        for patient_id, consult_id, code in analyses
+    ])
+    monkeypatch.setattr(fhir_export.analysis_history, "store", store)
+
+    body, _ = fhir_export.export_page(types=("Encounter", "Condition"), limit=10)
+    resources = [json.loads(line) for line in body.splitlines()]
+    codes = sorted(r["code"]["coding"][0]["code"] for r in resources if r["resourceType"] == "Condition")
+    assert codes == ["E11.9", "G43.909", "J20.9", "K21.9"]
+    encounter_ids = [r["id"] for r in resources if r["resourceType"] == "Encounter"]
+    assert len(encounter_ids) == len(set(encounter_ids)) == 4
+
+    # Paging one consult at a time gives the same resources, and a consult keeps its IDs
+    paged, after = [], None
+    while True:
+        page, cursor = fhir_export.export_page(types=("Encounter", "Condition"), after=after, limit=1)
+        paged += [json.loads(line) for line in page.splitlines()]
+        if cursor is None:
+            break
+        after = fhir_export.decode_cursor(cursor)
+    assert paged == resources
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+from api.healthscribe.json_stream import JSONStreamError, iter_prefixed_items, parse
+
+DOCUMENT = {
+    "Conversation": {
+        "JobName": "scribe-1",
+        "TranscriptSegments": [
+            {"Content": "Any chest pain?", "BeginAudioTime": 0.5, "EndAudioTime": 1.25,
+             "ParticipantDetails": {"ParticipantRole": "CLINICIAN"}},
+            {"Content": "Nein — \"nur\" Husten \\ café \U0001f637", "BeginAudioTime": 1.5, "EndAudioTime": 3,
+             "ParticipantDetails": {"ParticipantRole": "PATIENT"}},
+        ],
+        "TranscriptItems": [{"Content": "Any", "Confidence": 0.98, "Redacted": False, "Tags": None}],
+        "Empty": {}, "Numbers": [-12, 0, 3.5e-2, 1E3],
+    }
+}
+
+
+def events(value):
+    """
+    The (prefix, event, value) stream the parser should produce for a decoded document.
+    """
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            yield prefix, "start_map", None
+            for key, item in value.items():
+                yield prefix, "map_key", key
+                yield from walk(f"{prefix}.{key}" if prefix else key, item)
+            yield prefix, "end_map", None
+        elif isinstance(value, list):
+            yield prefix, "start_array", None
+            for item in value:
+                yield from walk(f"{prefix}.item" if prefix else "item", item)
+            yield prefix, "end_array", None
+        elif isinstance(value, bool):
+            yield prefix, "boolean", value
+        elif value is None:
+            yield prefix, "null", None
+        elif isinstance(value, (int, float)):
+            yield prefix, "number", value
+        else:
+            yield prefix, "string", value
+    return list(walk("", value))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_events_match_the_document_whatever_the_chunk_boundaries(chunk_size):
+    # ensure_ascii=False puts multi-byte UTF-8 characters across chunk boundaries too
+    raw = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+    assert list(parse(io.BytesIO(raw), chunk_size)) == events(DOCUMENT)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64 * 1024])
+def test_prefixed_items_are_decoded_whole_in_one_pass(chunk_size):
+    raw = json.dumps(DOCUMENT).encode("utf-8")
+    items = list(iter_prefixed_items(io.BytesIO(raw), ("Conversation.TranscriptSegments.item",
+                                                       "Conversation.TranscriptItems.item"), chunk_size))
+    conversation = DOCUMENT["Conversation"]
+    assert items == ([("Conversation.TranscriptSegments.item", s) for s in conversation["TranscriptSegments"]]
+                     + [("Conversation.TranscriptItems.item", i) for i in conversation["TranscriptItems"]])
+
+
+def test_stream_is_read_in_chunks_not_all_at_once():
+    sizes = []
+
+    class CountingStream(io.BytesIO):
+        def read(self, size=-1):
+            sizes.append(size)
+            return super().read(size)
+
+    stream = CountingStream(json.dumps({"Conversation": {"TranscriptSegments": [{"Content": "x" * 100}] * 50}}).encode())
+    assert len(list(iter_prefixed_items(stream, ("Conversation.TranscriptSegments.item",), 256))) == 50
+    assert -1 not in sizes and max(sizes) == 256
+
+
+@pytest.mark.parametrize("raw", [
+    b'{"a": [1, 2',          # truncated
+    b'{"a": "unterminated',
+    b'{"a": 1]',             # unbalanced
+    b'{1: 2}',               # non-string key
+    b'{"a": nope}',
+    b'{"a": -}',
+])
+def test_malformed_documents_raise(raw):
+    with pytest.raises(JSONStreamError):
+        list(parse(io.BytesIO(raw), 4))
+
+
+def test_truncated_captured_value_raises():
+    raw = b'{"Conversation": {"TranscriptSegments": [{"Content": "cut off'
+    with pytest.raises(JSONStreamError):
+        list(iter_prefixed_items(io.BytesIO(raw), ("Conversation.TranscriptSegments.item",), 8))
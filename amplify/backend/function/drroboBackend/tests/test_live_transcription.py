@@ -0,0 +1,24 @@
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from api.healthscribe import router as router_module
+from api.healthscribe.live_transcription import ReplayTranscriber
+
+
+def test_malformed_text_frames_do_not_end_the_session(monkeypatch):
+    monkeypatch.setattr(router_module, "create_transcriber",
+                        lambda *args: ReplayTranscriber(script=[("CLINICIAN", "hello")]))
+    app = FastAPI()
+    app.include_router(router_module.router)
+
+    with TestClient(app).websocket_connect("/healthscribe/live/consult-1") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        for frame in ("not json", "[1, 2]", '"stop"', "null"):
+            ws.send_text(frame)
+        ws.send_bytes(b"chunk")
+        assert ws.receive_json()["text"] == "hello"
+        ws.send_text('{"type": "stop"}')
+        messages = [ws.receive_json()]
+        while messages[-1]["type"] != "done":
+            messages.append(ws.receive_json())
+    assert "hello" in messages[-1]["transcript"]
@@ -0,0 +1,62 @@
+from api.healthscribe.medications import is_medication_line, iter_mentions, parse_text, parse_treatment_plan
+
+
+def fields(medication, *names):
+    return {name: medication[name] for name in names}
+
+
+def test_attributes_stay_with_their_own_drug():
+    amlodipine, ramipril = parse_text("Amlodipine 5 mg PO once daily and ramipril 2.5 mg at night")
+    assert fields(amlodipine, "name", "route") == {"name": "amlodipine", "route": "oral"}
+    assert amlodipine["dose"] == {"value": 5, "value_max": None, "unit": "mg"}
+    assert amlodipine["frequency"]["code"] == "QD"
+    assert ramipril["dose"]["value"] == 2.5 and ramipril["frequency"]["code"] == "HS" and ramipril["route"] is None
+
+
+def test_leading_dose_quantity_prn_and_duration():
+    amoxicillin, = parse_text("500 mg amoxicillin three times a day for 7 days")
+    assert amoxicillin["dose"]["value"] == 500 and amoxicillin["frequency"]["per_day"] == 3
+    assert amoxicillin["duration"] == {"value": 7, "unit": "day"}
+
+    salbutamol, = parse_text("Salbutamol 2 puffs inhaled every 4 hours as needed")
+    assert salbutamol["quantity"] == {"value": 2, "value_max": None, "form": "puff"}
+    assert fields(salbutamol, "route", "prn") == {"route": "inhaled", "prn": True}
+    assert salbutamol["frequency"]["code"] == "Q4H" and salbutamol["frequency"]["per_day"] == 6
+
+
+def test_actions_carry_across_conjunctions_but_not_clauses():
+    medications = parse_text("Stop warfarin and aspirin; start apixaban 5 mg twice daily")
+    assert [(m["name"], m["action"]) for m in medications] == [
+        ("warfarin", "stop"), ("aspirin", "stop"), ("apixaban", "start")]
+    assert medications[0]["high_alert"] and medications[2]["high_alert"] and not medications[1]["high_alert"]
+
+    metformin, atorvastatin = parse_text("Continue metformin 500mg bd. Increase atorvastatin to 40 mg nocte")
+    assert metformin["action"] == "continue" and metformin["frequency"]["code"] == "BID"
+    assert atorvastatin["action"] == "increase" and atorvastatin["dose"]["value"] == 40
+
+
+def test_brands_aliases_and_multiword_names_map_to_the_generic():
+    assert [m["name"] for m in parse_text("Augmentin 625 mg and acetaminophen 1 g")] == ["co-amoxiclav", "paracetamol"]
+    # The longest name wins where names overlap
+    insulin, = parse_text("Insulin glargine 10 units subcut at bedtime")
+    assert insulin["name"] == "insulin glargine" and insulin["route"] == "subcutaneous"
+    # Names are matched on whole words only
+    assert [m.name for m in iter_mentions("amoxicillinx and insulin")] == ["insulin"]
+    assert [m.name for m in iter_mentions("...nasal spray", 5)] == []
+
+
+def test_treatment_plan_sections_and_medication_lines():
+    plan = {
+        "immediate": ["Amlodipine 5 mg once daily"],
+        "ongoing": "Continue metformin 500 mg twice daily",
+        "lifestyle": ["Amlodipine handout given"],  # not a prescribing section
+    }
+    medications = parse_treatment_plan(plan)
+    assert [(m["name"], m["source"]) for m in medications] == [
+        ("amlodipine", {"section": "immediate", "line": 0}), ("metformin", {"section": "ongoing", "line": 0})]
+    assert parse_treatment_plan(None) == [] and parse_treatment_plan("Amlodipine 5 mg") == []
+
+    # A dose is enough for a line the formulary doesn't know
+    assert is_medication_line("Tirzepatide 2.5 mg subcut weekly")
+    assert is_medication_line("Ramipril at night")
+    assert not is_medication_line("Reduce salt intake")
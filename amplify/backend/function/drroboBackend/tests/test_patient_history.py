@@ -0,0 +1,82 @@
+import asyncio
+
+import boto3
+import httpx
+from fastapi import FastAPI
+from moto import mock_aws
+
+from api.healthscribe import router as router_module
+from api.healthscribe.patient_history import PatientHistoryRepository
+
+TABLE = "DigitalTwin"
+
+
+def digital_twin(patient_count: int):
+    """
+    Moto DynamoDB table with `patient_count` patients, and a repository on it
+    that counts the calls it makes by operation.
+    """
+    client = boto3.client("dynamodb", region_name="us-east-1")
+    client.create_table(TableName=TABLE, BillingMode="PAY_PER_REQUEST",
+                        KeySchema=[{"AttributeName": "PatientID", "KeyType": "HASH"}],
+                        AttributeDefinitions=[{"AttributeName": "PatientID", "AttributeType": "S"}])
+    for n in range(patient_count):
+        client.put_item(TableName=TABLE, Item={
+            "PatientID": {"S": f"P{n:03d}"},
+            "Age": {"N": str(40 + n % 30)},
+            "Weight": {"N": "72.5"},
+            "Allergies": {"SS": ["Penicillin"]},
+        })
+    calls = {}
+    client.meta.events.register(
+        "before-call.dynamodb.*",
+        lambda model, **kwargs: calls.__setitem__(model.name, calls.get(model.name, 0) + 1),
+    )
+    return PatientHistoryRepository(TABLE, client=client), calls
+
+
+@mock_aws
+def test_get_reads_through_the_cache():
+    repository, calls = digital_twin(3)
+    history = repository.get("P001")
+    assert history == {"PatientID": "P001", "Age": 41, "Weight": 72.5, "Allergies": ["Penicillin"]}
+    assert repository.get("P001") is history
+    # Unknown patients are cached too, so they don't cost a read every analysis
+    assert repository.get("NOPE") is None and repository.get("NOPE") is None
+    assert calls == {"GetItem": 2}
+
+
+@mock_aws
+def test_prefetch_batches_reads_and_warms_get():
+    repository, calls = digital_twin(150)
+    repository.get("P000")
+    histories = repository.get_many([f"P{n:03d}" for n in range(150)] + ["P000", "NOPE"])
+    assert len(histories) == 151
+    assert histories["NOPE"] is None and histories["P149"]["Age"] == 40 + 149 % 30
+    # P000 came from the cache; the other 150 keys need two BatchGetItem calls of at most 100
+    assert calls == {"GetItem": 1, "BatchGetItem": 2}
+
+    for n in range(150):
+        repository.get(f"P{n:03d}")
+    assert calls == {"GetItem": 1, "BatchGetItem": 2}
+
+
+@mock_aws
+def test_prefetch_route_warms_the_cache(monkeypatch):
+    repository, calls = digital_twin(5)
+    monkeypatch.setattr(router_module, "patient_histories", repository)
+    app = FastAPI()
+    app.include_router(router_module.router)
+
+    async def prefetch():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            single = await client.post("/healthscribe/patients/P004/prefetch")
+            many = await client.post("/healthscribe/patients/prefetch",
+                                     json={"patient_ids": ["P000", "P001", "P004", "NOPE"]})
+            return single.json(), many.json()
+
+    single, many = asyncio.run(prefetch())
+    assert single == {"patientId": "P004", "cached": True, "found": True}
+    assert many == {"cached": 4, "found": 3}
+    assert repository.get("P001")["Age"] == 41
+    assert calls == {"GetItem": 1, "BatchGetItem": 1}
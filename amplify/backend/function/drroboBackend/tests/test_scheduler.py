@@ -0,0 +1,52 @@
+import asyncio
+
+from api.healthscribe.scheduler import AgentScheduler
+from api.healthscribe.triage import ROUTINE
+
+
+def test_cancel_racing_release_does_not_leak_the_slot():
+    async def scenario():
+        scheduler = AgentScheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+            return "first"
+
+        first = asyncio.create_task(scheduler.run(ROUTINE, hold))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.run(ROUTINE, lambda: asyncio.sleep(0, "second")))
+        await asyncio.sleep(0)
+
+        # Same tick: the slot is released before the cancelled waiter's except block runs
+        gate.set()
+        waiting.cancel()
+        results = await asyncio.gather(first, waiting, return_exceptions=True)
+
+        assert results[0] == "first"
+        assert isinstance(results[1], asyncio.CancelledError)
+        assert scheduler.stats()["active"] == 0
+        assert await asyncio.wait_for(scheduler.run(ROUTINE, lambda: asyncio.sleep(0, "third")), 1) == "third"
+
+    asyncio.run(scenario())
+
+
+def test_urgent_waiter_dispatched_first():
+    async def scenario():
+        scheduler = AgentScheduler(concurrency=1)
+        gate = asyncio.Event()
+        order = []
+
+        async def work(name):
+            order.append(name)
+
+        blocker = asyncio.create_task(scheduler.run(ROUTINE, gate.wait))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(scheduler.run(2, lambda: work("bulk")))
+        urgent = asyncio.create_task(scheduler.run(0, lambda: work("urgent")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, bulk, urgent)
+        assert order == ["urgent", "bulk"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from api.healthscribe.analysis_jobs import AnalysisJobs, SQLiteJobQueue
+from api.healthscribe.analysis_store import SQLiteAnalysisStore, analysis_history
+from api.healthscribe.router import router, get_service
+from api.healthscribe.service import HealthScribeService, completed_jobs
+from api.healthscribe.sessions import consult_sessions, SESSION_TTL_SECONDS
+from api.healthscribe.speculative import SpeculationBudget, speculation_id, speculative_analyses
+
+RESULT = {"diagnosis": {}, "icd_codes": [], "safety": {}, "treatment_plan": {}, "medications": []}
+
+
+def adopt(consult_id, completed_at):
+    service = HealthScribeService()
+    claimed = ("spec-abc", dict(RESULT), completed_at)
+    return asyncio.run(service._adopt_speculation(claimed, "transcript", None, "P1", consult_id, None))
+
+
+def test_fresh_speculative_session_is_adopted_with_its_own_age():
+    completed_at = time.time() - 100
+    adopt("consult-fresh", completed_at)
+    session = consult_sessions.get("consult-fresh")
+    assert session.session_id == "spec-abc"
+    assert session.last_used == completed_at
+
+
+def test_speculative_session_past_bedrock_ttl_is_not_adopted():
+    adopt("consult-stale", time.time() - SESSION_TTL_SECONDS - 60)
+    # The next analysis of this consult is a full one in a new session
+    assert consult_sessions.get("consult-stale") is None
+
+
+TRANSCRIPT = "Clinician: What brings you in today? Patient: Chest tightness when I climb stairs. " * 4
+SCRIBE_RESULT = {"status": "completed", "jobName": "scribe-1", "clinicalNotes": {"fullTranscript": TRANSCRIPT}}
+
+
+class SpeculativeAgent:
+    def __init__(self):
+        self.calls = []
+
+    async def call_bedrock_agent(self, **kwargs):
+        self.calls.append(kwargs)
+        return dict(RESULT)
+
+
+def test_analyze_after_status_poll_adopts_the_speculative_run(tmp_path, monkeypatch):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    jobs = AnalysisJobs(local, local)
+    # Jobs are run by hand below instead of by the in-process worker
+    jobs.in_process = False
+    monkeypatch.setattr(speculative_analyses, "jobs", jobs)
+    monkeypatch.setattr(speculative_analyses, "enabled", True)
+    monkeypatch.setattr(speculative_analyses, "budget", SpeculationBudget(per_hour=10))
+    monkeypatch.setattr(analysis_history, "store", SQLiteAnalysisStore(str(tmp_path / "analyses.sqlite3")))
+    completed_jobs.put("scribe-1", SCRIBE_RESULT)
+
+    service = HealthScribeService()
+    monkeypatch.setattr(service, "_patient_history", lambda p_id: None)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_service] = lambda: service
+    agent = SpeculativeAgent()
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/healthscribe/status/scribe-1", params={"patient_id": "P7"})
+        assert response.status_code == 200
+        assert await jobs.process(local.receive(), agent) is True
+        return await service.call_bedrock_agent(transcript=TRANSCRIPT, patient={"PatientID": "P7"}, consult_id="consult-p7")
+
+    result = asyncio.run(scenario())
+    # The one agent call was the speculative run, made for the polled patient
+    assert len(agent.calls) == 1 and agent.calls[0]["patient"] == {"PatientID": "P7"}
+    assert result["icd_codes"] == []
+    assert consult_sessions.get("consult-p7").session_id == speculation_id("P7", TRANSCRIPT)
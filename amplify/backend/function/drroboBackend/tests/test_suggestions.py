@@ -0,0 +1,35 @@
+from api.healthscribe.suggestions import SuggestionVersions
+
+RESULT = {
+    "diagnosis": {"primary": {"condition": "Migraine", "rationale": "Unilateral headache", "confidence": 0.8}},
+    "icd_codes": [{"code": "G43.909", "description": "Migraine, unspecified", "confidence": 0.7}],
+}
+REVISED = {
+    **RESULT,
+    "icd_codes": RESULT["icd_codes"] + [{"code": "R51.9", "description": "Headache", "confidence": 0.5}],
+}
+
+
+def test_base_version_returns_only_changes():
+    versions = SuggestionVersions()
+    first = versions.update("consult-1", RESULT)
+    second = versions.update("consult-1", REVISED, first["version"])
+    assert second["full"] is False
+    assert [card["content"] for card in second["added"]] == ["R51.9 — Headache"]
+    assert second["changed"] == [] and second["removed"] == []
+
+
+def test_version_is_the_same_in_every_container():
+    here, there = SuggestionVersions(), SuggestionVersions()
+    assert here.update("consult-1", RESULT)["version"] == there.update("consult-1", RESULT)["version"]
+
+
+def test_base_from_another_container_gets_the_full_set():
+    here, there = SuggestionVersions(), SuggestionVersions()
+    there.update("consult-1", REVISED)
+    base = there.update("consult-1", REVISED)["version"]
+    here.update("consult-1", RESULT)
+    # This container's cached version differs from the client's base: no diff against it
+    response = here.update("consult-1", REVISED, base)
+    assert response["full"] is True
+    assert len(response["suggestions"]) == 3
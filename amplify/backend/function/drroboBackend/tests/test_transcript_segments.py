@@ -0,0 +1,62 @@
+import io
+import json
+
+from api.healthscribe.transcript_segments import SegmentStore
+
+TRANSCRIPT = {"Conversation": {
+    "TranscriptSegments": [
+        {"Content": "What brings you in?", "BeginAudioTime": 0.0, "EndAudioTime": 2.0,
+         "ParticipantDetails": {"ParticipantRole": "CLINICIAN"}},
+        {"Content": "Chest tightness.", "BeginAudioTime": 2.5, "EndAudioTime": 4.0,
+         "ParticipantDetails": {"ParticipantRole": "PATIENT"}},
+        {"Content": "Mostly on stairs.", "BeginAudioTime": 4.0, "EndAudioTime": 6.5,
+         "ParticipantDetails": {"ParticipantRole": "PATIENT"}},
+        {"Content": "Any pain now?", "BeginAudioTime": 7.0, "EndAudioTime": 8.0,
+         "ParticipantDetails": {"ParticipantRole": "CLINICIAN"}},
+    ],
+    "TranscriptItems": [
+        {"Content": "Chest", "BeginAudioTime": 2.5, "EndAudioTime": 3.0, "Confidence": 0.99, "Type": "PRONUNCIATION"},
+        {"Content": "tightness", "BeginAudioTime": 3.0, "EndAudioTime": 3.8, "Confidence": 0.75, "Type": "PRONUNCIATION"},
+        {"Content": ".", "BeginAudioTime": 3.8, "EndAudioTime": 3.8, "Confidence": 0.0, "Type": "PUNCTUATION"},
+        {"Content": "Mostly", "BeginAudioTime": 4.0, "EndAudioTime": 4.6, "Confidence": 0.9, "Type": "PRONUNCIATION"},
+    ],
+}}
+
+
+def store():
+    return SegmentStore.from_healthscribe(TRANSCRIPT)
+
+
+def test_columns_text_and_turns():
+    segments = store()
+    assert len(segments) == 4 and segments.speakers == ["CLINICIAN", "PATIENT"]
+    assert segments.text(1) == "Chest tightness."
+    assert segments.transcript_text().splitlines() == [
+        "CLINICIAN: What brings you in?", "PATIENT: Chest tightness.",
+        "PATIENT: Mostly on stairs.", "CLINICIAN: Any pain now?"]
+    assert [(t["speaker"], t["begin"], t["end"], t["text"]) for t in segments.turns()] == [
+        ("CLINICIAN", 0.0, 2.0, "What brings you in?"),
+        ("PATIENT", 2.5, 6.5, "Chest tightness. Mostly on stairs."),
+        ("CLINICIAN", 7.0, 8.0, "Any pain now?")]
+    assert segments.talk_time_by_speaker() == {"CLINICIAN": 3.0, "PATIENT": 4.0}
+    assert SegmentStore().turns() == [] and SegmentStore().talk_time_by_speaker() == {}
+
+
+def test_slice_keeps_overlapping_segments_and_words():
+    sliced = store().slice_time(3.0, 5.0)
+    assert sliced.transcript_text() == "PATIENT: Chest tightness.\nPATIENT: Mostly on stairs."
+    payload = sliced.to_payload(include_words=True)
+    assert payload["begin"] == [2.5, 4.0] and payload["speaker"] == [1, 1]
+    # "Chest" ends exactly at 3.0, so it is outside [3.0, 5.0)
+    assert payload["words"]["text"] == ["tightness", ".", "Mostly"]
+    assert payload["words"]["type"] == ["PRONUNCIATION", "PUNCTUATION", "PRONUNCIATION"]
+    assert payload["words"]["confidence"] == [0.75, 0.0, 0.9]
+    # Slices are independent stores: the new one can keep growing
+    sliced.add_segment(9.0, 10.0, "PATIENT", "No.")
+    assert sliced.text(2) == "No." and len(store().slice_time(20.0, 30.0)) == 0
+
+
+def test_stream_build_matches_the_parsed_document():
+    streamed = SegmentStore.from_healthscribe_stream(io.BytesIO(json.dumps(TRANSCRIPT).encode("utf-8")))
+    assert streamed.to_payload(include_words=True) == store().to_payload(include_words=True)
+
@@ -346,8 +346,13 @@ const ConversationChat = () => {
     const MAX_ATTEMPTS = 60; // 5 minutes
     let attempts = 0;
 
+    // The backend analyzes the finished transcript ahead of time for this patient;
+    // it must be the same patient /agent/analyze is called with, or that run is wasted
+    const patientId = currentPatient?.PatientID;
+    const query = patientId ? `?patient_id=${encodeURIComponent(patientId)}` : "";
+
     while (attempts < MAX_ATTEMPTS) {
-      const res = await fetch(`${API_BASE}/healthscribe/status/${jobName}`);
+      const res = await fetch(`${API_BASE}/healthscribe/status/${jobName}${query}`);
 
       if (!res.ok) {
         throw new Error("Failed to fetch HealthScribe status");
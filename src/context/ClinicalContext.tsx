@@ -38,6 +38,7 @@ interface ClinicalState {
   suggestions: Suggestion[];
   diagnosisResult: DiagnosisResult | null;
   currentPatient: {
+    PatientID?: string;
     name: string;
     age: number;
     gender: string;
@@ -48,6 +48,25 @@ export interface FollowUp {
   action: string;
 }
 
+/* =====================================================
+   Medications parsed server-side from the treatment plan
+===================================================== */
+export interface ParsedMedication {
+  name: string;
+  matched: string;
+  classes: string[];
+  high_alert: boolean;
+  action: "start" | "stop" | "continue" | "increase" | "reduce";
+  dose: { value: number; value_max: number | null; unit: string; per?: { value: number; unit: string } } | null;
+  quantity: { value: number; value_max: number | null; form: string } | null;
+  route: string | null;
+  frequency: { code: string; per_day: number | null; text: string } | null;
+  prn: boolean;
+  duration: { value: number; unit: string } | null;
+  span: [number, number];
+  source: { section: string; line: number };
+}
+
 /* =====================================================
    RAW BEDROCK AGENT OUTPUT (The Strict "Input" Contract)
 ===================================================== */
@@ -81,6 +100,7 @@ export interface AgentResult {
     timeframe: string;
     action: string;
   }>;
+  medications?: ParsedMedication[];
 }
 
 /* =====================================================
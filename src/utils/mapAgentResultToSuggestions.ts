@@ -1,6 +1,8 @@
 import type { AgentResult } from "@/types";
 import type { Suggestion } from "@/context/ClinicalContext";
 
+const DOSE_PATTERN = /mg|tablet|capsule|oral|iv|amoxicillin|paracetamol|dose/i;
+
 export function mapAgentResultToSuggestions(
   result: AgentResult
 ): Suggestion[] {
@@ -90,8 +92,16 @@ export function mapAgentResultToSuggestions(
     });
   }
 
-  const medicationLines = result.treatment_plan?.ongoing?.concat(result.treatment_plan?.immediate || [])
-    .filter((line) => /mg|tablet|capsule|oral|iv|amoxicillin|paracetamol|dose/i.test(line)) ?? [];
+  // Lines the backend's formulary parser recognized, plus any line that reads like
+  // a prescription: drugs missing from the formulary must still get a card
+  const parsedLines = new Set(
+    (result.medications || []).map((m) => `${m.source.section}:${m.source.line}`)
+  );
+  const planLines = (section: "ongoing" | "immediate") =>
+    (result.treatment_plan?.[section] || []).filter(
+      (line, i) => parsedLines.has(`${section}:${i}`) || DOSE_PATTERN.test(line)
+    );
+  const medicationLines = [...planLines("ongoing"), ...planLines("immediate")];
 
   if (medicationLines.length > 0) {
     suggestions.push({